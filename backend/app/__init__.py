@@ -1,5 +1,6 @@
 import os
-from flask import Flask
+import time
+from flask import Flask, g, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -44,18 +45,70 @@ def create_app(config_name=None):
 
     # Register blueprints
     with app.app_context():
-        from app.routes import auth_bp, upload_bp, analysis_bp, results_bp
+        from app.routes import auth_bp, upload_bp, analysis_bp, results_bp, health_bp, batch_bp, metrics_bp
 
         app.register_blueprint(auth_bp, url_prefix='/api/auth')
         app.register_blueprint(upload_bp, url_prefix='/api/upload')
         app.register_blueprint(analysis_bp, url_prefix='/api/analysis')
         app.register_blueprint(results_bp, url_prefix='/api/results')
+        app.register_blueprint(health_bp, url_prefix='/api/health')
+        app.register_blueprint(batch_bp, url_prefix='/api/batch')
+        app.register_blueprint(metrics_bp)
+
+        # Apply engine settings to the shared detection engine
+        from app.services import engine
+        from app.services.job_queue import queue
+        from app.services.progress import progress_bus
+        from app.services.metrics import metrics
+        from app.services.persistence import existing_documents
+        engine.configure(app.config)
+        engine.archive_filter = existing_documents
+        queue.configure(app.config)
+        progress_bus.configure(app.config)
+        metrics.configure(app.config)
+
+        # Latency of every request by route (streamed responses: until
+        # the headers go out)
+        @app.before_request
+        def start_request_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def record_request_latency(response):
+            start = g.pop("request_start", None)
+            if start is not None:
+                metrics.observe(
+                    "plagiarism_http_request_seconds",
+                    time.perf_counter() - start,
+                    method=request.method,
+                    route=request.url_rule.rule if request.url_rule else "unmatched",
+                    status=response.status_code
+                )
+            return response
 
         # Create database tables
         try:
             db.create_all()
+            from app.utils.schema import add_missing_columns, add_missing_indexes
+            for column in add_missing_columns(db):
+                print(f"✓ Added column {column}")
+            for index in add_missing_indexes(db):
+                print(f"✓ Added index {index}")
             print("✓ Database tables created/verified")
         except Exception as e:
             print(f"⚠ Database creation warning: {e}")
 
+        # Don't hand pooled connections to processes forked after
+        # create_app (gunicorn --preload)
+        db.engine.dispose()
+
+    # Opt-in: load and warm the model now. Under gunicorn --preload this
+    # runs once in the master and forked workers share the weights.
+    if app.config.get("PRELOAD_MODEL"):
+        try:
+            seconds = engine.warm_up()
+            print(f"✓ Detection model warmed up in {seconds}s")
+        except Exception as e:
+            print(f"⚠ Model warm-up failed: {e}")
+
     return app
@@ -18,15 +18,109 @@ class Config:
     # File Upload
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
-    ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'pptx', 'doc', 'ppt'}
+    ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'pptx'}  # formats extraction.READERS can read
+    MAX_EXTRACTED_CHARS = 200000  # text kept per document; extraction stops here
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    # Limits for the per-upload extraction process (tasks.extract_document)
+    EXTRACTION_TIMEOUT = int(os.getenv('EXTRACTION_TIMEOUT', 60))
+    EXTRACTION_CPU_SECONDS = int(os.getenv('EXTRACTION_CPU_SECONDS', 30))
+    EXTRACTION_MEMORY_MB = int(os.getenv('EXTRACTION_MEMORY_MB', 1024))
     
     # Plagiarism Detection
     SIMILARITY_THRESHOLD = 0.7
-    NGRAM_SIZE = 3
+    NGRAM_SIZE = 3  # word shingle size for lexical fingerprinting
+    FINGERPRINT_WINDOW = 4  # winnowing window (in shingles)
+    SOURCE_WINDOW_SENTENCES = 3  # source pages are embedded as overlapping windows
+    SOURCE_WINDOW_STRIDE = 2
+    # Resubmissions: reuse an earlier analysis sharing this share of sentences
+    INCREMENTAL_MIN_OVERLAP = 0.5
+    INCREMENTAL_CANDIDATES = 10
+    # Batch analysis (POST /api/batch): upload limits, the retrieval
+    # deadline for the whole batch and pairwise member similarity
+    BATCH_MAX_DOCUMENTS = int(os.getenv('BATCH_MAX_DOCUMENTS', 500))
+    BATCH_MAX_TOTAL_SIZE = 500 * 1024 * 1024  # uncompressed bytes per batch
+    BATCH_RETRIEVAL_TIMEOUT = int(os.getenv('BATCH_RETRIEVAL_TIMEOUT', 300))
+    BATCH_PAIR_THRESHOLD = 0.85  # sentence cosine counted as a shared sentence
+    BATCH_PAIR_MIN_SIMILARITY = 0.1  # pairs below this are not stored
+    # Collusion checks (POST /api/batch/collusion): documents per check,
+    # pairs kept, sentences per matrix block (memory ~ rows^2 * 4 bytes)
+    # and the share of documents above which a sentence is template text
+    COLLUSION_MAX_DOCUMENTS = int(os.getenv('COLLUSION_MAX_DOCUMENTS', 5000))
+    COLLUSION_TOP_K = int(os.getenv('COLLUSION_TOP_K', 500))
+    COLLUSION_BLOCK_ROWS = int(os.getenv('COLLUSION_BLOCK_ROWS', 4096))
+    COLLUSION_TEMPLATE_SHARE = 0.5
+    # AI-text detection: stylometry always; AI_DETECTOR_LM (a small causal
+    # LM such as distilgpt2) adds perplexity scores within a CPU budget.
+    # AI_DETECTOR_WEIGHTS overrides ai_detection.FEATURES / "bias".
+    AI_DETECTOR_LM = os.getenv('AI_DETECTOR_LM')
+    AI_DETECTOR_SECONDS_PER_10K_WORDS = float(os.getenv('AI_DETECTOR_SECONDS_PER_10K_WORDS', 5.0))
+    AI_DETECTOR_WEIGHTS = None
+    # Per-plan pipeline stages / budgets; None uses the engine's DEFAULT_PLANS
+    ANALYSIS_PLANS = None
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
+    # torch (fp32) | int8 (dynamic quantization) | onnx (ONNX Runtime);
+    # check parity with benchmark_embeddings.py before switching
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+    ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', '/tmp/plagiarism-cache/onnx')
+    # Load and warm the model in create_app (readiness waits for it)
+    PRELOAD_MODEL = os.getenv('PRELOAD_MODEL', 'False') == 'True'
+
+    # Shared model server (app/services/model_server.py); unset = in-process model
+    MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET')
+    MODEL_SERVER_AUTHKEY = os.getenv('MODEL_SERVER_AUTHKEY', '').encode() or None
+    MODEL_SERVER_MAX_BATCH = int(os.getenv('MODEL_SERVER_MAX_BATCH', 64))
+    MODEL_SERVER_MAX_WAIT_MS = int(os.getenv('MODEL_SERVER_MAX_WAIT_MS', 10))
+    EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', '/tmp/plagiarism-cache/embeddings')
+    EMBEDDING_CACHE_CAPACITY = int(os.getenv('EMBEDDING_CACHE_CAPACITY', 50000))
+
+    # Archive of uploaded documents (student-to-student matching)
+    ARCHIVE_INDEX_DIR = os.getenv('ARCHIVE_INDEX_DIR', '/tmp/plagiarism-cache/archive')
+    ARCHIVE_TOP_K = 3
+    ARCHIVE_ANN_MIN_ROWS = 20000
     
+    # Analysis job queue (see worker.py)
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+    JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', 300))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_BACKOFF = int(os.getenv('JOB_RETRY_BACKOFF', 30))
+    JOB_POLL_INTERVAL = 2
+
+    # Analysis progress events (app/services/progress.py): postgres
+    # LISTEN/NOTIFY, a SQLite file shared on one host, or local; auto
+    # picks postgres for a PostgreSQL database
+    PROGRESS_TRANSPORT = os.getenv('PROGRESS_TRANSPORT', 'auto')
+    PROGRESS_BUS_PATH = os.getenv('PROGRESS_BUS_PATH', '/tmp/plagiarism-cache/progress.sqlite3')
+    PROGRESS_RETENTION = 600  # seconds of events kept for late subscribers
+    PROGRESS_STREAM_TIMEOUT = 60  # SSE connections end here; clients resume
+    PROGRESS_POLL_TIMEOUT = 25  # longest long-poll wait
+    # Waiting clients each hold a server thread (gunicorn --threads 8):
+    # at most this many per process, the rest are told to retry later
+    PROGRESS_MAX_WAITERS = int(os.getenv('PROGRESS_MAX_WAITERS', 6))
+    PROGRESS_RETRY_AFTER = 3  # seconds
+
+    # Metrics (GET /metrics): every process' snapshot is exported
+    # together, through METRICS_DIR (one host / shared volume) or, with
+    # METRICS_STORE=database, the database (separate hosts); see
+    # services/metrics.py. METRICS_TOKEN, if set, is required from scrapers
+    METRICS_STORE = os.getenv('METRICS_STORE', 'directory')
+    METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/plagiarism-cache/metrics')
+    METRICS_FLUSH_INTERVAL = 10  # seconds between snapshot writes
+    METRICS_RETENTION = 86400  # snapshots of processes idle this long are dropped
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
     # Web Scraping
     SCRAPER_MAX_RESULTS = 100
-    SCRAPER_TIMEOUT = 30
+    SCRAPER_TIMEOUT = 30  # overall retrieval deadline per analysis (seconds)
+    SCRAPER_REQUEST_TIMEOUT = 8
+    SCRAPER_MAX_WORKERS = int(os.getenv('SCRAPER_MAX_WORKERS', 8))
+    SCRAPER_PER_HOST_LIMIT = int(os.getenv('SCRAPER_PER_HOST_LIMIT', 2))
+    SEARCH_URL = os.getenv('SEARCH_URL', 'https://html.duckduckgo.com/html/?q={query}')
+
+    # Search / page cache (in-process LRU + shared SQLite file)
+    WEB_CACHE_PATH = os.getenv('WEB_CACHE_PATH', '/tmp/plagiarism-cache/web.sqlite3')
+    WEB_CACHE_TTL = int(os.getenv('WEB_CACHE_TTL', 86400))
+    WEB_CACHE_MAX_ENTRIES = int(os.getenv('WEB_CACHE_MAX_ENTRIES', 20000))
+    WEB_CACHE_MEMORY_ENTRIES = 1024
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -53,6 +147,14 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # In-memory SQLite has no connection pool to size
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    WEB_CACHE_PATH = None
+    EMBEDDING_CACHE_DIR = None
+    ARCHIVE_INDEX_DIR = None
+    PROGRESS_BUS_PATH = None
+    METRICS_STORE = 'none'
+    METRICS_DIR = None
     JWT_SECRET_KEY = '9f3d8b2c6a1e4f7d9c2b5e8a6f1d3c7b9e2f4a6d8c1b3e5f7a9d2c6b8e1f3'
 
 config = {
@@ -42,8 +42,13 @@ class Document(db.Model):
     file_type = db.Column(db.String(20), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
     content_hash = db.Column(db.String(64), unique=True, index=True)
+    file_hash = db.Column(db.String(64), nullable=True, index=True)  # sha256 of the uploaded bytes
     extracted_text = db.Column(db.Text, nullable=False)
     page_count = db.Column(db.Integer)
+    # extracting -> ready | failed (see tasks.extract_document)
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready', index=True)
+    extraction_error = db.Column(db.Text, nullable=True)
+    batch_id = db.Column(db.String(36), db.ForeignKey('analysis_batches.id'), nullable=True, index=True)
     analyses = db.relationship('Analysis', backref='document', lazy='dynamic', cascade='all, delete-orphan')
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
@@ -53,9 +58,24 @@ class Document(db.Model):
             'filename': self.original_filename,
             'file_type': self.file_type,
             'file_size': self.file_size,
+            'page_count': self.page_count,
+            'status': self.status,
+            'error': self.extraction_error,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class DocumentUpload(db.Model):
+    """
+    Uploaded bytes waiting for extraction (the worker may run on another
+    host), one row per UPLOAD_CHUNK_SIZE chunk (see utils/uploads.py)
+    """
+    __tablename__ = 'document_uploads'
+    
+    document_id = db.Column(db.String(36), db.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Analysis(db.Model):
     __tablename__ = 'analyses'
     
@@ -64,12 +84,18 @@ class Analysis(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
     overall_similarity = db.Column(db.Float, nullable=False, default=0.0)
     ai_generated_probability = db.Column(db.Float, nullable=True, default=0.0)
+    ai_details = db.Column(db.JSON, nullable=True)  # per-sentence AI probabilities + features
     plagiarism_matches = db.relationship('PlagiarismMatch', backref='analysis', lazy='dynamic', cascade='all, delete-orphan')
     status = db.Column(db.String(20), default='pending', index=True)
     error_message = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     completed_at = db.Column(db.DateTime, nullable=True)
     processing_time = db.Column(db.Float, nullable=True)
+    result_key = db.Column(db.String(64), nullable=True, index=True)  # DetectionEngine.result_key
+    config_key = db.Column(db.String(64), nullable=True, index=True)  # DetectionEngine.config_key
+    sentences_reused = db.Column(db.Integer, nullable=True)  # carried over from an earlier analysis
+    sentences_recomputed = db.Column(db.Integer, nullable=True)
+    batch_id = db.Column(db.String(36), db.ForeignKey('analysis_batches.id'), nullable=True, index=True)
     
     def to_dict(self):
         return {
@@ -80,7 +106,10 @@ class Analysis(db.Model):
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'processing_time': self.processing_time
+            'processing_time': self.processing_time,
+            'sentences_reused': self.sentences_reused,
+            'sentences_recomputed': self.sentences_recomputed,
+            'batch_id': self.batch_id
         }
 
 class PlagiarismMatch(db.Model):
@@ -121,4 +150,103 @@ class AnalysisLog(db.Model):
     analysis_id = db.Column(db.String(36), db.ForeignKey('analyses.id'), nullable=True)
     action = db.Column(db.String(100), nullable=False)
     details = db.Column(db.JSON, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class AnalysisBatch(db.Model):
+    __tablename__ = 'analysis_batches'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    # analysis: uploaded and analysed together (tasks.run_batch)
+    # collusion: existing documents compared pairwise only (tasks.run_collusion)
+    kind = db.Column(db.String(20), nullable=False, default='analysis', server_default='analysis')
+    # extracting -> queued -> processing -> completed | failed (see tasks.run_batch)
+    status = db.Column(db.String(20), nullable=False, default='extracting', index=True)
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    analyzed_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    pair_count = db.Column(db.Integer, nullable=False, default=0)
+    details = db.Column(db.JSON, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    analyses = db.relationship('Analysis', backref='batch', lazy='dynamic')
+    pairs = db.relationship('BatchPair', backref='batch', lazy='dynamic', cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'kind': self.kind,
+            'status': self.status,
+            'document_count': self.document_count,
+            'analyzed_count': self.analyzed_count,
+            'failed_count': self.failed_count,
+            'pair_count': self.pair_count,
+            'details': self.details,
+            'error': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class BatchPair(db.Model):
+    __tablename__ = 'batch_pairs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    batch_id = db.Column(db.String(36), db.ForeignKey('analysis_batches.id'), nullable=False, index=True)
+    document_a_id = db.Column(db.String(36), db.ForeignKey('documents.id'), nullable=False)
+    document_b_id = db.Column(db.String(36), db.ForeignKey('documents.id'), nullable=False)
+    similarity = db.Column(db.Float, nullable=False, index=True)
+    matched_sentences = db.Column(db.Integer, nullable=False, default=0)
+    details = db.Column(db.JSON, nullable=True)  # aligned sentence pairs
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_a_id': self.document_a_id,
+            'document_b_id': self.document_b_id,
+            'similarity': self.similarity,
+            'matched_sentences': self.matched_sentences,
+            'details': self.details
+        }
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(30), nullable=False, default='analysis')
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    analysis_id = db.Column(db.String(36), db.ForeignKey('analyses.id', ondelete='CASCADE'), nullable=True, index=True)
+    document_id = db.Column(db.String(36), nullable=True)
+    payload = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'analysis_id': self.analysis_id,
+            'document_id': self.document_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class MetricsSnapshot(db.Model):
+    """Last metrics snapshot of one process, for METRICS_STORE=database"""
+    __tablename__ = 'metrics_snapshots'
+    
+    process = db.Column(db.String(200), primary_key=True)  # host:pid
+    snapshot = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -2,5 +2,8 @@ from .auth import auth_bp
 from .upload import upload_bp
 from .analysis import analysis_bp
 from .results import results_bp
+from .health import health_bp
+from .batch import batch_bp
+from .metrics import metrics_bp
 
-__all__ = ['auth_bp', 'upload_bp', 'analysis_bp', 'results_bp']
\ No newline at end of file
+__all__ = ['auth_bp', 'upload_bp', 'analysis_bp', 'results_bp', 'health_bp', 'batch_bp', 'metrics_bp']
\ No newline at end of file
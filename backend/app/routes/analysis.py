@@ -1,115 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+import json
+import time
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models import Document, Analysis, PlagiarismMatch, AnalysisLog
-from app.services.detection_engine import DetectionEngine
-from datetime import datetime
-import time
-import threading
+from app.models import Document, Analysis, AnalysisLog
+from app.services.job_queue import queue
+from app.services.progress import progress_bus, TERMINAL_EVENTS
 
 analysis_bp = Blueprint("analysis", __name__)
-engine = DetectionEngine()
-
-
-# ==========================================================
-# BACKGROUND ANALYSIS TASK
-# ==========================================================
-
-def run_analysis(app, analysis_id, document_id, user_id):
-    """
-    Background task for running plagiarism + AI analysis
-    """
-
-    with app.app_context():  # CRITICAL FIX for background threads
-        try:
-            analysis = Analysis.query.get(analysis_id)
-            document = Document.query.get(document_id)
-
-            if not analysis or not document:
-                return
-
-            analysis.status = "processing"
-            db.session.commit()
-
-            start_time = time.time()
-
-            # ===============================
-            # Run Detection Engine
-            # ===============================
-            result = engine.analyze_text(document.extracted_text)
-
-            plagiarism_score = result["plagiarism_score"]
-            ai_probability = result["ai_probability"]
-            matches = result["plagiarism_matches"]
-
-            # ===============================
-            # Save Matches
-            # ===============================
-            for match in matches:
-                db_match = PlagiarismMatch(
-                    analysis_id=analysis_id,
-                    source_url=match["source_url"],
-                    source_title=match["source_url"],
-                    matched_text=match["matched_text"],
-                    original_text=match["matched_text"],
-                    similarity_score=match["similarity_score"],
-                    match_type="web_semantic",
-                    start_index=0,
-                    end_index=len(match["matched_text"])
-                )
-                db.session.add(db_match)
-
-            # ===============================
-            # Update Analysis Record
-            # ===============================
-            analysis.overall_similarity = plagiarism_score
-            analysis.ai_generated_probability = ai_probability
-            analysis.status = "completed"
-            analysis.completed_at = datetime.utcnow()
-            analysis.processing_time = round(
-                time.time() - start_time,
-                2
-            )
-
-            db.session.commit()
-
-            # ===============================
-            # Log Completion
-            # ===============================
-            log = AnalysisLog(
-                user_id=user_id,
-                analysis_id=analysis_id,
-                action="analysis_completed",
-                details={
-                    "similarity": plagiarism_score,
-                    "ai_probability": ai_probability,
-                    "match_count": len(matches)
-                }
-            )
-
-            db.session.add(log)
-            db.session.commit()
-
-        except Exception as e:
-            print(f"Analysis error: {str(e)}")
-
-            analysis = Analysis.query.get(analysis_id)
-
-            if analysis:
-                analysis.status = "failed"
-                analysis.error_message = str(e)
-                analysis.completed_at = datetime.utcnow()
-                db.session.commit()
-
-                log = AnalysisLog(
-                    user_id=user_id,
-                    analysis_id=analysis_id,
-                    action="analysis_failed",
-                    details={"error": str(e)}
-                )
-
-                db.session.add(log)
-                db.session.commit()
 
 
 # ==========================================================
@@ -134,10 +32,16 @@ def start_analysis():
     if not document:
         return jsonify({"error": "Document not found"}), 404
 
+    if document.status != "ready":
+        return jsonify({
+            "error": "Document text is not available",
+            "status": document.status
+        }), 409
+
     # Prevent duplicate processing
     existing_analysis = (
         Analysis.query.filter_by(document_id=document.id)
-        .filter(Analysis.status.in_(["processing", "completed"]))
+        .filter(Analysis.status.in_(["pending", "processing", "completed"]))
         .first()
     )
 
@@ -157,7 +61,7 @@ def start_analysis():
         )
 
         db.session.add(analysis)
-        db.session.commit()
+        db.session.flush()
 
         # Log start
         log = AnalysisLog(
@@ -168,20 +72,16 @@ def start_analysis():
         )
 
         db.session.add(log)
-        db.session.commit()
 
-        # Run in background thread
-        thread = threading.Thread(
-            target=run_analysis,
-            args=(
-                current_app._get_current_object(),
-                analysis.id,
-                document.id,
-                user_id
-            ),
-            daemon=True
+        # Hand off to the worker pool (see worker.py). One commit: an
+        # analysis is never stored without the job that runs it
+        queue.enqueue(
+            "analysis",
+            user_id,
+            analysis_id=analysis.id,
+            document_id=document.id
         )
-        thread.start()
+        db.session.commit()
 
         return jsonify({
             "message": "Analysis started",
@@ -216,6 +116,143 @@ def check_analysis_status(analysis_id):
     return jsonify(analysis.to_dict()), 200
 
 
+# ==========================================================
+# PROGRESS (long-poll / server-sent events)
+# ==========================================================
+#
+# Both read events from the in-memory progress bus: one ownership check
+# per request, then no database queries while the client waits.
+
+@analysis_bp.route("/progress/<analysis_id>", methods=["GET"])
+@jwt_required()
+def analysis_progress(analysis_id):
+    """
+    Long-poll: events after ?after=<event id>, waiting up to ?timeout
+    seconds for the first one. Poll again with the returned last_event_id
+    until done is true.
+    """
+
+    user_id = get_jwt_identity()
+
+    analysis = Analysis.query.filter_by(
+        id=analysis_id,
+        user_id=user_id
+    ).first()
+
+    if not analysis:
+        return jsonify({"error": "Analysis not found"}), 404
+
+    after = request.args.get("after", 0, type=int)
+    snapshot = analysis.to_dict()
+
+    if analysis.status in ("completed", "failed"):
+        return jsonify({
+            "events": [],
+            "last_event_id": after,
+            "done": True,
+            "analysis": snapshot
+        }), 200
+
+    # Release the connection before waiting
+    db.session.close()
+
+    max_timeout = current_app.config.get("PROGRESS_POLL_TIMEOUT", 25)
+    timeout = min(max(request.args.get("timeout", max_timeout, type=float), 0), max_timeout)
+
+    # Too many waiting already: answer now, the client retries later
+    with progress_bus.waiter_slot() as admitted:
+        events, last_event_id, final = progress_bus.poll(
+            analysis_id, after=after, timeout=timeout if admitted else 0
+        )
+
+    # Failed events, and completed ones cut down to fit a NOTIFY, don't
+    # carry the analysis: read its final state
+    if final and "analysis" not in final["data"]:
+        snapshot = db.session.get(Analysis, analysis_id).to_dict()
+
+    response = {
+        "events": events,
+        "last_event_id": last_event_id,
+        "done": final is not None,
+        "analysis": final["data"].get("analysis", snapshot) if final else snapshot
+    }
+    if not admitted:
+        response["retry_after"] = current_app.config.get("PROGRESS_RETRY_AFTER", 3)
+
+    return jsonify(response), 200
+
+
+@analysis_bp.route("/stream/<analysis_id>", methods=["GET"])
+@jwt_required()
+def stream_analysis(analysis_id):
+    """
+    text/event-stream of progress events, starting with a "status" event
+    for the current state. The stream ends after "completed"/"failed" or
+    PROGRESS_STREAM_TIMEOUT; reconnecting with Last-Event-ID resumes.
+    """
+
+    user_id = get_jwt_identity()
+
+    analysis = Analysis.query.filter_by(
+        id=analysis_id,
+        user_id=user_id
+    ).first()
+
+    if not analysis:
+        return jsonify({"error": "Analysis not found"}), 404
+
+    snapshot = analysis.to_dict()
+    finished = analysis.status in ("completed", "failed")
+    after = request.headers.get("Last-Event-ID", type=int) or request.args.get("after", 0, type=int)
+    stream_timeout = current_app.config.get("PROGRESS_STREAM_TIMEOUT", 60)
+    retry_ms = int(current_app.config.get("PROGRESS_RETRY_AFTER", 3) * 1000)
+    db.session.close()
+
+    def generate():
+        yield f"retry: {retry_ms}\n\n"
+        yield _sse("status", {"status": snapshot["status"], "analysis": snapshot})
+        if finished:
+            return
+
+        # Too many waiting already: close, the browser reconnects after retry
+        with progress_bus.waiter_slot() as admitted:
+            if not admitted:
+                return
+
+            last_id = after
+            deadline = time.monotonic() + stream_timeout
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+
+                events = progress_bus.wait(analysis_id, after=last_id, timeout=min(15, remaining))
+                if not events:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+
+                for event in events:
+                    last_id = event["id"]
+                    yield _sse(event["event"], event["data"], event["id"])
+                    if event["event"] in TERMINAL_EVENTS:
+                        return
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
 # ==========================================================
 # LIST ANALYSES
 # ==========================================================
@@ -0,0 +1,419 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
+from app import db
+from app.models import Document, Analysis, AnalysisBatch, BatchPair, AnalysisLog
+from app.services.job_queue import queue
+from app.services.progress import progress_bus
+from app.services.tasks import queue_batch_if_extracted
+from app.utils.validators import allowed_file
+from app.utils.uploads import read_stream, store_upload, FileTooLarge
+import os
+import hashlib
+import zipfile
+
+batch_bp = Blueprint("batch", __name__)
+
+
+# ==========================================================
+# BATCH UPLOAD
+# ==========================================================
+#
+# A whole class at once: many files in "files" (multipart) and/or zip
+# archives of them. Every file becomes a Document and an Analysis, and
+# the batch is analysed by a single job once all texts are extracted
+# (tasks.run_batch), sharing searches, fetches and embeddings.
+
+@batch_bp.route("/", methods=["POST"])
+@jwt_required()
+def create_batch():
+
+    user_id = get_jwt_identity()
+    uploads = request.files.getlist("files")
+
+    if not uploads or all(upload.filename == "" for upload in uploads):
+        return jsonify({"error": "No files provided"}), 400
+
+    max_documents = current_app.config.get("BATCH_MAX_DOCUMENTS", 500)
+    max_total = current_app.config.get("BATCH_MAX_TOTAL_SIZE", 500 * 1024 * 1024)
+
+    batch = AnalysisBatch(
+        user_id=user_id,
+        name=(request.form.get("name") or "Untitled batch")[:255],
+        status="extracting"
+    )
+    db.session.add(batch)
+    db.session.flush()
+
+    stored = []
+    skipped = []
+    total_size = 0
+
+    try:
+        for upload in uploads:
+            if upload.filename.lower().endswith(".zip"):
+                members = _zip_members(upload.stream, skipped)
+            else:
+                members = [(upload.filename, lambda upload=upload: upload.stream)]
+
+            for filename, open_stream in members:
+                if len(stored) >= max_documents:
+                    skipped.append({"filename": filename, "error": f"Batch limit of {max_documents} documents"})
+                    continue
+
+                if not allowed_file(filename):
+                    skipped.append({"filename": filename, "error": "File type not allowed"})
+                    continue
+
+                with open_stream() as stream:
+                    document, error = _store_file(user_id, batch.id, filename, stream,
+                                                  max_total - total_size)
+                if error:
+                    skipped.append({"filename": filename, "error": error})
+                    continue
+
+                total_size += document.file_size
+                stored.append(document)
+
+        if not stored:
+            db.session.rollback()
+            return jsonify({"error": "No usable files in the batch", "skipped": skipped}), 400
+
+        for document in stored:
+            db.session.add(Analysis(
+                document_id=document.id,
+                user_id=user_id,
+                batch_id=batch.id,
+                overall_similarity=0.0,
+                ai_generated_probability=0.0,
+                status="pending"
+            ))
+            if document.status == "extracting":
+                queue.enqueue("extract_document", user_id, document_id=document.id)
+            else:
+                queue.enqueue("index_document", user_id, document_id=document.id)
+
+        batch.document_count = len(stored)
+        db.session.add(AnalysisLog(
+            user_id=user_id,
+            action="batch_uploaded",
+            details={"batch_id": batch.id, "documents": len(stored), "skipped": len(skipped)}
+        ))
+        db.session.commit()
+
+        # Every text reused from earlier uploads: nothing to wait for
+        queue_batch_if_extracted(batch.id)
+
+        return jsonify({
+            "message": "Batch uploaded, extracting text",
+            "batch": db.session.get(AnalysisBatch, batch.id).to_dict(),
+            "skipped": skipped
+        }), 202
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Batch upload error: {str(e)}"}), 500
+
+
+def _zip_members(stream, skipped):
+    """(filename, opener) for each file in a zip archive"""
+
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        skipped.append({"filename": "archive", "error": "Not a valid zip archive"})
+        return []
+
+    return [
+        (os.path.basename(info.filename), lambda info=info: archive.open(info))
+        for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+
+
+def _store_file(user_id, batch_id, filename, stream, remaining):
+    """Save one batch file as a Document (not committed). Returns (document, error)."""
+
+    filename = secure_filename(filename)
+    if "." not in filename:
+        return None, "File type not allowed"
+    file_ext = filename.rsplit(".", 1)[1].lower()
+
+    max_size = min(current_app.config.get("MAX_CONTENT_LENGTH", 50 * 1024 * 1024), remaining)
+    unique_filename = f"{hashlib.sha256(os.urandom(16)).hexdigest()}.{file_ext}"
+
+    chunk_size = current_app.config.get("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+    try:
+        upload, file_hash, size = read_stream(
+            stream,
+            max_size,
+            chunk_size=chunk_size,
+            directory=current_app.config["UPLOAD_FOLDER"]
+        )
+    except FileTooLarge:
+        return None, "File too large"
+
+    # Same bytes already extracted (by anyone): reuse the text
+    extracted = Document.query.filter_by(file_hash=file_hash, status="ready").first()
+
+    document = Document(
+        user_id=user_id,
+        batch_id=batch_id,
+        filename=unique_filename,
+        original_filename=filename,
+        file_path="",
+        file_type=file_ext,
+        file_size=size,
+        file_hash=file_hash,
+        extracted_text=extracted.extracted_text if extracted else "",
+        page_count=extracted.page_count if extracted else None,
+        status="ready" if extracted else "extracting"
+    )
+    db.session.add(document)
+    db.session.flush()
+
+    # Bytes wait in the database for the extraction worker, sent a chunk
+    # at a time so a large batch is never held in memory
+    with upload:
+        if not extracted:
+            store_upload(document.id, upload, chunk_size)
+
+    return document, None
+
+
+# ==========================================================
+# COLLUSION CHECK
+# ==========================================================
+#
+# Compare documents already uploaded (e.g. a whole course's submissions)
+# with each other only: no web search. JSON {"document_ids": [...],
+# "name", "top_k"}. The best pairs land in GET /<id>/pairs.
+
+@batch_bp.route("/collusion", methods=["POST"])
+@jwt_required()
+def create_collusion_check():
+
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    document_ids = list(dict.fromkeys(data.get("document_ids") or []))
+
+    max_documents = current_app.config.get("COLLUSION_MAX_DOCUMENTS", 5000)
+
+    if len(document_ids) < 2:
+        return jsonify({"error": "At least two document_ids are required"}), 400
+
+    if len(document_ids) > max_documents:
+        return jsonify({"error": f"At most {max_documents} documents per check"}), 400
+
+    owned = {
+        document_id
+        for (document_id,) in db.session.query(Document.id)
+        .filter(Document.user_id == user_id, Document.id.in_(document_ids), Document.status == "ready")
+    }
+    missing = [document_id for document_id in document_ids if document_id not in owned]
+
+    if len(owned) < 2:
+        return jsonify({"error": "Fewer than two of these documents are ready", "missing": missing}), 400
+
+    top_k = data.get("top_k")
+    if top_k is not None and (not isinstance(top_k, int) or top_k < 1):
+        return jsonify({"error": "top_k must be a positive integer"}), 400
+
+    batch = AnalysisBatch(
+        user_id=user_id,
+        name=(data.get("name") or "Collusion check")[:255],
+        kind="collusion",
+        status="queued",
+        document_count=len(owned),
+        details={
+            "document_ids": [document_id for document_id in document_ids if document_id in owned],
+            "top_k": top_k
+        }
+    )
+    db.session.add(batch)
+    db.session.flush()
+
+    queue.enqueue("collusion", user_id, payload={"batch_id": batch.id})
+    db.session.add(AnalysisLog(
+        user_id=user_id,
+        action="collusion_requested",
+        details={"batch_id": batch.id, "documents": len(owned)}
+    ))
+    db.session.commit()
+
+    return jsonify({
+        "message": "Collusion check queued",
+        "batch": batch.to_dict(),
+        "missing": missing
+    }), 202
+
+
+# ==========================================================
+# LIST BATCHES
+# ==========================================================
+
+@batch_bp.route("/list", methods=["GET"])
+@jwt_required()
+def list_batches():
+
+    user_id = get_jwt_identity()
+
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", 10, type=int), 50)
+
+    batches = (
+        AnalysisBatch.query
+        .filter_by(user_id=user_id)
+        .order_by(AnalysisBatch.created_at.desc())
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+    return jsonify({
+        "batches": [batch.to_dict() for batch in batches.items],
+        "total": batches.total,
+        "pages": batches.pages,
+        "current_page": page
+    }), 200
+
+
+# ==========================================================
+# BATCH STATUS + MEMBERS
+# ==========================================================
+
+@batch_bp.route("/<batch_id>", methods=["GET"])
+@jwt_required()
+def get_batch(batch_id):
+
+    user_id = get_jwt_identity()
+    batch = AnalysisBatch.query.filter_by(id=batch_id, user_id=user_id).first()
+
+    if not batch:
+        return jsonify({"error": "Batch not found"}), 404
+
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", 50, type=int), 200)
+
+    # Collusion checks have documents but no analyses
+    if batch.kind == "collusion":
+        members = (
+            Document.query
+            .filter(Document.id.in_((batch.details or {}).get("document_ids", [])))
+            .order_by(Document.original_filename.asc())
+            .paginate(page=page, per_page=per_page, error_out=False)
+        )
+        documents = [{"document": document.to_dict()} for document in members.items]
+    else:
+        members = (
+            db.session.query(Analysis, Document)
+            .join(Document, Analysis.document_id == Document.id)
+            .filter(Analysis.batch_id == batch.id)
+            .order_by(Document.original_filename.asc())
+            .paginate(page=page, per_page=per_page, error_out=False)
+        )
+        documents = [
+            {"document": document.to_dict(), "analysis": analysis.to_dict()}
+            for analysis, document in members.items
+        ]
+
+    return jsonify({
+        "batch": batch.to_dict(),
+        "documents": documents,
+        "total": members.total,
+        "pages": members.pages,
+        "current_page": page
+    }), 200
+
+
+# ==========================================================
+# PAIRWISE SIMILARITY
+# ==========================================================
+
+@batch_bp.route("/<batch_id>/pairs", methods=["GET"])
+@jwt_required()
+def get_batch_pairs(batch_id):
+
+    user_id = get_jwt_identity()
+    batch = AnalysisBatch.query.filter_by(id=batch_id, user_id=user_id).first()
+
+    if not batch:
+        return jsonify({"error": "Batch not found"}), 404
+
+    page = request.args.get("page", 1, type=int)
+    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    similarity_min = request.args.get("similarity_min", 0.0, type=float)
+
+    pairs = (
+        BatchPair.query
+        .filter_by(batch_id=batch.id)
+        .filter(BatchPair.similarity >= similarity_min)
+        .order_by(BatchPair.similarity.desc())
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+    document_ids = {pair.document_a_id for pair in pairs.items} | {pair.document_b_id for pair in pairs.items}
+    filenames = dict(
+        db.session.query(Document.id, Document.original_filename)
+        .filter(Document.id.in_(document_ids))
+    ) if document_ids else {}
+
+    return jsonify({
+        "pairs": [
+            {
+                **pair.to_dict(),
+                "document_a": filenames.get(pair.document_a_id),
+                "document_b": filenames.get(pair.document_b_id)
+            }
+            for pair in pairs.items
+        ],
+        "total": pairs.total,
+        "pages": pairs.pages,
+        "current_page": page
+    }), 200
+
+
+# ==========================================================
+# BATCH PROGRESS (long-poll)
+# ==========================================================
+
+@batch_bp.route("/<batch_id>/progress", methods=["GET"])
+@jwt_required()
+def batch_progress(batch_id):
+    """Same protocol as GET /api/analysis/progress/<id>"""
+
+    user_id = get_jwt_identity()
+    batch = AnalysisBatch.query.filter_by(id=batch_id, user_id=user_id).first()
+
+    if not batch:
+        return jsonify({"error": "Batch not found"}), 404
+
+    after = request.args.get("after", 0, type=int)
+    snapshot = batch.to_dict()
+
+    if batch.status in ("completed", "failed"):
+        return jsonify({"events": [], "last_event_id": after, "done": True, "batch": snapshot}), 200
+
+    db.session.close()
+
+    max_timeout = current_app.config.get("PROGRESS_POLL_TIMEOUT", 25)
+    timeout = min(max(request.args.get("timeout", max_timeout, type=float), 0), max_timeout)
+
+    with progress_bus.waiter_slot() as admitted:
+        events, last_event_id, final = progress_bus.poll(
+            batch_id, after=after, timeout=timeout if admitted else 0
+        )
+
+    if final and "batch" not in final["data"]:
+        snapshot = db.session.get(AnalysisBatch, batch_id).to_dict()
+
+    response = {
+        "events": events,
+        "last_event_id": last_event_id,
+        "done": final is not None,
+        "batch": final["data"].get("batch", snapshot) if final else snapshot
+    }
+    if not admitted:
+        response["retry_after"] = current_app.config.get("PROGRESS_RETRY_AFTER", 3)
+
+    return jsonify(response), 200
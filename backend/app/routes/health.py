@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify, current_app
+from sqlalchemy import text
+from app import db
+from app.services import engine
+
+health_bp = Blueprint("health", __name__)
+
+
+# ==========================================================
+# LIVENESS
+# ==========================================================
+
+@health_bp.route("/live", methods=["GET"])
+def live():
+    return jsonify({"status": "ok"}), 200
+
+
+# ==========================================================
+# READINESS
+# ==========================================================
+
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """
+    OK once the database answers and, in preload mode, the detection
+    engine has finished warming up
+    """
+
+    checks = {"engine": engine.readiness()}
+
+    try:
+        db.session.execute(text("SELECT 1"))
+        checks["database"] = True
+    except Exception:
+        db.session.rollback()
+        checks["database"] = False
+
+    warm = engine.ready or not current_app.config.get("PRELOAD_MODEL")
+    is_ready = checks["database"] and warm
+
+    return jsonify({
+        "status": "ready" if is_ready else "warming",
+        "checks": checks
+    }), 200 if is_ready else 503
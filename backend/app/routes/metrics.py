@@ -0,0 +1,25 @@
+import hmac
+from flask import Blueprint, Response, request, jsonify, current_app
+from app.services.metrics import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+# ==========================================================
+# PROMETHEUS SCRAPE ENDPOINT
+# ==========================================================
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def export_metrics():
+    """
+    Metrics of every process writing to the shared METRICS_STORE (see
+    services/metrics.py) in Prometheus text format. With METRICS_TOKEN set, scrapers must send it as a bearer token.
+    """
+
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
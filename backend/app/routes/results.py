@@ -50,6 +50,9 @@ def get_analysis_results(analysis_id):
         for match in matches
     ]
 
+    # Per-sentence AI probabilities, for highlighting alongside the matches
+    ai_segments = (analysis.ai_details or {}).get("sentences", [])
+
     return jsonify({
         "analysis": analysis.to_dict(),
         "document": {
@@ -62,6 +65,8 @@ def get_analysis_results(analysis_id):
         "processing_time": analysis.processing_time,
         "total_matches": len(matches),
         "highlighted_segments": highlighted_segments,
+        "ai_segments": ai_segments,
+        "ai_features": (analysis.ai_details or {}).get("features", {}),
         "matches": [match.to_dict() for match in matches]
     }), 200
 
@@ -155,6 +160,7 @@ def export_results(analysis_id):
         "document": document.to_dict(),
         "overall_similarity": analysis.overall_similarity,
         "ai_generated_probability": analysis.ai_generated_probability,
+        "ai_details": analysis.ai_details,
         "processing_time": analysis.processing_time,
         "total_matches": len(matches),
         "matches": [match.to_dict() for match in matches]
@@ -2,14 +2,14 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from app import db
-from app.models import Document, AnalysisLog
-from app.services.detection_engine import DetectionEngine
+from app.models import Document, AnalysisLog, BatchPair
+from app.services.job_queue import queue
 from app.utils.validators import allowed_file
+from app.utils.uploads import read_stream, store_upload, clear_upload, FileTooLarge
 import os
 import hashlib
 
 upload_bp = Blueprint("upload", __name__)
-file_processor = DetectionEngine()
 
 
 # ==========================================================
@@ -35,83 +35,115 @@ def upload_document():
             "error": f"Allowed types: {', '.join(current_app.config['ALLOWED_EXTENSIONS'])}"
         }), 400
 
-    file_path = None
-
     try:
-        # Enforce size limit
         max_size = current_app.config.get("MAX_CONTENT_LENGTH", 50 * 1024 * 1024)
-        file.seek(0, os.SEEK_END)
-        size = file.tell()
-        file.seek(0)
-
-        if size > max_size:
-            return jsonify({"error": "File too large"}), 413
-
-        os.makedirs(current_app.config["UPLOAD_FOLDER"], exist_ok=True)
 
         filename = secure_filename(file.filename)
         file_ext = filename.rsplit(".", 1)[1].lower()
 
         unique_filename = f"{hashlib.sha256(os.urandom(16)).hexdigest()}.{file_ext}"
-        file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], unique_filename)
-
-        file.save(file_path)
-
-        extracted_text = file_processor.extract_text_from_file(file_path, file_ext)
-
 
-        if not extracted_text or not extracted_text.strip():
-            os.remove(file_path)
-            return jsonify({"error": "No readable text found"}), 400
-
-        extracted_text = extracted_text[:200000]  # safety limit
-
-        content_hash = hashlib.sha256(extracted_text.encode()).hexdigest()
+        # Read in chunks into a temporary file, hashing the raw bytes on
+        # the way
+        chunk_size = current_app.config.get("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+        try:
+            upload, file_hash, size = read_stream(
+                file.stream,
+                max_size,
+                chunk_size=chunk_size,
+                directory=current_app.config["UPLOAD_FOLDER"]
+            )
+        except FileTooLarge:
+            return jsonify({"error": "File too large"}), 413
 
+        # Exact re-upload: answered before any parsing
         existing = Document.query.filter_by(
-            content_hash=content_hash,
+            file_hash=file_hash,
             user_id=user_id
-        ).first()
+        ).filter(Document.status != "failed").first()
 
         if existing:
-            os.remove(file_path)
+            upload.close()
             return jsonify({
                 "message": "Document already uploaded",
                 "document": existing.to_dict()
             }), 409
 
+        # Same bytes from another user: reuse the extracted text
+        extracted = Document.query.filter_by(
+            file_hash=file_hash,
+            status="ready"
+        ).first()
+
+        if extracted:
+            upload.close()
+            document = Document(
+                user_id=user_id,
+                filename=unique_filename,
+                original_filename=filename,
+                file_path="",
+                file_type=file_ext,
+                file_size=size,
+                file_hash=file_hash,
+                extracted_text=extracted.extracted_text,
+                page_count=extracted.page_count,
+                status="ready"
+            )
+            db.session.add(document)
+            db.session.flush()
+
+            db.session.add(AnalysisLog(
+                user_id=user_id,
+                action="document_uploaded",
+                details={"document_id": document.id, "reused_extraction": extracted.id}
+            ))
+
+            queue.enqueue("index_document", user_id, document_id=document.id)
+            db.session.commit()
+
+            return jsonify({
+                "message": "Document uploaded successfully",
+                "document": document.to_dict()
+            }), 201
+
+        # Text is extracted in the worker pool (tasks.extract_document),
+        # possibly on another host, so the bytes wait in the database;
+        # poll GET /document/<id> until status is "ready" or "failed"
         document = Document(
             user_id=user_id,
             filename=unique_filename,
             original_filename=filename,
-            file_path=file_path,
+            file_path="",
             file_type=file_ext,
             file_size=size,
-            content_hash=content_hash,
-            extracted_text=extracted_text
+            file_hash=file_hash,
+            extracted_text="",
+            status="extracting"
         )
 
         db.session.add(document)
         db.session.flush()
 
+        with upload:
+            store_upload(document.id, upload, chunk_size)
+
         log = AnalysisLog(
             user_id=user_id,
             action="document_uploaded",
             details={"document_id": document.id}
         )
         db.session.add(log)
+
+        queue.enqueue("extract_document", user_id, document_id=document.id)
         db.session.commit()
 
         return jsonify({
-            "message": "Document uploaded successfully",
+            "message": "Document uploaded, extracting text",
             "document": document.to_dict()
-        }), 201
+        }), 202
 
     except Exception as e:
         db.session.rollback()
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
-
         return jsonify({"error": f"Upload error: {str(e)}"}), 500
 
 
@@ -134,17 +166,14 @@ def upload_text():
     if len(text) < 50:
         return jsonify({"error": "Text must be at least 50 characters"}), 400
 
-    text = text[:200000]  # safety cap
+    text = text[:current_app.config.get("MAX_EXTRACTED_CHARS", 200000)]  # safety cap
 
     try:
         content_hash = hashlib.sha256(text.encode()).hexdigest()
 
-        existing = Document.query.filter_by(
-            content_hash=content_hash,
-            user_id=user_id
-        ).first()
+        existing = Document.query.filter_by(content_hash=content_hash).first()
 
-        if existing:
+        if existing and existing.user_id == user_id:
             return jsonify({
                 "message": "Text already submitted",
                 "document": existing.to_dict()
@@ -157,7 +186,9 @@ def upload_text():
             file_path="",
             file_type="txt",
             file_size=len(text),
-            content_hash=content_hash,
+            # content_hash is unique across users; another user's identical
+            # text keeps it (results are still shared via result_key)
+            content_hash=None if existing else content_hash,
             extracted_text=text
         )
 
@@ -170,6 +201,9 @@ def upload_text():
             details={"document_id": document.id}
         )
         db.session.add(log)
+
+        # Add to the archive indexes in the worker pool
+        queue.enqueue("index_document", user_id, document_id=document.id)
         db.session.commit()
 
         return jsonify({
@@ -259,7 +293,14 @@ def delete_document(doc_id):
         if document.file_path and os.path.exists(document.file_path):
             os.remove(document.file_path)
 
+        BatchPair.query.filter(
+            (BatchPair.document_a_id == document.id) | (BatchPair.document_b_id == document.id)
+        ).delete(synchronize_session=False)
+        clear_upload(document.id)
         db.session.delete(document)
+        # The archive indexes live with the worker (ARCHIVE_INDEX_DIR on
+        # its host), so it removes the document from them
+        queue.enqueue("remove_document", user_id, document_id=doc_id)
         db.session.commit()
 
         return jsonify({"message": "Document deleted"}), 200
@@ -1,2 +1,6 @@
 from .detection_engine import DetectionEngine
-__all__ = ["DetectionEngine"]
+
+# Shared engine instance (configured in create_app)
+engine = DetectionEngine()
+
+__all__ = ["DetectionEngine", "engine"]
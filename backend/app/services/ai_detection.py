@@ -0,0 +1,319 @@
+import re
+import time
+import numpy as np
+
+# ==========================================================
+# AI-GENERATED TEXT DETECTION
+# ==========================================================
+#
+# Probability that each sentence was machine generated, from features
+# computed for all sentences at once, each sentence seen in a window of
+# its neighbours (one sentence carries too little signal):
+#
+#   burstiness              variation of sentence length; generated text
+#                           is unusually even
+#   lexical_diversity       distinct words / sqrt(words) in the window
+#   generated_words         rate of connectives and formal function words
+#                           generated text overuses ("moreover", "thus")
+#   personal_words          rate of personal / hedging function words it
+#                           avoids ("i", "just", "maybe", contractions)
+#   comma_rate              commas and semicolons per word
+#   expressive_punctuation  ! ? ( ) " and dashes per word
+#   log_likelihood          optional: mean token log-probability under a
+#                           small causal LM (AI_DETECTOR_LM); generated
+#                           text is unusually predictable
+#
+# Each feature is standardised against reference values for human
+# prose and the weighted sum goes through a logistic (FEATURES, BIAS;
+# AI_DETECTOR_WEIGHTS overrides them). The document probability is the
+# length-weighted mean over sentences, pulled towards PRIOR for short
+# texts.
+#
+# CPU time is bounded: the stylometry is linear in the number of words;
+# the LM scores sentences in padded batches, longest first, until
+# seconds_per_10k_words (scaled to the text) runs out. Sentences it
+# didn't reach keep their stylometric score, as does the whole text when
+# the LM can't be loaded or fails.
+
+# name: (reference mean, reference std, weight)
+FEATURES = {
+    "burstiness": (0.45, 0.2, -1.0),
+    "lexical_diversity": (6.5, 1.0, -0.3),
+    "generated_words": (0.006, 0.006, 0.8),
+    "personal_words": (0.03, 0.025, -0.8),
+    "comma_rate": (0.05, 0.03, 0.3),
+    "expressive_punctuation": (0.01, 0.012, -0.6),
+    "log_likelihood": (-4.0, 0.8, 1.5),
+}
+BIAS = -1.0
+PRIOR = 0.1
+
+GENERATED_WORDS = (
+    "additionally", "furthermore", "moreover", "overall", "however",
+    "therefore", "thus", "hence", "consequently", "notably", "ultimately",
+    "whereas", "whilst", "various", "within", "throughout", "both",
+)
+
+PERSONAL_WORDS = (
+    "i", "me", "my", "i'm", "i've", "i'd", "you", "just", "really",
+    "actually", "maybe", "pretty", "anyway", "stuff", "guess", "ok",
+    "don't", "didn't", "can't", "won't", "it's", "that's", "isn't",
+)
+
+WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?|\d+")
+COMMAS = (",", ";")
+EXPRESSIVE = ("!", "?", "(", ")", '"', "—", " - ")
+
+
+class AIDetector:
+
+    def __init__(self, scorer=None, weights=None, window=2, min_sentences=3,
+                 full_confidence_words=150, seconds_per_10k_words=5.0, min_seconds=0.5):
+        self.scorer = scorer
+        self.features = dict(FEATURES, **(weights or {}))
+        self.bias = self.features.pop("bias", BIAS)
+        self.window = window
+        self.min_sentences = min_sentences
+        self.full_confidence_words = full_confidence_words
+        self.seconds_per_10k_words = seconds_per_10k_words
+        self.min_seconds = min_seconds
+
+    def config_key(self):
+        """Everything that changes the scores, for DetectionEngine.result_key"""
+        return {
+            "features": self.features,
+            "bias": self.bias,
+            "window": self.window,
+            "lm": self.scorer.model_name if self.scorer else None
+        }
+
+    def detect(self, text, spans, deadline=None):
+        """
+        spans: (sentence, start, end) as from DetectionEngine._sentence_spans.
+        Returns {"probability", "sentences": [{"start", "end",
+        "probability"}], "features": document means, "lm_sentences":
+        sentences the LM scored}.
+        """
+
+        started = time.monotonic()
+
+        if len(spans) < self.min_sentences:
+            return {
+                "probability": PRIOR,
+                "sentences": [
+                    {"start": start, "end": end, "probability": PRIOR}
+                    for _, start, end in spans
+                ],
+                "features": {},
+                "lm_sentences": 0
+            }
+
+        sentences = [sentence for sentence, _, _ in spans]
+        # The splitter drops the terminator; ! and ? are part of the profile
+        terminators = [text[end:end + 3].lstrip()[:1] for _, _, end in spans]
+
+        features, lengths = self.stylometry(sentences, terminators)
+
+        lm_sentences = 0
+        if self.scorer is not None:
+            words = int(lengths.sum())
+            budget = max(self.min_seconds, self.seconds_per_10k_words * words / 10000)
+            lm_deadline = started + budget
+            if deadline is not None:
+                lm_deadline = min(lm_deadline, deadline)
+
+            try:
+                log_likelihood = self.scorer.score(sentences, deadline=lm_deadline)
+            except Exception as e:
+                # torch / transformers missing or the model failed: the
+                # stylometric score stands on its own
+                print(f"⚠ AI detector LM unavailable ({e}), using stylometry only")
+            else:
+                lm_sentences = int(np.count_nonzero(~np.isnan(log_likelihood)))
+                features["log_likelihood"] = self._window_mean(log_likelihood)
+
+        probabilities = self.probabilities(features)
+
+        weights = np.maximum(lengths, 1)
+        probability = float(np.average(probabilities, weights=weights))
+        confidence = min(1.0, lengths.sum() / self.full_confidence_words)
+        probability = PRIOR + confidence * (probability - PRIOR)
+
+        return {
+            "probability": round(probability, 4),
+            "sentences": [
+                {"start": start, "end": end, "probability": round(float(p), 3)}
+                for (_, start, end), p in zip(spans, probabilities)
+            ],
+            "features": {
+                name: round(float(np.nanmean(values)), 4)
+                for name, values in features.items()
+                if not np.all(np.isnan(values))
+            },
+            "lm_sentences": lm_sentences
+        }
+
+    def stylometry(self, sentences, terminators):
+        """Windowed feature arrays (one value per sentence) and words per sentence"""
+
+        n = len(sentences)
+        tokens = [WORD_RE.findall(sentence.lower()) for sentence in sentences]
+        lengths = np.array([len(words) for words in tokens], dtype=np.float64)
+
+        flat = [word for words in tokens for word in words]
+        sentence_of = np.repeat(np.arange(n), lengths.astype(np.int64))
+        vocabulary, word_ids = np.unique(np.array(flat, dtype=str), return_inverse=True)
+
+        window_words = self._window_sum(lengths)
+        safe_words = np.maximum(window_words, 1)
+
+        # Sentence length variation (coefficient of variation) in the window
+        counts = self._window_sum(np.ones(n))
+        mean = window_words / counts
+        variance = np.maximum(self._window_sum(lengths ** 2) / counts - mean ** 2, 0)
+        burstiness = np.sqrt(variance) / np.maximum(mean, 1)
+
+        # Distinct words per window, from a difference array over the
+        # (word, sentence) pairs: each occurrence covers the windows
+        # around its sentence, minus what the word's previous one covered
+        pairs = np.unique(word_ids * n + sentence_of)
+        words, where = pairs // n, pairs % n
+        first = np.clip(where - self.window, 0, n - 1)
+        last = np.clip(where + self.window, 0, n - 1)
+        same_word = np.concatenate([[False], words[1:] == words[:-1]])
+        previous_last = np.concatenate([[-1], last[:-1]])
+        first = np.where(same_word, np.maximum(first, previous_last + 1), first)
+        covered = first <= last
+        distinct = np.cumsum(
+            np.bincount(first[covered], minlength=n + 1)
+            - np.bincount(last[covered] + 1, minlength=n + 1)
+        )[:n]
+        lexical_diversity = distinct / np.sqrt(safe_words)
+
+        # Function-word rates, via the vocabulary rather than every token
+        generated = np.isin(vocabulary, GENERATED_WORDS)[word_ids]
+        personal = np.isin(vocabulary, PERSONAL_WORDS)[word_ids]
+        generated_words = self._window_sum(np.bincount(sentence_of, weights=generated, minlength=n)) / safe_words
+        personal_words = self._window_sum(np.bincount(sentence_of, weights=personal, minlength=n)) / safe_words
+
+        # Punctuation profile
+        text = np.array(sentences, dtype=str)
+        ends = np.array(terminators, dtype=str)
+        commas = sum(np.char.count(text, mark) for mark in COMMAS)
+        expressive = sum(np.char.count(text, mark) for mark in EXPRESSIVE) + np.isin(ends, ("!", "?"))
+
+        return {
+            "burstiness": burstiness,
+            "lexical_diversity": lexical_diversity,
+            "generated_words": generated_words,
+            "personal_words": personal_words,
+            "comma_rate": self._window_sum(commas.astype(np.float64)) / safe_words,
+            "expressive_punctuation": self._window_sum(expressive.astype(np.float64)) / safe_words,
+        }, lengths
+
+    def probabilities(self, features):
+        """Logistic combination of standardised features; missing ones count as typical"""
+
+        logit = np.full(len(next(iter(features.values()))), self.bias)
+
+        for name, values in features.items():
+            if name not in self.features:
+                continue
+            mean, std, weight = self.features[name]
+            z = np.clip(np.nan_to_num((values - mean) / std), -3, 3)
+            logit += weight * z
+
+        return 1 / (1 + np.exp(-logit))
+
+    def _window_sum(self, values):
+        """Sum over each sentence's window of neighbours (truncated at the ends)"""
+
+        n = len(values)
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        index = np.arange(n)
+        return (
+            cumulative[np.minimum(index + self.window + 1, n)]
+            - cumulative[np.maximum(index - self.window, 0)]
+        )
+
+    def _window_mean(self, values):
+        known = ~np.isnan(values)
+        counts = self._window_sum(known.astype(np.float64))
+        sums = self._window_sum(np.where(known, values, 0.0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+# ==========================================================
+# LANGUAGE MODEL SCORER (optional)
+# ==========================================================
+
+
+class PerplexityScorer:
+    """
+    Mean token log-probability of each sentence under a small causal LM
+    (e.g. distilgpt2), loaded on first use. Needs torch and transformers.
+    """
+
+    def __init__(self, model_name, batch_size=16, max_tokens=64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self._model = None
+        self._tokenizer = None
+
+    def load(self):
+        if self._model is None:
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+
+            model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            model.eval()
+
+            self._tokenizer, self._model = tokenizer, model
+        return self._model
+
+    def score(self, sentences, deadline=None):
+        """Log-likelihood per sentence; NaN for those not reached before the deadline"""
+
+        import torch
+
+        self.load()
+        scores = np.full(len(sentences), np.nan)
+
+        # Longest first: similar lengths pad less, and the budget goes to
+        # the sentences with the most signal
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        slowest = 0.0
+
+        for start in range(0, len(order), self.batch_size):
+            now = time.monotonic()
+            if deadline is not None and now + slowest > deadline:
+                break
+
+            batch = order[start:start + self.batch_size]
+            encoded = self._tokenizer(
+                # BOS first, so the first word is also predicted
+                [self._tokenizer.bos_token + sentences[i] for i in batch],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=self.max_tokens
+            )
+
+            with torch.inference_mode():
+                logits = self._model(**encoded).logits[:, :-1].float()
+
+            targets = encoded["input_ids"][:, 1:]
+            mask = encoded["attention_mask"][:, 1:].float()
+            token_scores = torch.log_softmax(logits, dim=-1).gather(-1, targets.unsqueeze(-1)).squeeze(-1)
+            counts = mask.sum(dim=1)
+            means = (token_scores * mask).sum(dim=1) / counts.clamp(min=1)
+
+            scores[batch] = np.where(counts.numpy() > 0, means.numpy(), np.nan)
+            slowest = max(slowest, time.monotonic() - now)
+
+        return scores
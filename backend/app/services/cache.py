@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.services.metrics import metrics
+
+# ==========================================================
+# IN-PROCESS LRU CACHE
+# ==========================================================
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# ==========================================================
+# SHARED ON-DISK CACHE (SQLite)
+# ==========================================================
+
+
+class DiskCache:
+    """
+    SQLite-backed cache shared by every worker process on the host.
+    Entries expire by TTL; the oldest entries are evicted once the
+    table grows past max_entries.
+    """
+
+    def __init__(self, path, max_entries=20000, ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)"
+            )
+
+    def _connect(self):
+        # One connection per thread, never reused across a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Return (value, expires_at) or None"""
+
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            now = time.time()
+            if row is None or row[1] < now:
+                return None
+
+            with conn:
+                conn.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+
+            return json.loads(row[0]), row[1]
+
+        except sqlite3.Error:
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now)
+                )
+
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.evict()
+
+        except sqlite3.Error:
+            pass
+
+        return expires_at
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over the limit"""
+
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    " SELECT key FROM cache ORDER BY accessed_at DESC"
+                    " LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error:
+            pass
+
+
+# ==========================================================
+# TWO-LEVEL CACHE
+# ==========================================================
+
+
+class TwoLevelCache:
+    """In-process LRU in front of the shared disk cache"""
+
+    def __init__(self, namespace, memory, disk=None):
+        self.namespace = namespace
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        key = f"{self.namespace}:{key}"
+
+        value = self.memory.get(key)
+        if value is not None:
+            metrics.inc("plagiarism_cache_requests_total", cache=self.namespace, result="memory_hit")
+            return value
+
+        entry = self.disk.get(key) if self.disk is not None else None
+        if entry is None:
+            metrics.inc("plagiarism_cache_requests_total", cache=self.namespace, result="miss")
+            return None
+
+        value, expires_at = entry
+        self.memory.set(key, value, expires_at=expires_at)
+        metrics.inc("plagiarism_cache_requests_total", cache=self.namespace, result="disk_hit")
+        return value
+
+    def set(self, key, value):
+        key = f"{self.namespace}:{key}"
+
+        expires_at = None
+        if self.disk is not None:
+            expires_at = self.disk.set(key, value)
+
+        self.memory.set(key, value, expires_at=expires_at)
+
+
+def normalize_query(text):
+    """Cache key for a search query: lowercased, whitespace collapsed"""
+    return " ".join(text.lower().split())
@@ -0,0 +1,185 @@
+import hashlib
+from collections import Counter
+import numpy as np
+
+# ==========================================================
+# COLLUSION DETECTION (all pairs within a set of documents)
+# ==========================================================
+#
+# Every document is compared with every other through one stacked matrix
+# of sentence vectors, processed in blocks of whole documents. For each
+# pair of blocks (I <= J) one product S = E_I @ E_J.T gives both
+# directions:
+#
+#   whether every sentence of I has a match (>= threshold) in each
+#     document of J: np.logical_or.reduceat over S's columns
+#   and every sentence of J in each document of I: the same over rows
+#
+# summed per document into shared[a, b] = sentences of a with a
+# counterpart in b. Memory is one block_rows x block_rows score matrix
+# plus the n_docs x n_docs count matrix, however many documents there are.
+
+
+class CollusionDetector:
+
+    def __init__(self, threshold=0.85, min_similarity=0.1, block_rows=4096,
+                 template_share=0.5, template_min_documents=3):
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        self.block_rows = block_rows
+        self.template_share = template_share
+        self.template_min_documents = template_min_documents
+
+    def top_pairs(self, documents, top_k=100, aligned_limit=5, on_progress=None):
+        """
+        documents: [(document_id, sentences, embeddings)] with L2-normalised
+        embeddings. Returns up to top_k pairs at or above min_similarity,
+        best first, each with its aligned sentence pairs.
+        """
+
+        documents = self.drop_template_sentences(documents)
+        documents = [doc for doc in documents if len(doc[1])]
+        if len(documents) < 2:
+            return []
+
+        sizes = np.array([len(sentences) for _, sentences, _ in documents])
+        embeddings = np.ascontiguousarray(
+            np.concatenate([vectors for _, _, vectors in documents]), dtype=np.float32
+        )
+
+        shared = self.shared_counts(embeddings, sizes, on_progress=on_progress)
+        similarity = self.similarity(shared, sizes)
+
+        a, b = np.triu_indices(len(documents), k=1)
+        scores = similarity[a, b]
+        keep = np.flatnonzero(scores >= self.min_similarity)
+        if top_k is not None and len(keep) > top_k:
+            keep = keep[np.argpartition(-scores[keep], top_k - 1)[:top_k]]
+        keep = keep[np.argsort(-scores[keep], kind="stable")]
+
+        pairs = []
+        for index in keep:
+            i, j = int(a[index]), int(b[index])
+            id_a, sentences_a, vectors_a = documents[i]
+            id_b, sentences_b, vectors_b = documents[j]
+
+            pairs.append({
+                "document_a_id": id_a,
+                "document_b_id": id_b,
+                "similarity": round(float(scores[index]), 4),
+                "matched_sentences": int(shared[i, j]),
+                "aligned": self.align(sentences_a, vectors_a, sentences_b, vectors_b, aligned_limit)
+            })
+
+        return pairs
+
+    def shared_counts(self, embeddings, sizes, on_progress=None):
+        """shared[a, b]: sentences of document a with a counterpart in document b"""
+
+        n_docs = len(sizes)
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        blocks = self._blocks(sizes)
+        shared = np.zeros((n_docs, n_docs), dtype=np.int32)
+
+        total = len(blocks) * (len(blocks) + 1) // 2
+        done = 0
+
+        for bi, (doc_i, end_i) in enumerate(blocks):
+            rows = slice(offsets[doc_i], offsets[end_i])
+            row_starts = offsets[doc_i:end_i] - offsets[doc_i]
+            left = embeddings[rows]
+
+            for doc_j, end_j in blocks[bi:]:
+                cols = slice(offsets[doc_j], offsets[end_j])
+                col_starts = offsets[doc_j:end_j] - offsets[doc_j]
+
+                # Thresholded first: reducing booleans is several times
+                # cheaper than max over the float scores
+                matched = (left @ embeddings[cols].T) >= self.threshold
+
+                # Sentences of block I matched in each document of J
+                hits = np.logical_or.reduceat(matched, col_starts, axis=1)
+                shared[doc_i:end_i, doc_j:end_j] = np.add.reduceat(
+                    hits.astype(np.int32), row_starts, axis=0
+                )
+
+                # ...and sentences of block J matched in each document of I
+                if doc_j != doc_i:
+                    hits = np.logical_or.reduceat(matched, row_starts, axis=0)
+                    shared[doc_j:end_j, doc_i:end_i] = np.add.reduceat(
+                        hits.astype(np.int32), col_starts, axis=1
+                    ).T
+
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+
+        return shared
+
+    def similarity(self, shared, sizes):
+        """Share of each document's sentences found in the other, averaged over both"""
+
+        share = shared / sizes[:, None]
+        similarity = (share + share.T) / 2
+        np.fill_diagonal(similarity, 0.0)
+        return similarity
+
+    def align(self, sentences_a, vectors_a, sentences_b, vectors_b, limit=5):
+        """Best-matching sentence pairs of two documents, above the threshold"""
+
+        scores = vectors_a @ vectors_b.T
+        best = scores.max(axis=1)
+
+        return [
+            {
+                "sentence_a": sentences_a[i],
+                "sentence_b": sentences_b[int(scores[i].argmax())],
+                "similarity": round(float(best[i]), 4)
+            }
+            for i in np.argsort(-best)[:limit]
+            if best[i] >= self.threshold
+        ]
+
+    def drop_template_sentences(self, documents):
+        """
+        Remove sentences that occur (near verbatim) in more than
+        template_share of the documents: the assignment prompt, headings
+        and instructions every student copies.
+        """
+
+        if len(documents) < self.template_min_documents:
+            return documents
+
+        keys = [[_key(sentence) for sentence in sentences] for _, sentences, _ in documents]
+        counts = Counter(key for doc_keys in keys for key in set(doc_keys))
+        limit = max(self.template_min_documents, self.template_share * len(documents))
+        template = {key for key, count in counts.items() if count >= limit}
+
+        if not template:
+            return documents
+
+        filtered = []
+        for (document_id, sentences, vectors), doc_keys in zip(documents, keys):
+            keep = [i for i, key in enumerate(doc_keys) if key not in template]
+            filtered.append((document_id, [sentences[i] for i in keep], vectors[keep]))
+        return filtered
+
+    def _blocks(self, sizes):
+        """Consecutive documents grouped into blocks of at most block_rows sentences"""
+
+        blocks = []
+        start = 0
+        rows = 0
+
+        for index, size in enumerate(sizes):
+            if rows and rows + size > self.block_rows:
+                blocks.append((start, index))
+                start, rows = index, 0
+            rows += size
+
+        blocks.append((start, len(sizes)))
+        return blocks
+
+
+def _key(sentence):
+    return hashlib.sha1(" ".join(sentence.lower().split()).encode()).hexdigest()
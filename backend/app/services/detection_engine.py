@@ -1,22 +1,107 @@
+import bisect
+import hashlib
+import itertools
+import json
+import os
 import re
+import time
 import requests
 import urllib.parse
 import numpy as np
 from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from app.services.retrieval import ConcurrentRetriever
+from app.services.cache import LRUCache, DiskCache, TwoLevelCache, normalize_query
+from app.services.embedding_store import EmbeddingStore
+from app.services.vector_index import VectorIndex
+from app.services.fingerprint import Fingerprinter, FingerprintIndex, find_passages
+from app.services.collusion import CollusionDetector
+from app.services.ai_detection import AIDetector, PerplexityScorer
+from app.services.pipeline import AnalysisContext, Pipeline, SharedWork, STAGES
+from app.services.query_planner import QueryPlanner
+from app.utils.extraction import extract_text
+from app.services.model_server import RemoteModel
+from app.services.embedding_backends import load_backend, backend_key
+from app.services.metrics import metrics
 
 # ==========================================================
 # Lazy Load Model (Prevents Boot Crash)
 # ==========================================================
 
-_model = None
+# Bump whenever detection output changes: stored results from another
+# version are never reused (see result_key)
+ENGINE_VERSION = "2.2"
 
-def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
-    return _model
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+WARMUP_TEXTS = [
+    "Plagiarism detection compares submitted sentences with known sources.",
+    "The first forward pass allocates buffers and is much slower than later ones.",
+] * 8
+
+_models = {}
+_remote_model = None
+
+def load_model(backend="torch", onnx_dir=None):
+    return load_backend(MODEL_NAME, backend, onnx_dir=onnx_dir)
+
+def get_model(socket_path=None, authkey=None, backend="torch", onnx_dir=None):
+    """
+    The in-process model for the configured backend, or a client for the
+    shared model server (app.services.model_server) when socket_path is set
+    """
+    global _remote_model
+
+    if socket_path:
+        if _remote_model is None or _remote_model.socket_path != socket_path:
+            _remote_model = RemoteModel(socket_path, authkey=authkey)
+        return _remote_model
+
+    if backend not in _models:
+        _models[backend] = load_model(backend, onnx_dir)
+    return _models[backend]
+
+
+def _failure_reason(error):
+    """Label for plagiarism_fetch_failures_total"""
+    if isinstance(error, requests.Timeout):
+        return "timeout"
+    if isinstance(error, requests.ConnectionError):
+        return "connection"
+    if isinstance(error, requests.HTTPError):
+        return "rate_limited" if error.response is not None and error.response.status_code == 429 else "http_status"
+    return "error"
+
+
+# ==========================================================
+# PIPELINE PLANS
+# ==========================================================
+
+ALL_STAGES = [
+    "segmentation", "retrieval", "lexical", "embedding",
+    "scoring", "ai_detection", "aggregation"
+]
+
+# searches/fetches are per-analysis budgets for a 5000-char document; they
+# grow with sqrt(document length) up to max_searches/max_fetches
+DEFAULT_PLANS = {
+    "free": {
+        "stages": ALL_STAGES,
+        "searches": 5,
+        "max_searches": 15,
+        "fetches": 8,
+        "max_fetches": 25,
+        "stage_timeouts": {"retrieval": 15, "lexical": 5, "embedding": 15, "scoring": 5}
+    },
+    "pro": {
+        "stages": ALL_STAGES,
+        "searches": 10,
+        "max_searches": 60,
+        "fetches": 16,
+        "max_fetches": 100,
+        "stage_timeouts": {"retrieval": 60, "lexical": 20, "embedding": 60, "scoring": 20}
+    }
+}
 
 
 # ==========================================================
@@ -27,102 +112,802 @@ class DetectionEngine:
 
     def __init__(self):
         self.similarity_threshold = 0.75
-        self.max_sentences = 5   # reduced for speed
+        self.query_planner = QueryPlanner()
         self.max_urls_per_sentence = 2
+        self.window_sentences = 3
+        self.window_stride = 2
+        self.window_max_chars = 1000
+        self.embedding_batch_size = 32
+        self.search_url = "https://html.duckduckgo.com/html/?q={query}"
+        self.request_timeout = 8
         self.headers = {"User-Agent": "Mozilla/5.0"}
+        self.retriever = ConcurrentRetriever()
+        self.search_cache = TwoLevelCache("search", LRUCache())
+        self.page_cache = TwoLevelCache("page", LRUCache())
+        self.embedding_store = None
+        self.archive_index = None
+        self.archive_top_k = 3
+        # callable(document ids) -> those still to report; set by create_app
+        # so documents deleted after they were indexed are left out
+        self.archive_filter = None
+        self.fingerprinter = Fingerprinter()
+        self.fingerprint_index = None
+        self.lexical_threshold = 0.5
+        self.lexical_settle_coverage = 0.8
+        self.plans = DEFAULT_PLANS
+        self.model_server_socket = None
+        self.model_server_authkey = None
+        self.embedding_backend = "torch"
+        self.onnx_dir = None
+        self.web_cache_ttl = 86400
+        self.batch_retrieval_timeout = 300
+        self.collusion = CollusionDetector()
+        self.ai_detector = AIDetector()
+        self.ready = False
+        self.warmup_seconds = None
+
+    def configure(self, config):
+        """Apply engine settings from the Flask app config"""
+        self.embedding_batch_size = config.get(
+            "EMBEDDING_BATCH_SIZE", self.embedding_batch_size
+        )
+        self.plans = config.get("ANALYSIS_PLANS") or self.plans
+        self.window_sentences = config.get("SOURCE_WINDOW_SENTENCES", self.window_sentences)
+        self.window_stride = config.get("SOURCE_WINDOW_STRIDE", self.window_stride)
+        self.batch_retrieval_timeout = config.get("BATCH_RETRIEVAL_TIMEOUT", self.batch_retrieval_timeout)
+        self.collusion = CollusionDetector(
+            threshold=config.get("BATCH_PAIR_THRESHOLD", self.collusion.threshold),
+            min_similarity=config.get("BATCH_PAIR_MIN_SIMILARITY", self.collusion.min_similarity),
+            block_rows=config.get("COLLUSION_BLOCK_ROWS", self.collusion.block_rows),
+            template_share=config.get("COLLUSION_TEMPLATE_SHARE", self.collusion.template_share)
+        )
+        self.ai_detector = AIDetector(
+            scorer=PerplexityScorer(config["AI_DETECTOR_LM"]) if config.get("AI_DETECTOR_LM") else None,
+            weights=config.get("AI_DETECTOR_WEIGHTS"),
+            seconds_per_10k_words=config.get(
+                "AI_DETECTOR_SECONDS_PER_10K_WORDS", self.ai_detector.seconds_per_10k_words
+            )
+        )
+        self.model_server_socket = config.get("MODEL_SERVER_SOCKET")
+        self.model_server_authkey = config.get("MODEL_SERVER_AUTHKEY")
+        self.embedding_backend = config.get("EMBEDDING_BACKEND", self.embedding_backend)
+        self.onnx_dir = config.get("ONNX_MODEL_DIR")
+        model_key = backend_key(MODEL_NAME, self.embedding_backend)
+        self.search_url = config.get("SEARCH_URL", self.search_url)
+        self.request_timeout = config.get("SCRAPER_REQUEST_TIMEOUT", self.request_timeout)
+        self.retriever = ConcurrentRetriever(
+            max_workers=config.get("SCRAPER_MAX_WORKERS", self.retriever.max_workers),
+            per_host_limit=config.get("SCRAPER_PER_HOST_LIMIT", self.retriever.per_host_limit),
+            deadline=config.get("SCRAPER_TIMEOUT", self.retriever.deadline)
+        )
+
+        # Search results and parsed pages: per-process LRU in front of a
+        # SQLite store shared by every worker on the host
+        ttl = config.get("WEB_CACHE_TTL", 86400)
+        self.web_cache_ttl = ttl
+        memory_entries = config.get("WEB_CACHE_MEMORY_ENTRIES", 1024)
+        disk = None
+        if config.get("WEB_CACHE_PATH"):
+            disk = DiskCache(
+                config["WEB_CACHE_PATH"],
+                max_entries=config.get("WEB_CACHE_MAX_ENTRIES", 20000),
+                ttl=ttl
+            )
+        self.search_cache = TwoLevelCache("search", LRUCache(memory_entries, ttl), disk)
+        self.page_cache = TwoLevelCache("page", LRUCache(memory_entries, ttl), disk)
+
+        self.embedding_store = None
+        if config.get("EMBEDDING_CACHE_DIR"):
+            self.embedding_store = EmbeddingStore(
+                os.path.join(config["EMBEDDING_CACHE_DIR"], model_key),
+                model_key,
+                capacity=config.get("EMBEDDING_CACHE_CAPACITY", 50000)
+            )
+
+        self.archive_index = None
+        self.archive_top_k = config.get("ARCHIVE_TOP_K", self.archive_top_k)
+        if config.get("ARCHIVE_INDEX_DIR"):
+            self.archive_index = VectorIndex(
+                os.path.join(config["ARCHIVE_INDEX_DIR"], model_key),
+                EMBEDDING_DIM,
+                ann_min_rows=config.get("ARCHIVE_ANN_MIN_ROWS", 20000)
+            )
+
+        self.fingerprinter = Fingerprinter(
+            ngram_size=config.get("NGRAM_SIZE", self.fingerprinter.ngram_size),
+            window=config.get("FINGERPRINT_WINDOW", self.fingerprinter.window)
+        )
+        self.fingerprint_index = None
+        if config.get("ARCHIVE_INDEX_DIR"):
+            self.fingerprint_index = FingerprintIndex(
+                os.path.join(config["ARCHIVE_INDEX_DIR"], "fingerprints"),
+                self.fingerprinter
+            )
+
+    # ======================================================
+    # WARM-UP / READINESS
+    # ======================================================
+
+    def warm_up(self):
+        """Load the model and run one batch so the first analysis doesn't pay for it"""
+
+        start = time.monotonic()
+        self._encode_with_model(WARMUP_TEXTS)
+        if self.ai_detector.scorer is not None:
+            self.ai_detector.scorer.score(WARMUP_TEXTS[:2])
+        self.warmup_seconds = round(time.monotonic() - start, 2)
+        return self.warmup_seconds
+
+    def readiness(self):
+        return {
+            "model_loaded": self.ready,
+            "model_server": self.model_server_socket,
+            "backend": self.embedding_backend,
+            "warmup_seconds": self.warmup_seconds
+        }
 
     # ======================================================
     # MAIN ANALYSIS
     # ======================================================
 
+    def analyze_text(self, text, plan="free", document_id=None, reuse=None, on_progress=None):
+        """
+        Run the detection pipeline configured for a subscription plan.
+        Returns plagiarism_matches, plagiarism_score, ai_probability,
+        final_score and the per-stage timings.
+
+        reuse: web matches carried over from an earlier analysis.
+          "matches": match dicts with offsets into this text
+          "ai_probability": reused AI score (None recomputes it)
+          "ai_details": per-sentence AI scores going with it
+          "sentences": sentences whose web results are in "matches"; only
+            the others are searched. None means all of them (same
+            result_key), which skips retrieval altogether.
+          "previous_document_id": earlier version of this document, not
+            reported as an archive source
+        The archive (which changes as documents are uploaded) is always
+        re-checked.
+
+        on_progress(event, **data) is called as stages run (progress.Reporter).
+        """
+
+        settings = self.plans.get(plan) or self.plans["free"]
+
+        ctx = AnalysisContext(
+            text,
+            document_id=document_id,
+            plan=plan,
+            settings=settings,
+            on_progress=on_progress
+        )
+
+        if reuse is not None:
+            ctx.matches.extend(reuse["matches"])
+            skipped = set()
+
+            if reuse.get("ai_probability") is not None:
+                ctx.ai_probability = reuse["ai_probability"]
+                ctx.ai_details = reuse.get("ai_details")
+                skipped.add("ai_detection")
+
+            if reuse.get("sentences") is None:
+                ctx.reuse_all = True
+                skipped.add("retrieval")
+            else:
+                ctx.reused_sentences = set(reuse["sentences"])
+
+            if reuse.get("previous_document_id"):
+                ctx.excluded_sources.add(reuse["previous_document_id"])
+
+            settings = dict(settings, stages=[
+                name for name in settings.get("stages", ALL_STAGES)
+                if name not in skipped
+            ])
+
+        self.build_pipeline(settings).run(ctx)
+
+        return ctx.result or self._empty_result()
+
+    def result_key(self, text, plan="free"):
+        """
+        Content address of an analysis result: the text plus everything
+        that changes what the engine would report for it (config_key)
+        """
+
+        digest = hashlib.sha256(text.encode())
+        digest.update(self.config_key(plan).encode())
+        return digest.hexdigest()
 
+    def config_key(self, plan="free"):
+        """
+        Digest of the engine version, model, plan and settings behind a
+        result: results are only carried over between equal keys
+        """
 
+        settings = self.plans.get(plan) or self.plans["free"]
+        config = {
+            "version": ENGINE_VERSION,
+            "model": backend_key(MODEL_NAME, self.embedding_backend),
+            "plan": settings,
+            "similarity_threshold": self.similarity_threshold,
+            "lexical": [self.lexical_threshold, self.lexical_settle_coverage],
+            "fingerprint": [self.fingerprinter.ngram_size, self.fingerprinter.window],
+            "windows": [self.window_sentences, self.window_stride, self.window_max_chars],
+            "web_cache_ttl": self.web_cache_ttl,
+            "ai_detector": self.ai_detector.config_key()
+        }
+
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def build_pipeline(self, settings):
+        timeouts = settings.get("stage_timeouts", {})
+        return Pipeline([
+            STAGES[name](self, timeout=timeouts.get(name))
+            for name in settings.get("stages", ALL_STAGES)
+            if name in STAGES
+        ])
+
+    def _aggregate(self, ctx):
+        """Build the result dict consumed by run_analysis"""
+
+        excluded = set(ctx.excluded_sources)
+        sources = {match["source_document_id"] for match in ctx.matches if match.get("source_document_id")}
+        if sources and self.archive_filter is not None:
+            excluded |= sources - set(self.archive_filter(sources))
+
+        matches = self._deduplicate([
+            match for match in ctx.matches
+            if match.get("source_document_id") not in excluded
+        ])
+
+        # Share of the checked text covered by a match, weighted by score.
+        # Spans are sorted and disjoint, so each match only visits the
+        # spans it overlaps.
+        starts = [start for _, start, _ in ctx.spans]
+        best = [0.0] * len(ctx.spans)
+        for match in matches:
+            i = max(bisect.bisect_right(starts, match["start_index"]) - 1, 0)
+            while i < len(ctx.spans) and ctx.spans[i][1] < match["end_index"]:
+                _, start, end = ctx.spans[i]
+                overlap = min(end, match["end_index"]) - max(start, match["start_index"])
+                if overlap >= (end - start) / 2:
+                    best[i] = max(best[i], match["similarity_score"])
+                i += 1
+
+        total = sum(end - start for _, start, end in ctx.spans)
+        covered = sum(score * (end - start) for score, (_, start, end) in zip(best, ctx.spans))
+
+        plagiarism_score = round(covered / total, 4) if total else 0.0
+        ai_probability = float(ctx.ai_probability)
+
+        if ctx.reuse_all:
+            reused = len(ctx.spans)
+        else:
+            reused = sum(1 for sentence, _, _ in ctx.spans if sentence in ctx.reused_sentences)
 
-    # AGAIN CHANGE - TO DYNAMIC 
-    def analyze_text(self, text):
         return {
-        "plagiarism_matches": [
-            {
-                "source_url": "https://example.com",
-                "matched_text": text[:80],
-                "similarity_score": 0.68
+            "plagiarism_matches": matches,
+            "plagiarism_score": plagiarism_score,
+            "ai_probability": ai_probability,
+            "ai_details": ctx.ai_details,
+            "final_score": round((2 * plagiarism_score + ai_probability) / 3, 4),
+            "stage_times": ctx.stage_times,
+            "timed_out_stages": ctx.timed_out,
+            "sentences_reused": reused,
+            "sentences_recomputed": len(ctx.spans) - reused,
+            "retrieval": {
+                "sentences": len(ctx.spans),
+                "queries": len(ctx.queries),
+                "search_budget": ctx.search_budget,
+                "pages": len(ctx.pages),
+                "fetch_budget": ctx.fetch_budget
             }
-        ],
-        "plagiarism_score": 0.68,
-        "ai_probability": 0.32,
-        "final_score": 0.56
         }
 
+    # ======================================================
+    # INCREMENTAL RE-ANALYSIS
+    # ======================================================
+
+    def sentence_key(self, sentence):
+        """Hash of a sentence, insensitive to case and whitespace changes"""
+        return hashlib.sha1(" ".join(sentence.lower().split()).encode()).hexdigest()
+
+    def sentence_overlap(self, old_text, new_text):
+        """Share of new_text's sentences that also occur in old_text"""
+
+        new_keys = [self.sentence_key(s) for s, _, _ in self._sentence_spans(new_text)]
+        if not new_keys:
+            return 0.0
+        old_keys = {self.sentence_key(s) for s, _, _ in self._sentence_spans(old_text)}
+        return sum(1 for key in new_keys if key in old_keys) / len(new_keys)
+
+    def carry_over(self, old_text, new_text, old_matches):
+        """
+        Move matches found in a previous version of a document onto the
+        edited text. A match is kept when its first sentence still exists
+        and the matched text sits at the same place relative to it.
+
+        Returns (carried matches, unchanged sentences of new_text).
+        """
+
+        old_spans = self._sentence_spans(old_text)
+        old_ends = [end for _, _, end in old_spans]
+        old_keys = {self.sentence_key(s) for s, _, _ in old_spans}
+
+        new_starts = {}
+        unchanged = set()
+        for sentence, start, _ in self._sentence_spans(new_text):
+            key = self.sentence_key(sentence)
+            new_starts.setdefault(key, start)
+            if key in old_keys:
+                unchanged.add(sentence)
+
+        carried = []
+
+        for match in old_matches:
+            i = bisect.bisect_right(old_ends, match["start_index"])
+            if i >= len(old_spans):
+                continue
+
+            sentence, sentence_start, _ = old_spans[i]
+            new_sentence_start = new_starts.get(self.sentence_key(sentence))
+            if new_sentence_start is None:
+                continue
+
+            start = new_sentence_start + match["start_index"] - sentence_start
+            end = start + match["end_index"] - match["start_index"]
+
+            if start < 0 or new_text[start:end] != old_text[match["start_index"]:match["end_index"]]:
+                continue
+
+            carried.append(dict(match, start_index=start, end_index=end))
+
+        return carried, unchanged
+
+    # ======================================================
+    # BATCH ANALYSIS
+    # ======================================================
+
+    def analyze_batch(self, documents, plan="free", on_result=None, on_progress=None):
+        """
+        Analyze many documents [(document_id, text)] as one unit of work.
+        Queries are planned per document but searched once for the whole
+        batch, a page found by several documents is fetched once, and
+        sentences/windows are encoded once (SharedWork). Each document
+        is then compared with the pages its own queries found, as in
+        analyze_text.
+
+        on_result(document_id, result) is called as each document
+        finishes. Returns the SharedWork, for batch_pairs.
+        """
+
+        settings = self.plans.get(plan) or self.plans["free"]
+        shared = SharedWork(self)
+
+        def report(event, **data):
+            if on_progress:
+                on_progress(event, **data)
+
+        contexts = []
+        segmentation = STAGES["segmentation"](self)
+        for document_id, text in documents:
+            ctx = AnalysisContext(text, document_id=document_id, plan=plan, settings=settings)
+            ctx.shared = shared
+            segmentation.run(ctx)
+            contexts.append(ctx)
+
+        # Round-robin over documents so the fetch budget (and the
+        # deadline) is spread across the batch; repeated queries once
+        queries = {}
+        for query, _ in itertools.chain.from_iterable(
+            itertools.zip_longest(*(ctx.queries for ctx in contexts), fillvalue=(None, None))
+        ):
+            if query is not None:
+                queries.setdefault(normalize_query(query), query)
+
+        report("segmented", documents=len(contexts), queries=len(queries),
+               planned=sum(len(ctx.queries) for ctx in contexts))
+
+        ordered = list(queries.values())
+        query_urls, pages = self._retrieve_sources(
+            ordered,
+            deadline=time.monotonic() + self.batch_retrieval_timeout,
+            max_fetches=sum(ctx.fetch_budget for ctx in contexts),
+            on_search=lambda done, total: report("progress", counter="searches", done=done, total=total),
+            on_fetch=lambda done, total: report("progress", counter="pages", done=done, total=total)
+        )
+        urls_by_query = dict(zip(queries, query_urls))
+
+        pipeline = self.build_pipeline(dict(settings, stages=[
+            name for name in settings.get("stages", ALL_STAGES)
+            if name not in ("segmentation", "retrieval")
+        ]))
+
+        for done, ctx in enumerate(contexts, 1):
+            urls = dict.fromkeys(
+                url
+                for query, _ in ctx.queries
+                for url in urls_by_query.get(normalize_query(query), [])
+            )
+            ctx.pages = {url: pages[url] for url in urls if url in pages}
+            ctx.sentence_urls = [list(ctx.pages) for _ in ctx.spans]
+
+            # Each document's own stage/operation timings (save_result
+            # stores them); they also add up in the caller's breakdown
+            with metrics.breakdown():
+                pipeline.run(ctx)
+
+                if on_result:
+                    on_result(ctx.document_id, ctx.result or self._empty_result())
+            report("progress", counter="documents", done=done, total=len(contexts))
+
+            # The vectors stay in SharedWork; drop this document's copies
+            ctx.sentence_embeddings = ctx.source_embeddings = None
+
+        return shared
+
+    def batch_pairs(self, documents, shared=None, top_k=None, aligned_limit=5, on_progress=None):
+        """
+        Similarity of every pair of documents [(document_id, text)]: the
+        share of each one's sentences with a counterpart in the other,
+        averaged over both directions (CollusionDetector). Pairs under
+        BATCH_PAIR_MIN_SIMILARITY are dropped; top_k keeps the best ones.
+
+        Sentence vectors come from shared (a batch just analysed), else
+        from the archive index for documents already indexed, else the
+        model.
+        """
+
+        stored = {}
+        if shared is None and self.archive_index is not None:
+            stored = self.archive_index.document_vectors([document_id for document_id, _ in documents])
+
+        members = []
+        pending = []
+
+        for document_id, text in documents:
+            if document_id in stored:
+                entries, embeddings = stored[document_id]
+                members.append((document_id, [entry["text"] for entry in entries], embeddings))
+            else:
+                sentences = [sentence for sentence, _, _ in self._sentence_spans(text)]
+                if sentences:
+                    pending.append((document_id, sentences))
+
+        # The rest in one encode call, so the model sees full batches
+        if pending:
+            encode = shared.encode if shared else self._encode
+            embeddings = encode([sentence for _, sentences in pending for sentence in sentences])
+            offset = 0
+            for document_id, sentences in pending:
+                members.append((document_id, sentences, embeddings[offset:offset + len(sentences)]))
+                offset += len(sentences)
+
+        return self.collusion.top_pairs(
+            members, top_k=top_k, aligned_limit=aligned_limit, on_progress=on_progress
+        )
 
     # ======================================================
     # PLAGIARISM DETECTION
     # ======================================================
 
-    def _detect_plagiarism(self, sentences):
+    def _detect_lexical(self, text, spans, pages, document_id=None):
+        """
+        Fingerprint pass against fetched pages and the archive.
+        Returns (matches, indices of spans the pass fully covers).
+        """
 
-        try:
-            model = get_model()
-            sentence_embeddings = model.encode(sentences)
-        except Exception:
+        query_fp = self.fingerprinter.shingles(text)
+        passages = []
+
+        for url, content in pages.items():
+            for passage in find_passages(query_fp, self.fingerprinter.shingles(content)):
+                passages.append((passage, url, None, content))
+
+        if self.fingerprint_index is not None:
+            for passage in self.fingerprint_index.search(
+                text, exclude_document_id=document_id, query_fp=query_fp
+            ):
+                passages.append((passage, None, passage["document_id"], None))
+
+        matches = []
+        covered = []
+
+        for passage, url, source_document_id, content in passages:
+            if passage["score"] < self.lexical_threshold:
+                continue
+
+            start, end = passage["start"], passage["end"]
+            source_start, source_end = passage["source_start"], passage["source_end"]
+
+            matches.append({
+                "source_url": url,
+                "source_document_id": source_document_id,
+                "matched_text": text[start:end],
+                "original_text": content[source_start:source_end] if content else text[start:end],
+                "similarity_score": float(passage["score"]),
+                "match_type": "exact" if passage["score"] >= 0.9 else "near_exact",
+                "start_index": start,
+                "end_index": end,
+                "source_start_index": source_start,
+                "source_end_index": source_end
+            })
+            covered.append((start, end))
+
+        settled = set()
+        for i, (_, start, end) in enumerate(spans):
+            overlap = sum(
+                max(0, min(end, c_end) - max(start, c_start)) for c_start, c_end in covered
+            )
+            if overlap >= self.lexical_settle_coverage * (end - start):
+                settled.add(i)
+
+        return matches, settled
+
+    def _score_web_matches(self, spans, sentence_urls, sentence_embeddings,
+                           source_windows, source_embeddings, pages):
+        """
+        Compare each sentence with the windows of the pages its own search
+        returned, keeping the best window per (sentence, page)
+        """
+
+        if not source_windows or len(sentence_embeddings) == 0:
             return []
 
+        # Windows of one page are contiguous in source_windows
+        urls = list(dict.fromkeys(url for url, _, _ in source_windows))
+        url_positions = {url: i for i, url in enumerate(urls)}
+        owner = np.array([url_positions[url] for url, _, _ in source_windows])
+        offsets = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+
+        allowed = np.zeros((len(spans), len(urls)), dtype=bool)
+        for idx in range(len(spans)):
+            for url in sentence_urls[idx]:
+                if url in url_positions:
+                    allowed[idx, url_positions[url]] = True
+
+        # Embeddings are L2-normalised, so one matrix product gives the
+        # full sentence x window cosine similarity table; windows of pages
+        # a sentence didn't retrieve are masked out before max-over-windows
+        similarities = sentence_embeddings @ source_embeddings.T
+        similarities[~allowed[:, owner]] = -1.0
+        best = np.maximum.reduceat(similarities, offsets, axis=1)
+
         matches = []
 
-        for idx, sentence in enumerate(sentences):
+        for idx, page in zip(*np.nonzero(best >= self.similarity_threshold)):
+            sentence, start, end = spans[idx]
+            first = offsets[page]
+            last = offsets[page + 1] if page + 1 < len(offsets) else len(source_windows)
+            url, source_start, source_end = source_windows[
+                first + int(np.argmax(similarities[idx, first:last]))
+            ]
+
+            matches.append({
+                "source_url": url,
+                "matched_text": sentence,
+                "original_text": pages[url][source_start:source_end],
+                "similarity_score": float(best[idx, page]),
+                "match_type": "semantic",
+                "start_index": start,
+                "end_index": end,
+                "source_start_index": source_start,
+                "source_end_index": source_end
+            })
+
+        return matches
+
+    def _source_windows(self, url, content):
+        """
+        (url, start, end) for overlapping windows of window_sentences
+        sentences, advancing by window_stride
+        """
+
+        # Unpunctuated runs (navigation, tables) are cut to window_max_chars
+        sentences = [
+            (start, min(start + self.window_max_chars, match.end()))
+            for match in re.finditer(r"[^.!?]+[.!?]*", content)
+            if match.group().strip()
+            for start in range(match.start(), match.end(), self.window_max_chars)
+        ]
 
-            urls = self._search_text(sentence)
+        if not sentences:
+            return []
+
+        # Starts every window_stride sentences, plus one so the tail is covered
+        last = max(len(sentences) - self.window_sentences, 0)
+        starts = list(range(0, last + 1, self.window_stride))
+        if starts[-1] != last:
+            starts.append(last)
+
+        windows = []
+
+        for first in starts:
+            group = sentences[first:first + self.window_sentences]
+            start = group[0][0]
+            end = min(group[-1][1], start + self.window_max_chars)
+            text = content[start:end]
+
+            # Trim surrounding whitespace from the offsets too
+            start += len(text) - len(text.lstrip())
+            end -= len(text) - len(text.rstrip())
+            if end > start:
+                windows.append((url, start, end))
 
-            for url in urls:
-                content = self._fetch_content(url)
-                if not content:
-                    continue
+        return windows
 
-                content = content[:4000]
+    def _encode(self, texts):
+        """
+        Encode texts into L2-normalised float32 vectors, reusing stored
+        embeddings and running the model only on unseen texts.
+        """
 
-                try:
-                    content_embedding = model.encode([content])[0]
+        texts = list(texts)
+        unique = list(dict.fromkeys(texts))
 
-                    similarity = cosine_similarity(
-                        [sentence_embeddings[idx]],
-                        [content_embedding]
-                    )[0][0]
+        cached = {}
+        if self.embedding_store is not None:
+            cached = self.embedding_store.get_many(unique)
 
-                    if similarity >= self.similarity_threshold:
-                        matches.append({
-                            "source_url": url,
-                            "matched_text": sentence,
-                            "original_text": sentence,
-                            "similarity_score": float(similarity),
-                            "match_type": "semantic",
-                            "start_index": 0,
-                            "end_index": len(sentence)
-                        })
+        missing = [text for i, text in enumerate(unique) if i not in cached]
+        vectors = {unique[i]: vector for i, vector in cached.items()}
 
-                except Exception:
-                    continue
+        if self.embedding_store is not None:
+            metrics.inc("plagiarism_cache_requests_total", len(cached), cache="embedding", result="hit")
+            metrics.inc("plagiarism_cache_requests_total", len(missing), cache="embedding", result="miss")
 
-        return self._deduplicate(matches)
+        if missing:
+            computed = self._encode_with_model(missing)
+            vectors.update(zip(missing, computed))
+
+            if self.embedding_store is not None:
+                self.embedding_store.put_many(missing, computed)
+
+        return np.array([vectors[text] for text in texts], dtype=np.float32)
+
+    def _encode_with_model(self, texts):
+        """Run the transformer over texts in batches"""
+
+        model = get_model(
+            self.model_server_socket,
+            self.model_server_authkey,
+            backend=self.embedding_backend,
+            onnx_dir=self.onnx_dir
+        )
+        with metrics.timer("plagiarism_operation_seconds", operation="encode"):
+            embeddings = model.encode(
+                texts,
+                batch_size=self.embedding_batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        self.ready = True
+        return np.asarray(embeddings, dtype=np.float32)
 
     # ======================================================
-    # AI DETECTION (Simple Heuristic)
+    # ARCHIVE (previously uploaded documents)
     # ======================================================
 
-    def _detect_ai_generated(self, text):
+    def index_document(self, document_id, text):
+        """
+        Add a document to the archive fingerprint and vector indexes it
+        isn't in yet (a retried job, or a backfill after an interrupted
+        one, doesn't add it twice)
+        """
 
-        sentences = self._split_sentences(text)
+        if self.fingerprint_index is not None and document_id not in self.fingerprint_index:
+            self.fingerprint_index.add(document_id, text)
 
-        if len(sentences) < 3:
-            return 0.1
+        if self.archive_index is None or document_id in self.archive_index:
+            return 0
 
-        sentence_lengths = [len(s.split()) for s in sentences]
-        variance = np.var(sentence_lengths)
+        spans = self._sentence_spans(text)
+        if not spans:
+            return 0
 
-        if variance < 5:
-            return 0.7
-        elif variance < 10:
-            return 0.5
-        else:
-            return 0.2
+        embeddings = self._encode([sentence for sentence, _, _ in spans])
+        self.archive_index.add(document_id, embeddings, [
+            {"text": sentence[:500], "start": start, "end": end}
+            for sentence, start, end in spans
+        ])
+        return len(spans)
+
+    def is_archived(self, document_id):
+        """Whether every configured archive index holds the document"""
+        return all(
+            index is None or document_id in index
+            for index in (self.fingerprint_index, self.archive_index)
+        )
+
+    def remove_document(self, document_id):
+        if self.archive_index is not None:
+            self.archive_index.remove(document_id)
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.remove(document_id)
+
+    def _detect_archive_matches(self, spans, embeddings, exclude_document_id=None):
+        """Best archived sentence for every submitted sentence, in one batch"""
+
+        if self.archive_index is None or not spans:
+            return []
+
+        results = self.archive_index.search(
+            embeddings,
+            k=self.archive_top_k,
+            exclude_document_id=exclude_document_id
+        )
+
+        matches = []
+
+        for (sentence, start, end), hits in zip(spans, results):
+            for score, entry in hits:
+                if score < self.similarity_threshold:
+                    break
+
+                matches.append({
+                    "source_url": None,
+                    "source_document_id": entry["document_id"],
+                    "matched_text": sentence,
+                    "original_text": entry["text"],
+                    "similarity_score": float(score),
+                    "match_type": "archive",
+                    "start_index": start,
+                    "end_index": end,
+                    "source_start_index": entry["start"],
+                    "source_end_index": entry["end"]
+                })
+
+        return matches
+
+    # ======================================================
+    # AI DETECTION (stylometry + optional LM perplexity)
+    # ======================================================
+
+    def _detect_ai_generated(self, text, spans=None, deadline=None):
+        """AIDetector result: document probability plus one per sentence"""
+
+        if spans is None:
+            spans = self._sentence_spans(text)
+        return self.ai_detector.detect(text, spans, deadline=deadline)
+
+    # ======================================================
+    # SOURCE RETRIEVAL (concurrent search + fetch)
+    # ======================================================
+
+    def _retrieve_sources(self, sentences, deadline=None, max_fetches=None,
+                          on_search=None, on_fetch=None):
+        """
+        Search every query concurrently, then fetch the unique result
+        pages concurrently (at most max_fetches, earlier queries first),
+        all within one analysis deadline. on_search / on_fetch are
+        called with (done, total) as calls finish.
+
+        Returns (urls per query, {url: page text}).
+        """
+
+        if deadline is None:
+            deadline = self.retriever.start_deadline()
+
+        search_host = urllib.parse.urlsplit(self.search_url).netloc
+        searches = self.retriever.map(
+            self._search_text,
+            sentences,
+            deadline=deadline,
+            host_of=lambda _query: search_host,
+            on_done=on_search,
+            name="search"
+        )
+        sentence_urls = [searches.get(sentence, []) for sentence in sentences]
+
+        urls = list(dict.fromkeys(url for urls in sentence_urls for url in urls))
+        if max_fetches is not None:
+            urls = urls[:max_fetches]
+        pages = self.retriever.map(
+            self._fetch_content, urls, deadline=deadline, on_done=on_fetch, name="page"
+        )
+
+        return sentence_urls, pages
 
     # ======================================================
     # SEARCH (DuckDuckGo HTML)
@@ -130,24 +915,44 @@ class DetectionEngine:
 
     def _search_text(self, query):
 
+        key = normalize_query(query[:150])
+        cached = self.search_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Failed (None) and empty searches aren't cached: an empty page
+        # is as likely a rate limit or a changed layout as no results
+        results = self._search_web(query)
+        if results:
+            self.search_cache.set(key, results)
+
+        return results or []
+
+    def _search_web(self, query):
+
         results = []
 
         try:
             encoded_query = urllib.parse.quote(query[:150])
-            url = f"https://html.duckduckgo.com/html/?q={encoded_query}"
+            url = self.search_url.format(query=encoded_query)
 
-            response = requests.get(url, headers=self.headers, timeout=8)
-            soup = BeautifulSoup(response.text, "html.parser")
+            with metrics.timer("plagiarism_operation_seconds", operation="search"):
+                response = requests.get(url, headers=self.headers, timeout=self.request_timeout)
+            response.raise_for_status()
 
-            links = soup.find_all("a", class_="result__a")
+            with metrics.timer("plagiarism_operation_seconds", operation="parse"):
+                soup = BeautifulSoup(response.text, "html.parser")
+                links = soup.find_all("a", class_="result__a")
 
             for link in links[:self.max_urls_per_sentence]:
                 href = link.get("href")
                 if href:
                     results.append(href)
 
-        except Exception:
-            pass
+        except Exception as e:
+            # Don't cache failed searches
+            metrics.inc("plagiarism_fetch_failures_total", kind="search", reason=_failure_reason(e))
+            return None
 
         return results
 
@@ -157,84 +962,85 @@ class DetectionEngine:
 
     def _fetch_content(self, url):
 
+        cached = self.page_cache.get(url)
+        if cached is not None:
+            return cached
+
+        content = self._download_page(url)
+        if content:
+            self.page_cache.set(url, content)
+
+        return content
+
+    def _download_page(self, url):
+
         try:
-            response = requests.get(url, headers=self.headers, timeout=8)
-            soup = BeautifulSoup(response.content, "html.parser")
+            with metrics.timer("plagiarism_operation_seconds", operation="fetch"):
+                response = requests.get(url, headers=self.headers, timeout=self.request_timeout)
+            # Error pages (404, 403, 5xx) are not the source; never cached
+            response.raise_for_status()
+
+            with metrics.timer("plagiarism_operation_seconds", operation="parse"):
+                soup = BeautifulSoup(response.content, "html.parser")
 
-            for script in soup(["script", "style"]):
-                script.decompose()
+                for script in soup(["script", "style"]):
+                    script.decompose()
 
-            text = soup.get_text(separator=" ")
-            text = " ".join(text.split())
+                text = soup.get_text(separator=" ")
+                text = " ".join(text.split())
 
             return text[:12000]
 
-        except Exception:
+        except Exception as e:
+            metrics.inc("plagiarism_fetch_failures_total", kind="page", reason=_failure_reason(e))
             return None
 
     # ======================================================
     # FILE PROCESSOR (SAFE VERSION)
     # ======================================================
 
-    def extract_text_from_file(self, file_path, file_type):
-
-        if file_type == "txt":
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    return f.read()
-            except Exception:
-                return ""
-
-        if file_type == "pdf":
-            try:
-                import pdfplumber
-                text = []
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        t = page.extract_text()
-                        if t:
-                            text.append(t)
-                return "\n".join(text)
-            except Exception:
-                return ""
-
-        if file_type in ["docx", "doc"]:
-            try:
-                from docx import Document
-                doc = Document(file_path)
-                return "\n".join(
-                    para.text for para in doc.paragraphs
-                    if para.text.strip()
-                )
-            except Exception:
-                return ""
-
-        return ""
+    def extract_text_from_file(self, file_path, file_type, max_chars=200000):
+        """Text of an uploaded file, read page by page up to max_chars"""
+        return extract_text(file_path, file_type, max_chars=max_chars).text
 
     # ======================================================
     # HELPERS
     # ======================================================
 
     def _split_sentences(self, text):
-        sentences = re.split(r"[.!?]+", text)
-        return [s.strip() for s in sentences if len(s.strip()) > 25]
+        return [sentence for sentence, _, _ in self._sentence_spans(text)]
+
+    def _sentence_spans(self, text):
+        """(sentence, start, end) for every sentence longer than 25 chars"""
+
+        spans = []
+
+        for match in re.finditer(r"[^.!?]+", text):
+            raw = match.group()
+            sentence = raw.strip()
+            if len(sentence) > 25:
+                start = match.start() + len(raw) - len(raw.lstrip())
+                spans.append((sentence, start, start + len(sentence)))
+
+        return spans
 
     def _deduplicate(self, matches):
         seen = set()
         unique = []
 
         for match in sorted(matches, key=lambda x: x["similarity_score"], reverse=True):
-            key = (match["matched_text"], match["source_url"])
+            key = (match["matched_text"], match["source_url"], match.get("source_document_id"))
             if key not in seen:
                 seen.add(key)
                 unique.append(match)
 
-        return unique[:20]
+        return unique
 
     def _empty_result(self):
         return {
             "plagiarism_matches": [],
             "plagiarism_score": 0.0,
             "ai_probability": 0.0,
+            "ai_details": None,
             "final_score": 0.0
         }
@@ -0,0 +1,145 @@
+import os
+import numpy as np
+
+# ==========================================================
+# EMBEDDING BACKENDS
+# ==========================================================
+#
+# Every backend exposes the SentenceTransformer.encode signature the
+# engine and the model server use, so they can be swapped by config
+# (EMBEDDING_BACKEND):
+#
+#   torch  fp32 PyTorch, the reference
+#   int8   PyTorch with Linear layers dynamically quantized to int8
+#   onnx   the transformer exported to ONNX and run with ONNX Runtime
+#
+# Check a backend against torch with benchmark_embeddings.py before
+# switching: archived vectors are not re-encoded.
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def backend_key(model_name, backend):
+    """Name used for caches/indexes so vectors from different backends never mix"""
+    return model_name if backend == "torch" else f"{model_name}-{backend}"
+
+
+def load_backend(model_name, backend="torch", onnx_dir=None):
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    model = SentenceTransformer(model_name, device="cpu")
+
+    if backend == "int8":
+        import torch
+        return torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    if backend == "onnx":
+        try:
+            return OnnxEncoder(model, onnx_dir or "/tmp/plagiarism-cache/onnx")
+        except ImportError as e:
+            print(f"⚠ ONNX backend unavailable ({e}), using torch")
+
+    return model
+
+
+# ==========================================================
+# ONNX RUNTIME
+# ==========================================================
+
+
+class OnnxEncoder:
+    """
+    Runs the model's transformer through ONNX Runtime and applies the
+    SentenceTransformer pooling (mean over tokens) itself.
+
+    The graph is exported once from the loaded model and reused from
+    onnx_dir afterwards.
+    """
+
+    def __init__(self, model, onnx_dir):
+        import onnxruntime
+
+        transformer = model[0]
+        self.tokenizer = transformer.tokenizer
+        self.max_length = model.max_seq_length
+        self.normalize = any(
+            type(module).__name__ == "Normalize" for module in model
+        )
+
+        os.makedirs(onnx_dir, exist_ok=True)
+        path = os.path.join(onnx_dir, "model.onnx")
+        if not os.path.exists(path):
+            self._export(transformer.auto_model, path)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _export(self, auto_model, path):
+        import torch
+
+        dummy = self.tokenizer(["export"], return_tensors="pt")
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        axes = {name: {0: "batch", 1: "tokens"} for name in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "tokens"}
+
+        # Write then rename so concurrent workers never load a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.onnx.export(
+            auto_model,
+            tuple(dummy[name] for name in names),
+            tmp_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14
+        )
+        os.replace(tmp_path, path)
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True,
+               normalize_embeddings=False, show_progress_bar=False):
+
+        texts = list(texts)
+        parts = []
+
+        # Sort by length so each batch pads to a similar size
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            tokens = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {
+                name: tokens[name].astype(np.int64)
+                for name in self.input_names if name in tokens
+            }
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            parts.append(pooled.astype(np.float32))
+
+        if not parts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        embeddings = np.empty((len(texts), parts[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(parts)
+
+        if self.normalize or normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+
+        return embeddings
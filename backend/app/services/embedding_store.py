@@ -0,0 +1,262 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# ==========================================================
+# SHARED EMBEDDING STORE
+# ==========================================================
+
+
+class EmbeddingStore:
+    """
+    Fixed-capacity store of float32 embeddings shared by every worker
+    process on the host.
+
+    Vectors live in one memory-mapped (capacity x dim) array; a small
+    SQLite table maps sha256(model name + text) to a row ("slot") and
+    tracks last access for LRU eviction.
+    """
+
+    def __init__(self, directory, model_name, capacity=50000):
+        self.directory = directory
+        self.model_name = model_name
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._dim = None
+        self._local = threading.local()
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.sqlite3")
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " slot INTEGER NOT NULL UNIQUE,"
+                " ready INTEGER NOT NULL DEFAULT 0,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+
+    # ------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._index_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _open_vectors(self, dim=None):
+        """Map the vector file, creating it on first write"""
+
+        if self._vectors is not None:
+            return self._vectors
+
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+
+        if row is None:
+            if dim is None:
+                return None
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (dim,)
+            )
+            row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+
+        self._dim = row[0]
+
+        # Grow the (sparse) backing file in place rather than opening it
+        # with "w+", which would truncate rows other workers have written
+        size = self.capacity * self._dim * np.dtype(np.float32).itemsize
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+
+        self._vectors = np.memmap(
+            self._vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(self.capacity, self._dim)
+        )
+        return self._vectors
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def _lookup(self, conn, keys):
+        slots = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, slot FROM entries WHERE ready = 1 AND key IN ({placeholders})",
+                chunk
+            ).fetchall()
+            slots.update(rows)
+        return slots
+
+    # ------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------
+
+    def get_many(self, texts):
+        """Return {position in texts: vector} for every stored text"""
+
+        try:
+            vectors = self._open_vectors()
+            if vectors is None:
+                self.misses += len(texts)
+                return {}
+
+            conn = self._connect()
+            keys = [self._key(text) for text in texts]
+            slots = self._lookup(conn, keys)
+
+            rows = {key: np.array(vectors[slot]) for key, slot in slots.items()}
+
+            # A slot can be recycled by another process while we copy it;
+            # only keep rows whose mapping is unchanged afterwards
+            if rows:
+                confirmed = self._lookup(conn, list(rows))
+                rows = {
+                    key: vector for key, vector in rows.items()
+                    if confirmed.get(key) == slots[key]
+                }
+                self._touch(conn, list(rows))
+
+        except (sqlite3.Error, OSError, ValueError):
+            self.misses += len(texts)
+            return {}
+
+        found = {i: rows[key] for i, key in enumerate(keys) if key in rows}
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, texts, embeddings):
+        """Store embeddings for texts, evicting least recently used rows"""
+
+        keys = list(dict.fromkeys(self._key(text) for text in texts))
+        by_key = {self._key(text): vector for text, vector in zip(texts, embeddings)}
+
+        try:
+            vectors = self._open_vectors(dim=len(embeddings[0]))
+            conn = self._connect()
+
+            slots = self._reserve(conn, keys)
+            if not slots:
+                return
+
+            for key, slot in slots.items():
+                vectors[slot] = by_key[key]
+            vectors.flush()
+
+            self._mark_ready(conn, list(slots))
+
+        except (sqlite3.Error, OSError, ValueError, IndexError):
+            pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    # ------------------------------------------------------
+    # Slot management
+    # ------------------------------------------------------
+
+    def _reserve(self, conn, keys):
+        """Allocate (not yet readable) slots for new keys"""
+
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            existing = set()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(row[0] for row in conn.execute(
+                    f"SELECT key FROM entries WHERE key IN ({placeholders})", chunk
+                ))
+
+            new_keys = [key for key in keys if key not in existing][:self.capacity]
+            if not new_keys:
+                conn.execute("COMMIT")
+                return {}
+
+            row = conn.execute("SELECT value FROM meta WHERE name = 'next_slot'").fetchone()
+            next_slot = row[0] if row else 0
+
+            fresh = list(range(next_slot, min(self.capacity, next_slot + len(new_keys))))
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('next_slot', ?)",
+                (next_slot + len(fresh),)
+            )
+
+            # Out of fresh rows: recycle the least recently used ones
+            shortfall = len(new_keys) - len(fresh)
+            recycled = []
+            if shortfall > 0:
+                # Reservations that never became ready (writer died) are
+                # reclaimable after a minute
+                victims = conn.execute(
+                    "SELECT key, slot FROM entries WHERE ready = 1 OR accessed_at < ?"
+                    " ORDER BY accessed_at ASC LIMIT ?",
+                    (now - 60, shortfall)
+                ).fetchall()
+                conn.executemany(
+                    "DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims]
+                )
+                recycled = [slot for _, slot in victims]
+
+            slots = dict(zip(new_keys, fresh + recycled))
+            conn.executemany(
+                "INSERT INTO entries (key, slot, ready, accessed_at) VALUES (?, ?, 0, ?)",
+                [(key, slot, now) for key, slot in slots.items()]
+            )
+            conn.execute("COMMIT")
+            return slots
+
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _mark_ready(self, conn, keys):
+        self._execute_many(
+            conn, "UPDATE entries SET ready = 1 WHERE key = ?", [(key,) for key in keys]
+        )
+
+    def _touch(self, conn, keys):
+        if not keys:
+            return
+        now = time.time()
+        self._execute_many(
+            conn,
+            "UPDATE entries SET accessed_at = ? WHERE key = ?",
+            [(now, key) for key in keys]
+        )
+
+    def _execute_many(self, conn, sql, params):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
@@ -0,0 +1,412 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.utils.file_lock import FileLock
+
+# ==========================================================
+# LEXICAL FINGERPRINTING (shingles + winnowing + MinHash)
+# ==========================================================
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hash64(value):
+    """Stable 64-bit hash (Python's hash() is salted per process)"""
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "little"
+    ) >> 1
+
+
+class Fingerprinter:
+    """
+    Word n-gram shingling and winnowing with character offsets.
+
+    A fingerprint is (hash, start, end) where start/end are the character
+    offsets of the shingle in the original text.
+    """
+
+    def __init__(self, ngram_size=3, window=4, num_perm=32, bands=16, chunk_shingles=24):
+        self.ngram_size = ngram_size
+        self.window = window
+        self.num_perm = num_perm
+        self.bands = bands
+        self.chunk_shingles = chunk_shingles
+
+        rng = np.random.RandomState(1)
+        self._perm_a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._perm_b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        """Return (hashes, starts, ends) arrays, one row per word n-gram"""
+
+        tokens = [(m.group().lower(), m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+        n = self.ngram_size
+        count = max(len(tokens) - n + 1, 0)
+
+        hashes = np.empty(count, dtype=np.uint64)
+        starts = np.empty(count, dtype=np.int64)
+        ends = np.empty(count, dtype=np.int64)
+
+        for i in range(count):
+            gram = tokens[i:i + n]
+            hashes[i] = _hash64(" ".join(word for word, _, _ in gram))
+            starts[i] = gram[0][1]
+            ends[i] = gram[-1][2]
+
+        return hashes, starts, ends
+
+    def winnow(self, hashes):
+        """
+        Indices of the winnowed shingles: the rightmost minimum of every
+        window of w consecutive hashes, each position reported once.
+        """
+
+        w = self.window
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if len(hashes) <= w:
+            return np.array([len(hashes) - 1 - int(np.argmin(hashes[::-1]))])
+
+        windows = np.lib.stride_tricks.sliding_window_view(hashes, w)
+        # argmin over the reversed window gives the rightmost minimum
+        picks = (w - 1 - np.argmin(windows[:, ::-1], axis=1)) + np.arange(len(windows))
+        keep = np.concatenate([[True], picks[1:] != picks[:-1]])
+        return picks[keep]
+
+    @property
+    def winnow_density(self):
+        """Expected share of shingles kept by winnowing"""
+        return 2.0 / (self.window + 1)
+
+    def fingerprint(self, text):
+        """Winnowed (hashes, starts, ends) for a text"""
+
+        hashes, starts, ends = self.shingles(text)
+        picks = self.winnow(hashes)
+        return hashes[picks], starts[picks], ends[picks]
+
+    def band_keys(self, hashes, stride=None):
+        """
+        MinHash every chunk of chunk_shingles shingles and fold each
+        signature band into one 64-bit LSH bucket key.
+
+        Archived documents use back-to-back chunks to keep the index
+        small; queries pass a smaller stride so any copied passage lines
+        up with some archived chunk.
+        """
+
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.uint64)
+
+        size = self.chunk_shingles
+        stride = stride or size
+        chunk_starts = range(0, max(len(hashes) - size, 0) + 1, stride)
+
+        reduced = (hashes & np.uint64(0xFFFFFFFF))[:, None]
+        # (a*h + b) mod p; a, h < 2^32 so the product fits in uint64
+        permuted = (self._perm_a * reduced % np.uint64(_MERSENNE_PRIME) + self._perm_b) \
+            % np.uint64(_MERSENNE_PRIME)
+
+        signatures = np.stack([
+            permuted[start:start + size].min(axis=0) for start in chunk_starts
+        ])
+
+        rows = self.num_perm // self.bands
+        banded = signatures[:, :rows * self.bands].reshape(len(signatures), self.bands, rows)
+
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for r in range(rows):
+            keys = keys * np.uint64(1000003) ^ banded[:, :, r]
+        keys = keys * np.uint64(31) + np.arange(self.bands, dtype=np.uint64)
+
+        return np.unique(keys.ravel())
+
+
+def find_passages(query_fp, source_fp, density=1.0, max_gap=80, min_hits=2):
+    """
+    Align shared fingerprints into passages.
+
+    query_fp holds every shingle of the query and source_fp the source
+    shingles (all of them, or a winnowed subset whose expected share of
+    a copied passage is density). Both are (hashes, starts, ends).
+
+    Returns dicts with start/end (query offsets), source_start/source_end,
+    hits and score, the share of the passage's shingles found in the source.
+    """
+
+    q_hashes, q_starts, q_ends = query_fp
+    s_hashes, s_starts, s_ends = source_fp
+
+    if len(q_hashes) == 0 or len(s_hashes) == 0:
+        return []
+
+    order = np.argsort(s_hashes, kind="stable")
+    sorted_hashes = s_hashes[order]
+    lo = np.searchsorted(sorted_hashes, q_hashes, side="left")
+    hi = np.searchsorted(sorted_hashes, q_hashes, side="right")
+
+    pairs = []
+    for qi in np.nonzero(hi > lo)[0]:
+        # Cap repeats of very common shingles
+        for si in order[lo[qi]:min(hi[qi], lo[qi] + 4)]:
+            pairs.append((int(q_starts[qi]), int(q_ends[qi]), int(s_starts[si]), int(s_ends[si])))
+
+    pairs.sort()
+    passages = []
+
+    for start, end, src_start, src_end in pairs:
+        for passage in reversed(passages[-4:]):
+            if (start <= passage["end"] + max_gap
+                    and passage["source_start"] - max_gap <= src_start <= passage["source_end"] + max_gap):
+                passage["end"] = max(passage["end"], end)
+                passage["source_start"] = min(passage["source_start"], src_start)
+                passage["source_end"] = max(passage["source_end"], src_end)
+                passage["hits"] += 1
+                passage["positions"].add(start)
+                break
+        else:
+            passages.append({
+                "start": start,
+                "end": end,
+                "source_start": src_start,
+                "source_end": src_end,
+                "hits": 1,
+                "positions": {start}
+            })
+
+    # A repeated source passage aligns the same query span several
+    # times; keep the best-supported alignment per query region
+    kept = []
+    for passage in sorted(passages, key=lambda p: p["hits"], reverse=True):
+        if passage["hits"] < min_hits:
+            continue
+        length = passage["end"] - passage["start"]
+        if any(
+            min(passage["end"], other["end"]) - max(passage["start"], other["start"]) > length / 2
+            for other in kept
+        ):
+            continue
+        kept.append(passage)
+
+    for passage in kept:
+        total = (np.searchsorted(q_ends, passage["end"], side="right")
+                 - np.searchsorted(q_starts, passage["start"], side="left"))
+        matched = len(passage.pop("positions"))
+        passage["score"] = min(1.0, matched / max(total * density, 1))
+
+    return sorted(kept, key=lambda p: p["start"])
+
+
+# ==========================================================
+# ARCHIVE FINGERPRINT INDEX (LSH bands)
+# ==========================================================
+
+
+class FingerprintIndex:
+    """
+    LSH band index over the document archive.
+
+    bands.bin holds (bucket key, document key) uint64 pairs appended by
+    any worker; docs/<document key>.npz holds each document's winnowed
+    fingerprints. Deleting a document removes its .npz file and appends
+    its id to removed.jsonl, which every process reads on refresh() so
+    copies it already cached stop matching too.
+    """
+
+    def __init__(self, directory, fingerprinter, max_candidates=20, cache_size=256):
+        self.directory = directory
+        self.fingerprinter = fingerprinter
+        self.max_candidates = max_candidates
+
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._docs = np.zeros(0, dtype=np.uint64)
+        self._offset = 0
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._removed = set()
+        self._removed_offset = 0
+        self._lock = threading.Lock()
+
+        self._docs_dir = os.path.join(directory, "docs")
+        os.makedirs(self._docs_dir, exist_ok=True)
+        self._bands_path = os.path.join(directory, "bands.bin")
+        self._removed_path = os.path.join(directory, "removed.jsonl")
+        self._lock_path = os.path.join(directory, ".lock")
+
+    def _doc_path(self, doc_key):
+        return os.path.join(self._docs_dir, f"{int(doc_key):016x}.npz")
+
+    def add(self, document_id, text):
+        hashes, starts, ends = self.fingerprinter.shingles(text)
+        picks = self.fingerprinter.winnow(hashes)
+        band_keys = self.fingerprinter.band_keys(hashes)
+        doc_key = np.uint64(_hash64(document_id))
+
+        np.savez(
+            self._doc_path(doc_key),
+            hashes=hashes[picks],
+            starts=starts[picks],
+            ends=ends[picks],
+            document_id=np.array(document_id)
+        )
+
+        records = np.empty((len(band_keys), 2), dtype=np.uint64)
+        records[:, 0] = band_keys
+        records[:, 1] = doc_key
+
+        with FileLock(self._lock_path, fcntl.LOCK_EX):
+            with open(self._bands_path, "ab") as f:
+                size = f.tell()
+                if size % 16:
+                    f.truncate(size - size % 16)
+                f.write(records.tobytes())
+
+    def __contains__(self, document_id):
+        """Whether the document is indexed and not removed"""
+        with self._lock:
+            self._read_removed()
+            if _hash64(document_id) in self._removed:
+                return False
+        return os.path.exists(self._doc_path(_hash64(document_id)))
+
+    def remove(self, document_id):
+        doc_key = _hash64(document_id)
+
+        with FileLock(self._lock_path, fcntl.LOCK_EX):
+            with open(self._removed_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(document_id) + "\n")
+
+        with self._lock:
+            self._removed.add(doc_key)
+            self._cache.pop(doc_key, None)
+
+        try:
+            os.remove(self._doc_path(doc_key))
+        except OSError:
+            pass
+
+    def candidates(self, band_keys, exclude_document_id=None):
+        """Archived document keys sharing at least one LSH bucket, most first"""
+
+        self.refresh()
+
+        with self._lock:
+            if len(self._keys) == 0 or len(band_keys) == 0:
+                return []
+
+            lo = np.searchsorted(self._keys, band_keys, side="left")
+            hi = np.searchsorted(self._keys, band_keys, side="right")
+            hits = np.concatenate(
+                [self._docs[a:b] for a, b in zip(lo, hi) if b > a] or [np.zeros(0, np.uint64)]
+            )
+
+        if len(hits) == 0:
+            return []
+
+        doc_keys, votes = np.unique(hits, return_counts=True)
+        ranked = doc_keys[np.argsort(-votes, kind="stable")]
+
+        excluded = _hash64(exclude_document_id) if exclude_document_id else None
+        return [
+            k for k in ranked.tolist()
+            if k != excluded and k not in self._removed
+        ][:self.max_candidates]
+
+    def load(self, doc_key):
+        """(document_id, (hashes, starts, ends)) or None when deleted"""
+
+        with self._lock:
+            if doc_key in self._removed:
+                return None
+            if doc_key in self._cache:
+                self._cache.move_to_end(doc_key)
+                return self._cache[doc_key]
+
+        try:
+            with np.load(self._doc_path(doc_key)) as data:
+                entry = (
+                    str(data["document_id"]),
+                    (data["hashes"], data["starts"], data["ends"])
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+        with self._lock:
+            self._cache[doc_key] = entry
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+        return entry
+
+    def search(self, text, exclude_document_id=None, query_fp=None):
+        """Passages of text found in archived documents"""
+
+        # Every query shingle is compared against the stored winnowed
+        # ones, which keeps passage boundaries tight
+        if query_fp is None:
+            query_fp = self.fingerprinter.shingles(text)
+        band_keys = self.fingerprinter.band_keys(
+            query_fp[0], stride=max(self.fingerprinter.chunk_shingles // 4, 1)
+        )
+
+        results = []
+        for doc_key in self.candidates(band_keys, exclude_document_id):
+            entry = self.load(doc_key)
+            if entry is None:
+                continue
+            document_id, source_fp = entry
+            density = self.fingerprinter.winnow_density
+            for passage in find_passages(query_fp, source_fp, density=density):
+                results.append({**passage, "document_id": document_id})
+
+        return results
+
+    def refresh(self):
+        """Pick up bands appended and documents removed by other processes"""
+
+        with self._lock:
+            self._read_removed()
+
+        if not os.path.exists(self._bands_path):
+            return
+
+        with self._lock:
+            with FileLock(self._lock_path, fcntl.LOCK_SH):
+                with open(self._bands_path, "rb") as f:
+                    f.seek(self._offset)
+                    data = f.read()
+
+            data = data[:len(data) - len(data) % 16]
+            if not data:
+                return
+
+            self._offset += len(data)
+            records = np.frombuffer(data, dtype=np.uint64).reshape(-1, 2)
+
+            keys = np.concatenate([self._keys, records[:, 0]])
+            docs = np.concatenate([self._docs, records[:, 1]])
+            order = np.argsort(keys, kind="stable")
+            self._keys = keys[order]
+            self._docs = docs[order]
+
+    def _read_removed(self):
+        """Tombstones since the last call; evicts cached copies (caller holds _lock)"""
+
+        if not os.path.exists(self._removed_path):
+            return
+
+        with open(self._removed_path, "rb") as f:
+            f.seek(self._removed_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line
+                doc_key = _hash64(json.loads(line))
+                self._removed.add(doc_key)
+                self._cache.pop(doc_key, None)
+                self._removed_offset += len(line)
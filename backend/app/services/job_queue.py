@@ -0,0 +1,242 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, update
+from app import db
+from app.models import Analysis, AnalysisBatch, AnalysisJob
+
+# ==========================================================
+# DATABASE-BACKED JOB QUEUE
+# ==========================================================
+
+
+class JobQueue:
+    """
+    Durable job queue stored in the analysis_jobs table.
+
+    A claimed job is leased to one worker until locked_until; a worker
+    that dies without finishing simply lets the lease expire and the job
+    is queued again. Failed jobs, and jobs whose lease expired, are
+    retried with exponential backoff until max_attempts is reached.
+    """
+
+    def __init__(self, visibility_timeout=300, max_attempts=3, retry_backoff=30):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    def configure(self, config):
+        self.visibility_timeout = config.get("JOB_VISIBILITY_TIMEOUT", self.visibility_timeout)
+        self.max_attempts = config.get("JOB_MAX_ATTEMPTS", self.max_attempts)
+        self.retry_backoff = config.get("JOB_RETRY_BACKOFF", self.retry_backoff)
+
+    # ------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------
+
+    def enqueue(self, kind, user_id, analysis_id=None, document_id=None, payload=None):
+        """Add a job to the session; committed with the caller's transaction"""
+
+        job = AnalysisJob(
+            kind=kind,
+            user_id=user_id,
+            analysis_id=analysis_id,
+            document_id=document_id,
+            payload=payload,
+            status="queued",
+            max_attempts=self.max_attempts,
+            available_at=datetime.utcnow()
+        )
+        db.session.add(job)
+        return job
+
+    # ------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------
+
+    def claim(self, worker_id, on_abandoned=None):
+        """
+        Lease the next runnable job to worker_id, or return None.
+        Expired leases are dealt with first (see expire_leases).
+        """
+
+        self.expire_leases(on_abandoned)
+
+        now = datetime.utcnow()
+        runnable = and_(AnalysisJob.status == "queued", AnalysisJob.available_at <= now)
+
+        candidates = (
+            db.session.query(AnalysisJob.id)
+            .filter(runnable)
+            .order_by(AnalysisJob.available_at.asc())
+            .limit(5)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+        for (job_id,) in candidates:
+            # Conditional update so two workers can never both win a job
+            # (SQLite ignores FOR UPDATE SKIP LOCKED)
+            claimed = db.session.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job_id)
+                .where(runnable)
+                .values(
+                    status="running",
+                    locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=self.visibility_timeout),
+                    attempts=AnalysisJob.attempts + 1,
+                    updated_at=now
+                )
+            ).rowcount
+
+            if claimed:
+                db.session.commit()
+                return db.session.get(AnalysisJob, job_id)
+
+        db.session.commit()
+        return None
+
+    def expire_leases(self, on_abandoned=None):
+        """
+        Running jobs whose lease expired: the worker holding them crashed,
+        hung or was killed (often by the job itself: OOM, RLIMIT). Like
+        fail(), they are queued again with backoff, or marked failed once
+        max_attempts is reached, in which case on_abandoned(job, error)
+        fails whatever the job was working on.
+        """
+
+        now = datetime.utcnow()
+        expired = (
+            AnalysisJob.query
+            .filter(AnalysisJob.status == "running", AnalysisJob.locked_until < now)
+            .limit(20)
+            .all()
+        )
+
+        for job in expired:
+            error = f"Lease expired (worker {job.locked_by} died or hung)"
+            final = job.attempts >= job.max_attempts
+
+            if final:
+                values = {"status": "failed"}
+            else:
+                values = {"status": "queued", "available_at": now + timedelta(seconds=self.backoff(job))}
+
+            # Conditional, so only one worker handles each expired lease
+            changed = db.session.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job.id)
+                .where(AnalysisJob.status == "running")
+                .where(AnalysisJob.locked_until < now)
+                .values(locked_by=None, locked_until=None, last_error=error, updated_at=now, **values)
+            ).rowcount
+            db.session.commit()
+
+            if not changed:
+                continue
+
+            print(f"⚠ Job {job.id} ({job.kind}): {error}, "
+                  f"{'giving up' if final else 'retrying'} after {job.attempts} attempts")
+
+            if final and on_abandoned:
+                try:
+                    on_abandoned(db.session.get(AnalysisJob, job.id), error)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠ Failing abandoned job {job.id}: {e}")
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease while a long job is still running"""
+
+        db.session.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id)
+            .where(AnalysisJob.locked_by == worker_id)
+            .where(AnalysisJob.status == "running")
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=self.visibility_timeout))
+        )
+        db.session.commit()
+
+    def complete(self, job):
+        job.status = "completed"
+        job.locked_until = None
+        job.last_error = None
+        db.session.commit()
+
+    def fail(self, job, error):
+        """Reschedule with backoff, or give up after max_attempts"""
+
+        job.last_error = str(error)
+        job.locked_until = None
+
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+        else:
+            job.status = "queued"
+            job.available_at = datetime.utcnow() + timedelta(seconds=self.backoff(job))
+
+        db.session.commit()
+        return job.status
+
+    def backoff(self, job):
+        return self.retry_backoff * (2 ** max(job.attempts - 1, 0))
+
+    def is_final_attempt(self, job):
+        return job.attempts >= job.max_attempts
+
+    # ------------------------------------------------------
+    # Crash recovery
+    # ------------------------------------------------------
+
+    def recover_orphans(self):
+        """
+        Re-queue analyses and batches left pending/processing with no
+        live job, e.g. those started by the old in-process threads
+        before a restart.
+        """
+
+        active = (
+            db.session.query(AnalysisJob.analysis_id)
+            .filter(AnalysisJob.analysis_id.isnot(None))
+            .filter(AnalysisJob.status.in_(["queued", "running"]))
+        )
+
+        # Batch members are run by their batch's job
+        orphans = (
+            Analysis.query
+            .filter(Analysis.status.in_(["pending", "processing"]))
+            .filter(Analysis.batch_id.is_(None))
+            .filter(Analysis.id.notin_(active))
+            .all()
+        )
+
+        for analysis in orphans:
+            analysis.status = "pending"
+            self.enqueue(
+                "analysis",
+                analysis.user_id,
+                analysis_id=analysis.id,
+                document_id=analysis.document_id
+            )
+
+        active_batches = {
+            (job.payload or {}).get("batch_id")
+            for job in AnalysisJob.query.filter(AnalysisJob.kind.in_(["analysis_batch", "collusion"]))
+            .filter(AnalysisJob.status.in_(["queued", "running"]))
+        }
+        batches = (
+            AnalysisBatch.query
+            .filter(AnalysisBatch.status.in_(["queued", "processing"]))
+            .all()
+        )
+
+        orphan_batches = [batch for batch in batches if batch.id not in active_batches]
+        for batch in orphan_batches:
+            batch.status = "queued"
+            kind = "collusion" if batch.kind == "collusion" else "analysis_batch"
+            self.enqueue(kind, batch.user_id, payload={"batch_id": batch.id})
+
+        db.session.commit()
+        return len(orphans) + len(orphan_batches)
+
+
+queue = JobQueue()
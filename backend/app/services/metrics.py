@@ -0,0 +1,404 @@
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# ==========================================================
+# METRICS
+# ==========================================================
+#
+# Counters and latency histograms for the web and worker processes,
+# exported in Prometheus text format by GET /metrics.
+#
+# Each process records into its own registry and also writes a snapshot
+# of it (at most every flush_interval seconds, from a background thread,
+# and after every job) to a store shared with the others; /metrics adds up every snapshot there, so
+# stage and job timings recorded by worker processes are scraped from the
+# web server. METRICS_STORE picks the store:
+#
+#   directory  one file per process in METRICS_DIR: processes on one
+#              host, or hosts sharing a volume (docker-compose)
+#   database   one metrics_snapshots row per process: web and worker on
+#              separate hosts (render.yaml)
+#   none       this process only
+#
+# Snapshots not updated for METRICS_RETENTION seconds are dropped.
+#
+# While an analysis runs, stage and operation timings also go to its
+# Breakdown (a context variable, carried into retrieval threads), which
+# save_result stores in AnalysisLog.details["breakdown"].
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HELP = {
+    "plagiarism_http_request_seconds": ("histogram", "HTTP request latency by route"),
+    "plagiarism_stage_seconds": ("histogram", "Analysis pipeline stage latency"),
+    "plagiarism_operation_seconds": ("histogram", "Latency of searches, fetches, parsing, encoding and database writes"),
+    "plagiarism_job_seconds": ("histogram", "Background job latency by kind and outcome"),
+    "plagiarism_cache_requests_total": ("counter", "Cache lookups by cache and result"),
+    "plagiarism_fetch_failures_total": ("counter", "Failed searches and page fetches by reason"),
+    "plagiarism_retrieval_dropped_total": ("counter", "Searches/fetches cut off by the analysis deadline"),
+    "plagiarism_stage_timeouts_total": ("counter", "Stages that ran past their timeout"),
+    "plagiarism_progress_truncated_total": ("counter", "Progress events cut down to fit the NOTIFY limit"),
+    "plagiarism_progress_dropped_total": ("counter", "Progress events the transport failed to send"),
+}
+
+# Histograms whose observations also go to the running analysis' breakdown
+BREAKDOWN_LABELS = {
+    "plagiarism_stage_seconds": ("stages", "stage"),
+    "plagiarism_operation_seconds": ("operations", "operation"),
+}
+
+
+class Registry:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.store = "none"
+        self.directory = None
+        self.database_uri = None
+        self.flush_interval = 10
+        self.retention = 86400
+        self._counters = {}     # name -> {label string: value}
+        self._histograms = {}   # name -> {label string: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._engine = None
+        self._engine_pid = None
+        self._flusher_pid = None
+
+    def configure(self, config):
+        self.directory = config.get("METRICS_DIR")
+        self.database_uri = config.get("SQLALCHEMY_DATABASE_URI")
+        self.store = config.get("METRICS_STORE") or ("directory" if self.directory else "none")
+        self.flush_interval = config.get("METRICS_FLUSH_INTERVAL", self.flush_interval)
+        self.retention = config.get("METRICS_RETENTION", self.retention)
+        if self.store == "directory" and not self.directory:
+            self.store = "none"
+        if self.store == "directory":
+            os.makedirs(self.directory, exist_ok=True)
+
+    # ------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------
+
+    def inc(self, name, value=1, **labels):
+        key = _label_string(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        self.maybe_flush()
+
+    def observe(self, name, seconds, **labels):
+        key = _label_string(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += seconds
+            values[-1] += 1
+
+        breakdown = _breakdown.get()
+        if breakdown is not None and name in BREAKDOWN_LABELS:
+            group, label = BREAKDOWN_LABELS[name]
+            breakdown.add(group, labels.get(label), seconds)
+
+        self.maybe_flush()
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def breakdown(self):
+        """Collect a Breakdown for the code run inside (nested ones add to their parent)"""
+
+        current = Breakdown(parent=_breakdown.get())
+        token = _breakdown.set(current)
+        try:
+            yield current
+        finally:
+            _breakdown.reset(token)
+
+    def current_breakdown(self):
+        return _breakdown.get()
+
+    # ------------------------------------------------------
+    # Export
+    # ------------------------------------------------------
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": {name: dict(series) for name, series in self._counters.items()},
+                "histograms": {
+                    name: {key: list(values) for key, values in series.items()}
+                    for name, series in self._histograms.items()
+                }
+            }
+
+    def flush(self):
+        """Write this process' snapshot to the shared store"""
+
+        if self.store == "none":
+            return
+
+        self._start_flusher()
+
+        # One writer at a time: the database store replaces the process'
+        # row with a delete + insert, which two threads would interleave
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            try:
+                if self.store == "database":
+                    self._write_row(self.snapshot())
+                else:
+                    self._write_file(self.snapshot())
+            except Exception as e:
+                print(f"⚠ Metrics flush failed: {e}")
+
+    def maybe_flush(self):
+        """
+        Have the flusher thread flush() if the last one is flush_interval
+        old; idle processes call it to stay listed. Never writes on the
+        calling thread, so recording stays cheap on request threads.
+        """
+        if self.store != "none" and self._flush_due():
+            self._start_flusher()
+            self._flush_wanted.set()
+
+    def _flush_due(self):
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def _start_flusher(self):
+        """Flusher thread for this process (threads and locks don't survive a fork)"""
+
+        if self._flusher_pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flush_lock = threading.Lock()
+            self._flush_wanted = threading.Event()
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+            self._flusher_pid = os.getpid()
+
+    def _flush_loop(self):
+        wanted = self._flush_wanted
+        while True:
+            wanted.wait()
+            wanted.clear()
+            if self._flush_due():
+                self.flush()
+
+    def collect(self):
+        """This process' metrics plus every other process' last snapshot"""
+
+        snapshots = [self.snapshot()]
+        try:
+            if self.store == "database":
+                snapshots.extend(self._read_rows())
+            elif self.store == "directory":
+                snapshots.extend(self._read_files())
+        except Exception as e:
+            print(f"⚠ Metrics collect failed: {e}")
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, series in snapshot.get("counters", {}).items():
+                merged = counters.setdefault(name, {})
+                for key, value in series.items():
+                    merged[key] = merged.get(key, 0) + value
+
+            for name, series in snapshot.get("histograms", {}).items():
+                merged = histograms.setdefault(name, {})
+                for key, values in series.items():
+                    if key in merged:
+                        merged[key] = [a + b for a, b in zip(merged[key], values)]
+                    else:
+                        merged[key] = list(values)
+
+        return counters, histograms
+
+    # ------------------------------------------------------
+    # Shared stores
+    # ------------------------------------------------------
+
+    def _write_file(self, snapshot):
+        """Atomic rename, so readers never see a partial file"""
+
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+
+    def _read_files(self):
+        snapshots = []
+        own = f"{os.getpid()}.json"
+
+        if not os.path.isdir(self.directory):
+            return snapshots
+
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json") or filename == own:
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                # Left behind by a process gone for a long time
+                if time.time() - os.path.getmtime(path) > self.retention:
+                    os.remove(path)
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+        return snapshots
+
+    def _process_key(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connection(self):
+        """
+        Own engine (not the Flask-SQLAlchemy session): flushes happen on
+        any thread, in or out of a request. Recreated after a fork.
+        """
+
+        if self._engine is None or self._engine_pid != os.getpid():
+            from sqlalchemy import create_engine
+            options = {} if self.database_uri.startswith("sqlite") else {"pool_size": 1, "max_overflow": 1}
+            self._engine = create_engine(self.database_uri, pool_pre_ping=True, **options)
+            self._engine_pid = os.getpid()
+        return self._engine.begin()
+
+    def _write_row(self, snapshot):
+        from app.models import MetricsSnapshot
+
+        table = MetricsSnapshot.__table__
+        process = self._process_key()
+        with self._connection() as conn:
+            conn.execute(table.delete().where(table.c.process == process))
+            conn.execute(table.insert().values(
+                process=process, snapshot=snapshot, updated_at=datetime.utcnow()
+            ))
+
+    def _read_rows(self):
+        from app.models import MetricsSnapshot
+
+        table = MetricsSnapshot.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        with self._connection() as conn:
+            # Left behind by processes gone for a long time
+            conn.execute(table.delete().where(table.c.updated_at < cutoff))
+            rows = conn.execute(
+                table.select().where(table.c.process != self._process_key())
+            ).fetchall()
+
+        return [row.snapshot for row in rows]
+
+    def render(self):
+        """Prometheus text exposition format"""
+
+        counters, histograms = self.collect()
+        lines = []
+
+        for name in sorted(counters):
+            lines.extend(_header(name, "counter"))
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_braces(key)} {_number(value)}")
+
+        for name in sorted(histograms):
+            lines.extend(_header(name, "histogram"))
+            for key, values in sorted(histograms[name].items()):
+                for bound, count in zip(self.buckets, values):
+                    lines.append(f"{name}_bucket{_braces(key, le=_number(bound))} {count}")
+                lines.append(f"{name}_bucket{_braces(key, le='+Inf')} {values[-1]}")
+                lines.append(f"{name}_sum{_braces(key)} {_number(values[-2])}")
+                lines.append(f"{name}_count{_braces(key)} {values[-1]}")
+
+        return "\n".join(lines) + "\n"
+
+
+# ==========================================================
+# PER-ANALYSIS BREAKDOWN
+# ==========================================================
+
+
+class Breakdown:
+    """
+    Seconds and counts per stage / operation for one analysis.
+    Operations run on several threads at once, so their seconds are
+    summed over threads and can exceed the wall-clock time.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.groups = {}
+        self._lock = threading.Lock()
+
+    def add(self, group, name, seconds):
+        with self._lock:
+            entry = self.groups.setdefault(group, {}).setdefault(name, {"seconds": 0.0, "count": 0})
+            entry["seconds"] += seconds
+            entry["count"] += 1
+        if self.parent is not None:
+            self.parent.add(group, name, seconds)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                group: {
+                    name: {"seconds": round(entry["seconds"], 3), "count": entry["count"]}
+                    for name, entry in entries.items()
+                }
+                for group, entries in self.groups.items()
+            }
+
+
+_breakdown = contextvars.ContextVar("metrics_breakdown", default=None)
+
+
+# ==========================================================
+# FORMATTING
+# ==========================================================
+
+
+def _label_string(labels):
+    return ",".join(
+        f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())
+    )
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _braces(key, **extra):
+    parts = [key] if key else []
+    parts.extend(f'{name}="{value}"' for name, value in extra.items())
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _header(name, kind):
+    description = HELP.get(name, (kind, name))[1]
+    return [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Registry()
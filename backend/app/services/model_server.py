@@ -0,0 +1,215 @@
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+import numpy as np
+
+# ==========================================================
+# LOCAL MODEL SERVER
+# ==========================================================
+#
+# One process loads the SentenceTransformer and serves encode requests
+# over a Unix socket, so worker processes don't each hold a copy of the
+# model. Requests arriving close together (from any client) are merged
+# into one forward pass.
+
+
+class _Request:
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ModelServer:
+
+    def __init__(self, socket_path, load_model, max_batch=64, max_wait_ms=10,
+                 batch_size=32, authkey=None):
+        self.socket_path = socket_path
+        self.load_model = load_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_size = batch_size
+        self.authkey = authkey
+        self._requests = queue.Queue()
+
+    def serve_forever(self):
+        model = self.load_model()
+
+        # Warm up before accepting connections so clients never hit a cold model
+        model.encode(["warm up"] * self.batch_size, batch_size=self.batch_size,
+                     show_progress_bar=False)
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+
+        listener = Listener(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+        # Requests are pickled; only this user may connect
+        os.chmod(self.socket_path, 0o600)
+
+        threading.Thread(target=self._batch_loop, args=(model,), daemon=True).start()
+
+        print(f"✓ Model server listening on {self.socket_path}")
+
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"⚠ Model server accept error: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _handle(self, conn):
+        """One thread per client connection; requests are queued for batching"""
+
+        try:
+            while True:
+                texts = conn.recv()
+                request = _Request(list(texts))
+                self._requests.put(request)
+                request.done.wait()
+
+                if request.error is not None:
+                    conn.send(("error", request.error))
+                else:
+                    conn.send(("ok", request.result))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _batch_loop(self, model):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+
+            # Micro-batching: keep collecting until the batch is full or
+            # the wait window closes
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+
+            texts = [text for request in batch for text in request.texts]
+
+            try:
+                embeddings = np.asarray(model.encode(
+                    texts,
+                    batch_size=self.batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                ), dtype=np.float32)
+            except Exception as e:
+                for request in batch:
+                    request.error = str(e)
+                    request.done.set()
+                continue
+
+            offset = 0
+            for request in batch:
+                request.result = embeddings[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+
+
+# ==========================================================
+# CLIENT
+# ==========================================================
+
+
+class RemoteModel:
+    """Drop-in for the SentenceTransformer.encode calls the engine makes"""
+
+    def __init__(self, socket_path, authkey=None, connect_timeout=60):
+        self.socket_path = socket_path
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            deadline = time.monotonic() + self.connect_timeout
+            while True:
+                try:
+                    conn = Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    # Server still loading the model
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.5)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True,
+               normalize_embeddings=False, show_progress_bar=False):
+
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(texts)
+                status, payload = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Server restarted: reconnect once
+                self._local.conn = None
+                if attempt:
+                    raise
+
+        if status != "ok":
+            raise RuntimeError(f"Model server error: {payload}")
+
+        embeddings = np.asarray(payload, dtype=np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+
+        return embeddings
+
+
+def serve(socket_path, batch_size=32, max_batch=64, max_wait_ms=10, authkey=None,
+          backend="torch", onnx_dir=None):
+    """Entry point for the model server process"""
+
+    from app.services.detection_engine import load_model
+
+    ModelServer(
+        socket_path,
+        lambda: load_model(backend, onnx_dir),
+        max_batch=max_batch,
+        max_wait_ms=max_wait_ms,
+        batch_size=batch_size,
+        authkey=authkey
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    serve(
+        os.getenv("MODEL_SERVER_SOCKET", "/tmp/plagiarism-model.sock"),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", 32)),
+        max_batch=int(os.getenv("MODEL_SERVER_MAX_BATCH", 64)),
+        max_wait_ms=int(os.getenv("MODEL_SERVER_MAX_WAIT_MS", 10)),
+        authkey=os.getenv("MODEL_SERVER_AUTHKEY", "").encode() or None,
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        onnx_dir=os.getenv("ONNX_MODEL_DIR")
+    )
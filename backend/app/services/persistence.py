@@ -0,0 +1,157 @@
+import io
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from app.models import Document, PlagiarismMatch, AnalysisLog
+from app.services.metrics import metrics
+
+# ==========================================================
+# RESULT PERSISTENCE
+# ==========================================================
+#
+# An analysis result is written in one transaction: every match in one
+# bulk statement (COPY on PostgreSQL past COPY_MIN_ROWS, executemany
+# otherwise), the analysis row update and the completion log. Readers
+# never see a completed analysis with half of its matches. The log also
+# gets the analysis' metrics breakdown, when one is being collected.
+
+COPY_MIN_ROWS = 500
+
+MATCH_COLUMNS = [
+    "id", "analysis_id", "source_url", "source_title", "matched_text",
+    "original_text", "similarity_score", "match_type", "start_index",
+    "end_index", "source_start_index", "source_end_index", "created_at"
+]
+
+
+def existing_documents(document_ids):
+    """The ids of document_ids that still have a documents row"""
+
+    return {
+        document_id for (document_id,) in
+        db.session.query(Document.id).filter(Document.id.in_(list(document_ids)))
+    }
+
+
+def match_rows(analysis_id, matches):
+    """Engine match dicts -> plagiarism_matches rows"""
+
+    # Archive matches point at another document; title them by its filename
+    source_ids = {m["source_document_id"] for m in matches if m.get("source_document_id")}
+    source_titles = {
+        document_id: filename
+        for document_id, filename in (
+            db.session.query(Document.id, Document.original_filename)
+            .filter(Document.id.in_(source_ids))
+        )
+    } if source_ids else {}
+
+    now = datetime.utcnow()
+
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "analysis_id": analysis_id,
+            "source_url": match["source_url"],
+            "source_title": (
+                match.get("source_title")
+                or source_titles.get(match.get("source_document_id"))
+                or match["source_url"]
+            ),
+            "matched_text": match["matched_text"],
+            "original_text": match.get("original_text", match["matched_text"]),
+            "similarity_score": match["similarity_score"],
+            "match_type": match.get("match_type", "web_semantic"),
+            "start_index": match.get("start_index", 0),
+            "end_index": match.get("end_index", len(match["matched_text"])),
+            "source_start_index": match.get("source_start_index"),
+            "source_end_index": match.get("source_end_index"),
+            "created_at": now
+        }
+        for match in matches
+    ]
+
+
+def insert_matches(rows):
+    """Insert match rows in the session's transaction (not committed)"""
+    return insert_rows(PlagiarismMatch, rows, MATCH_COLUMNS)
+
+
+def insert_rows(model, rows, copy_columns=None):
+    """
+    Bulk insert rows (dicts with every column, ids included) in the
+    session's transaction. copy_columns enables COPY on PostgreSQL for
+    large inserts; it needs plain text/number/datetime columns.
+    """
+
+    if not rows:
+        return 0
+
+    if (copy_columns and len(rows) >= COPY_MIN_ROWS
+            and db.session.get_bind().dialect.name == "postgresql"):
+        _copy_rows(model.__table__.name, copy_columns, rows)
+    else:
+        db.session.execute(insert(model), rows)
+
+    return len(rows)
+
+
+def _copy_rows(table, columns, rows):
+    # COPY through the session's own connection, so it commits or rolls
+    # back with the rest of the result
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_copy_value(row[column]) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    connection = db.session.connection().connection
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+
+
+def _copy_value(value):
+    # Text is always quoted, so only the bare \N marker reads as NULL
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def save_result(analysis, matches, log_details, **fields):
+    """
+    Store a finished analysis in one commit: its matches, the analysis
+    row (status "completed" plus fields) and the completion log.
+    Returns the number of matches written.
+    """
+
+    with metrics.timer("plagiarism_operation_seconds", operation="db_insert"):
+        count = insert_matches(match_rows(analysis.id, matches))
+
+    for name, value in fields.items():
+        setattr(analysis, name, value)
+    analysis.status = "completed"
+    analysis.completed_at = datetime.utcnow()
+
+    details = dict(log_details, match_count=count)
+    breakdown = metrics.current_breakdown()
+    if breakdown is not None:
+        details["breakdown"] = breakdown.to_dict()
+
+    db.session.add(AnalysisLog(
+        user_id=analysis.user_id,
+        analysis_id=analysis.id,
+        action="analysis_completed",
+        details=details
+    ))
+
+    with metrics.timer("plagiarism_operation_seconds", operation="db_commit"):
+        db.session.commit()
+    return count
@@ -0,0 +1,336 @@
+import time
+import numpy as np
+from app.services.metrics import metrics
+
+# ==========================================================
+# ANALYSIS CONTEXT
+# ==========================================================
+
+
+class AnalysisContext:
+    """State passed from stage to stage during one analysis"""
+
+    def __init__(self, text, document_id=None, plan="free", settings=None, on_progress=None):
+        self.text = text
+        self.document_id = document_id
+        self.plan = plan
+        self.settings = settings or {}
+
+        self.spans = []            # (sentence, start, end)
+        self.pending = []          # span indices not yet decided
+        self.queries = []          # (search query, span indices), best first
+        self.search_budget = 0
+        self.fetch_budget = 0
+        self.reused_sentences = set()   # web results carried over; not searched
+        self.reuse_all = False
+        self.excluded_sources = set()   # archive documents not to report
+        self.sentence_urls = []    # search results per span
+        self.pages = {}            # url -> page text
+        self.sentence_embeddings = None
+        self.source_windows = []   # (url, start, end) per source window
+        self.source_embeddings = None
+        self.matches = []
+        self.ai_probability = 0.0
+        self.ai_details = None     # AIDetector result (per-sentence scores)
+        self.result = None
+
+        self.done = False
+        self.deadline = None
+        self.stage_times = {}
+        self.timed_out = []
+        self.on_progress = on_progress   # callback(event, **data), see progress.py
+        self.shared = None               # SharedWork when analyzed as part of a batch
+
+    def time_left(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def report(self, event, **data):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(event, **data)
+        except Exception as e:
+            print(f"⚠ Progress report failed: {e}")
+
+    def counter(self, name):
+        """progress callback(done, total) for one counter"""
+        return lambda done, total: self.report("progress", counter=name, done=done, total=total)
+
+    def report_matches(self, limit=10):
+        """Matches found so far: the count and the strongest few"""
+
+        if self.on_progress is None:
+            return
+
+        matches = [
+            match for match in self.matches
+            if match.get("source_document_id") not in self.excluded_sources
+        ]
+        strongest = sorted(matches, key=lambda m: m["similarity_score"], reverse=True)[:limit]
+
+        self.report("matches", count=len(matches), matches=[
+            {
+                "source_url": match.get("source_url"),
+                "source_document_id": match.get("source_document_id"),
+                "matched_text": match["matched_text"][:200],
+                "similarity_score": match["similarity_score"],
+                "match_type": match.get("match_type"),
+                "start_index": match.get("start_index"),
+                "end_index": match.get("end_index")
+            }
+            for match in strongest
+        ])
+
+
+class SharedWork:
+    """
+    Embeddings shared by the analyses of one batch: a sentence or source
+    window that occurs in several documents (or pages found by several
+    documents) is encoded once.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.vectors = {}
+
+    def encode(self, texts):
+        missing = [text for text in dict.fromkeys(texts) if text not in self.vectors]
+        if missing:
+            self.vectors.update(zip(missing, self.engine._encode(missing)))
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+# ==========================================================
+# STAGES
+# ==========================================================
+
+
+class Stage:
+    """
+    One step of the detection pipeline.
+
+    Stages read and write the AnalysisContext. A stage may set ctx.done
+    to skip the remaining stages, except those marked always_run. The
+    timeout is cooperative: it becomes ctx.deadline while the stage runs.
+    """
+
+    name = None
+    always_run = False
+
+    def __init__(self, engine, timeout=None):
+        self.engine = engine
+        self.timeout = timeout
+
+    def run(self, ctx):
+        raise NotImplementedError
+
+
+class SegmentationStage(Stage):
+    name = "segmentation"
+
+    def run(self, ctx):
+        ctx.spans = self.engine._sentence_spans(ctx.text)
+        ctx.pending = list(range(len(ctx.spans)))
+        ctx.sentence_urls = [[] for _ in ctx.spans]
+
+        if not ctx.spans:
+            ctx.done = True
+            return
+
+        # Only new or edited sentences are searched (and budgeted for)
+        changed = [i for i, span in enumerate(ctx.spans) if span[0] not in ctx.reused_sentences]
+        changed_length = (
+            len(ctx.text) if len(changed) == len(ctx.spans)
+            else sum(ctx.spans[i][2] - ctx.spans[i][1] for i in changed)
+        )
+
+        planner = self.engine.query_planner
+        ctx.search_budget, ctx.fetch_budget = planner.budgets(ctx.settings, changed_length)
+        ctx.queries = planner.plan(ctx.spans, ctx.text, ctx.search_budget, indices=changed)
+
+        ctx.report(
+            "segmented",
+            sentences=len(ctx.spans),
+            sentences_reused=len(ctx.spans) - len(changed),
+            queries=len(ctx.queries)
+        )
+        if ctx.matches:
+            ctx.report_matches()
+
+
+class RetrievalStage(Stage):
+    name = "retrieval"
+
+    def run(self, ctx):
+        queries = [query for query, _ in ctx.queries]
+        deadline = ctx.deadline or self.engine.retriever.start_deadline()
+
+        _, ctx.pages = self.engine._retrieve_sources(
+            queries,
+            deadline=deadline,
+            max_fetches=ctx.fetch_budget,
+            on_search=ctx.counter("searches"),
+            on_fetch=ctx.counter("pages")
+        )
+
+        # Queries only sample the document and copied passages tend to come
+        # from the same few sources, so every sentence is compared with
+        # every page retrieved
+        urls = list(ctx.pages)
+        ctx.sentence_urls = [urls for _ in ctx.spans]
+
+
+class LexicalStage(Stage):
+    name = "lexical"
+
+    def run(self, ctx):
+        matches, settled = self.engine._detect_lexical(
+            ctx.text, ctx.spans, ctx.pages, ctx.document_id
+        )
+        ctx.matches.extend(matches)
+        ctx.pending = [i for i in ctx.pending if i not in settled]
+        ctx.report_matches()
+
+        # Every sentence already has a verbatim source
+        if not ctx.pending:
+            ctx.done = True
+
+
+class EmbeddingStage(Stage):
+    name = "embedding"
+
+    def run(self, ctx):
+        sentences = [ctx.spans[i][0] for i in ctx.pending]
+        ctx.sentence_embeddings = self._encode(ctx, sentences, "sentence_embeddings")
+
+        # Sentences left unembedded by the deadline drop out of scoring
+        ctx.pending = ctx.pending[:len(ctx.sentence_embeddings)]
+
+        # Overlapping sentence windows from every page, encoded as one batch
+        ctx.source_windows = [
+            window
+            for url, content in ctx.pages.items()
+            for window in self.engine._source_windows(url, content)
+        ]
+        texts = [ctx.pages[url][start:end] for url, start, end in ctx.source_windows]
+        ctx.source_embeddings = self._encode(ctx, texts, "source_embeddings")
+        ctx.source_windows = ctx.source_windows[:len(ctx.source_embeddings)]
+
+    def _encode(self, ctx, texts, counter):
+        """Encode in chunks so the stage deadline can cut the work short"""
+
+        chunk = self.engine.embedding_batch_size * 4
+        parts = []
+        progress = ctx.counter(counter)
+        encode = ctx.shared.encode if ctx.shared else self.engine._encode
+
+        for start in range(0, len(texts), chunk):
+            if ctx.expired():
+                ctx.timed_out.append(self.name)
+                break
+            parts.append(encode(texts[start:start + chunk]))
+            progress(min(start + chunk, len(texts)), len(texts))
+
+        if not parts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(parts)
+
+
+class ScoringStage(Stage):
+    name = "scoring"
+
+    def run(self, ctx):
+        if ctx.sentence_embeddings is None or len(ctx.sentence_embeddings) == 0:
+            return
+
+        spans = [ctx.spans[i] for i in ctx.pending]
+
+        ctx.matches.extend(self.engine._detect_archive_matches(
+            spans, ctx.sentence_embeddings, ctx.document_id
+        ))
+        ctx.matches.extend(self.engine._score_web_matches(
+            spans,
+            [ctx.sentence_urls[i] for i in ctx.pending],
+            ctx.sentence_embeddings,
+            ctx.source_windows,
+            ctx.source_embeddings,
+            ctx.pages
+        ))
+        ctx.report_matches()
+
+
+class AIDetectionStage(Stage):
+    name = "ai_detection"
+    always_run = True
+
+    def run(self, ctx):
+        detection = self.engine._detect_ai_generated(ctx.text, ctx.spans, deadline=ctx.deadline)
+        ctx.ai_probability = detection["probability"]
+        ctx.ai_details = {
+            "sentences": detection["sentences"],
+            "features": detection["features"],
+            "lm_sentences": detection["lm_sentences"]
+        }
+
+
+class AggregationStage(Stage):
+    name = "aggregation"
+    always_run = True
+
+    def run(self, ctx):
+        ctx.result = self.engine._aggregate(ctx)
+
+
+STAGES = {
+    stage.name: stage
+    for stage in (
+        SegmentationStage,
+        RetrievalStage,
+        LexicalStage,
+        EmbeddingStage,
+        ScoringStage,
+        AIDetectionStage,
+        AggregationStage,
+    )
+}
+
+
+# ==========================================================
+# PIPELINE
+# ==========================================================
+
+
+class Pipeline:
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def run(self, ctx):
+        for stage in self.stages:
+            if ctx.done and not stage.always_run:
+                continue
+
+            start = time.monotonic()
+            ctx.deadline = start + stage.timeout if stage.timeout else None
+            ctx.report("stage", stage=stage.name, state="started")
+
+            stage.run(ctx)
+
+            elapsed = time.monotonic() - start
+            ctx.stage_times[stage.name] = round(elapsed, 3)
+            metrics.observe("plagiarism_stage_seconds", elapsed, stage=stage.name)
+            if stage.timeout and elapsed > stage.timeout and stage.name not in ctx.timed_out:
+                ctx.timed_out.append(stage.name)
+                metrics.inc("plagiarism_stage_timeouts_total", stage=stage.name)
+            ctx.report("stage", stage=stage.name, state="finished", seconds=round(elapsed, 3))
+
+        ctx.deadline = None
+        return ctx
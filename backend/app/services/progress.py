@@ -0,0 +1,397 @@
+import json
+import os
+import select
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from app.services.metrics import metrics
+
+# ==========================================================
+# ANALYSIS PROGRESS PUB-SUB
+# ==========================================================
+#
+# Workers publish progress events while an analysis runs; the web
+# processes hand them to clients (SSE stream or long-poll) from memory,
+# so waiting clients cost no database queries.
+#
+# Every process keeps a short per-analysis history and wakes its own
+# waiters. Events reach other processes through a transport:
+#
+#   postgres  LISTEN/NOTIFY on the application database, for workers
+#             and web servers on different hosts
+#   sqlite    an append-only SQLite file shared by processes on one host
+#   local     this process only (tests, single-process development)
+#
+# Event: {"id", "analysis_id", "event", "data", "time"}. Ids increase per
+# analysis (millisecond clock), so duplicates and replays are dropped and
+# clients can resume after the last id they saw. Batches publish under
+# their batch id the same way.
+#
+# A waiting client holds one of the web server's threads, so at most
+# PROGRESS_MAX_WAITERS wait at once per process (waiter_slot); beyond
+# that, long-polls answer at once with retry_after and streams close,
+# leaving the other threads to ordinary requests and health checks.
+
+CHANNEL = "analysis_progress"
+TERMINAL_EVENTS = ("completed", "failed")
+NOTIFY_MAX_BYTES = 7900   # PostgreSQL payload limit is 8000
+
+
+class ProgressBus:
+
+    def __init__(self, history=200, retention=600, max_waiters=6):
+        self.history = history
+        self.retention = retention
+        self.max_waiters = max_waiters
+        self._waiters = 0
+        self.transport = LocalTransport()
+        self._channels = {}   # analysis_id -> (deque of events, last touched)
+        self._cond = threading.Condition()
+        self._listener_pid = None
+
+    def configure(self, config, database_uri=None):
+        self.retention = config.get("PROGRESS_RETENTION", self.retention)
+        self.max_waiters = config.get("PROGRESS_MAX_WAITERS", self.max_waiters)
+        name = config.get("PROGRESS_TRANSPORT", "auto")
+        database_uri = database_uri or config.get("SQLALCHEMY_DATABASE_URI") or ""
+
+        if name == "auto":
+            if database_uri.startswith("postgres"):
+                name = "postgres"
+            elif config.get("PROGRESS_BUS_PATH"):
+                name = "sqlite"
+            else:
+                name = "local"
+
+        if name == "postgres":
+            self.transport = PostgresTransport(database_uri)
+        elif name == "sqlite":
+            self.transport = SqliteTransport(config["PROGRESS_BUS_PATH"], self.retention)
+        else:
+            self.transport = LocalTransport()
+
+    # ------------------------------------------------------
+    # Publisher side (worker)
+    # ------------------------------------------------------
+
+    def publish(self, analysis_id, event, data=None):
+        """Send one event; never raises, progress must not fail an analysis"""
+
+        message = {
+            "id": self._next_id(analysis_id),
+            "analysis_id": analysis_id,
+            "event": event,
+            "data": data or {},
+            "time": round(time.time(), 3)
+        }
+
+        self._deliver(message)
+        try:
+            self.transport.send(message)
+        except Exception as e:
+            metrics.inc("plagiarism_progress_dropped_total", event=event)
+            print(f"⚠ Progress publish failed: {e}")
+        return message
+
+    def reporter(self, analysis_id, min_interval=0.5):
+        return Reporter(self, analysis_id, min_interval)
+
+    def _next_id(self, analysis_id):
+        with self._cond:
+            events = self._channels.get(analysis_id, (None,))[0]
+            last = events[-1]["id"] if events else 0
+        return max(last + 1, int(time.time() * 1000))
+
+    # ------------------------------------------------------
+    # Subscriber side (web)
+    # ------------------------------------------------------
+
+    @contextmanager
+    def waiter_slot(self):
+        """True while one of max_waiters slots is held, False when all are taken"""
+
+        with self._cond:
+            admitted = self._waiters < self.max_waiters
+            if admitted:
+                self._waiters += 1
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                with self._cond:
+                    self._waiters -= 1
+
+    def wait(self, analysis_id, after=0, timeout=25):
+        """Events newer than `after`, waiting up to timeout for the first one"""
+
+        self._start_listener()
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                events = self._events_after(analysis_id, after)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._cond.wait(remaining)
+
+    def poll(self, analysis_id, after=0, timeout=25):
+        """wait() for long-poll responses: (events, last event id, terminal event or None)"""
+
+        events = self.wait(analysis_id, after=after, timeout=timeout)
+        final = next((e for e in events if e["event"] in TERMINAL_EVENTS), None)
+        return events, (events[-1]["id"] if events else after), final
+
+    def _events_after(self, analysis_id, after):
+        channel = self._channels.get(analysis_id)
+        if channel is None:
+            return []
+        return [event for event in channel[0] if event["id"] > after]
+
+    def _deliver(self, message):
+        with self._cond:
+            analysis_id = message["analysis_id"]
+            events, _ = self._channels.get(analysis_id, (None, None))
+            if events is None:
+                events = deque(maxlen=self.history)
+
+            # Own events come back from the transport; replays after a
+            # reconnect repeat old ones
+            if events and message["id"] <= events[-1]["id"]:
+                return
+
+            events.append(message)
+            self._channels[analysis_id] = (events, time.monotonic())
+            self._expire()
+            self._cond.notify_all()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.retention
+        stale = [key for key, (_, touched) in self._channels.items() if touched < cutoff]
+        for key in stale:
+            del self._channels[key]
+
+    def _start_listener(self):
+        # One listener thread per process, started on first use; after a
+        # fork (gunicorn --preload) the child needs its own
+        if self._listener_pid == os.getpid():
+            return
+
+        with self._cond:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+
+        if self.transport.remote:
+            threading.Thread(
+                target=self.transport.listen,
+                args=(self._deliver,),
+                name="progress-listener",
+                daemon=True
+            ).start()
+
+
+class Reporter:
+    """
+    Progress callback for one analysis (AnalysisContext.on_progress).
+    "progress" events for the same counter are rate limited; the first
+    and last of each counter always go out.
+    """
+
+    def __init__(self, bus, analysis_id, min_interval=0.5):
+        self.bus = bus
+        self.analysis_id = analysis_id
+        self.min_interval = min_interval
+        self._last_sent = {}
+
+    def __call__(self, event, **data):
+        if event == "progress":
+            now = time.monotonic()
+            key = data.get("counter")
+            first = key not in self._last_sent
+            final = data.get("done") == data.get("total")
+            if not (first or final) and now - self._last_sent[key] < self.min_interval:
+                return
+            self._last_sent[key] = now
+
+        self.bus.publish(self.analysis_id, event, data)
+
+
+# ==========================================================
+# TRANSPORTS
+# ==========================================================
+
+
+class LocalTransport:
+    remote = False
+
+    def send(self, message):
+        pass
+
+    def listen(self, deliver):
+        pass
+
+
+class SqliteTransport:
+    """Append-only event table in a file shared by processes on one host"""
+
+    remote = True
+
+    def __init__(self, path, retention=600, poll_interval=0.2):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " created_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def send(self, message):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO events (created_at, payload) VALUES (?, ?)",
+                (time.time(), json.dumps(message))
+            )
+
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute(
+                    "DELETE FROM events WHERE created_at < ?",
+                    (time.time() - self.retention,)
+                )
+
+    def listen(self, deliver):
+        # Replay what is still retained, so a process that starts
+        # listening mid-analysis has the history
+        last_row = 0
+        since = time.time() - self.retention
+
+        while True:
+            try:
+                conn = self._connect()
+                rows = conn.execute(
+                    "SELECT id, payload FROM events"
+                    " WHERE id > ? AND created_at >= ? ORDER BY id",
+                    (last_row, since)
+                ).fetchall()
+
+                for row_id, payload in rows:
+                    last_row = row_id
+                    deliver(json.loads(payload))
+            except Exception as e:
+                print(f"⚠ Progress listener error: {e}")
+
+            time.sleep(self.poll_interval)
+
+
+class PostgresTransport:
+    """LISTEN/NOTIFY on the application database"""
+
+    remote = True
+
+    def __init__(self, database_uri):
+        # psycopg2 doesn't know SQLAlchemy's driver suffix
+        self.dsn = database_uri.replace("postgresql+psycopg2://", "postgresql://", 1)
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _autocommit_connection(self):
+        import psycopg2
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def send(self, message):
+        payload = _fit_payload(message)
+
+        # A connection of our own: NOTIFY inside the worker's session
+        # transaction would only be delivered when it commits
+        with self._lock:
+            try:
+                if self._conn is None or self._conn.closed or self._pid != os.getpid():
+                    self._conn = self._autocommit_connection()
+                    self._pid = os.getpid()
+                with self._conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+            except Exception:
+                self._conn = None
+                raise
+
+    def listen(self, deliver):
+        while True:
+            try:
+                conn = self._autocommit_connection()
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        deliver(json.loads(notify.payload))
+
+            except Exception as e:
+                print(f"⚠ Progress listener error: {e}")
+                time.sleep(1)
+
+
+def _fit_payload(message):
+    """
+    JSON under the NOTIFY size limit. Partial matches are halved first;
+    if that isn't enough (a completed event carrying a breakdown or every
+    batch member), data keeps only its short scalar fields plus
+    "truncated", so the event still goes out and subscribers load the
+    full record themselves (see the progress routes).
+    """
+
+    payload = json.dumps(message)
+    matches = message["data"].get("matches")
+
+    while len(payload.encode()) > NOTIFY_MAX_BYTES and matches:
+        matches = matches[:len(matches) // 2]
+        message = dict(message, data=dict(message["data"], matches=matches))
+        payload = json.dumps(message)
+
+    if len(payload.encode()) > NOTIFY_MAX_BYTES:
+        data = {
+            key: value for key, value in message["data"].items()
+            if isinstance(value, (int, float, bool)) or (isinstance(value, str) and len(value) <= 200)
+        }
+        message = dict(message, data=dict(data, truncated=True))
+        payload = json.dumps(message)
+
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            payload = json.dumps(dict(message, data={"truncated": True}))
+
+        metrics.inc("plagiarism_progress_truncated_total", event=message["event"])
+
+    return payload
+
+
+progress_bus = ProgressBus()
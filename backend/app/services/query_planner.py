@@ -0,0 +1,165 @@
+import math
+import re
+from collections import Counter
+
+# ==========================================================
+# QUERY PLANNER
+# ==========================================================
+#
+# Web searches are the slowest and most rate-limited part of an
+# analysis, so a document is sampled rather than searched sentence by
+# sentence: sentences are ranked by how distinctive they are, adjacent
+# sentences share a query, and the number of searches and page fetches
+# grows with the square root of the document length up to a per-plan cap.
+
+COMMON_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers him his how i if in into is
+it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their theirs them then
+there these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours one two may might must
+shall however therefore thus many much well even new used use using make made like
+""".split())
+
+BOILERPLATE = re.compile(
+    r"copyright|all rights reserved|table of contents|references|bibliography|"
+    r"https?://|www\.|@\w+\.|\bpage \d+|\bfigure \d+|\btable \d+|\bchapter \d+|"
+    r"et al|retrieved from|doi:",
+    re.IGNORECASE
+)
+
+WORD = re.compile(r"[A-Za-z][A-Za-z'-]*|\d+")
+
+
+def scaled_budget(base, cap, text_length, unit_chars=5000):
+    """base at unit_chars of text, growing with sqrt(length), capped"""
+
+    scale = math.sqrt(max(text_length, unit_chars) / unit_chars)
+    return min(cap, int(math.ceil(base * scale)))
+
+
+class QueryPlanner:
+
+    def __init__(self, max_query_chars=150, min_words=6):
+        self.max_query_chars = max_query_chars
+        self.min_words = min_words
+
+    def budgets(self, settings, text_length):
+        """(searches, fetches) for one analysis under a plan's settings"""
+
+        searches = scaled_budget(
+            settings.get("searches", 5), settings.get("max_searches", 15), text_length
+        )
+        fetches = scaled_budget(
+            settings.get("fetches", 8), settings.get("max_fetches", 25), text_length
+        )
+        return searches, fetches
+
+    def score(self, spans):
+        """
+        Distinctiveness of each sentence from rare words, content words,
+        length and specifics (names, numbers); 0 for boilerplate
+        """
+
+        words = [[w.lower() for w in WORD.findall(sentence)] for sentence, _, _ in spans]
+        document_counts = Counter(w for sentence_words in words for w in set(sentence_words))
+        repeated = Counter(sentence.lower() for sentence, _, _ in spans)
+
+        scores = []
+
+        for (sentence, _, _), sentence_words in zip(spans, words):
+            content = [w for w in sentence_words if w not in COMMON_WORDS]
+
+            letters = sum(c.isalpha() for c in sentence)
+            if (len(sentence_words) < self.min_words
+                    or not content
+                    or BOILERPLATE.search(sentence)
+                    or repeated[sentence.lower()] > 1
+                    or letters < 0.6 * len(sentence)):
+                scores.append(0.0)
+                continue
+
+            # Words frequent within this document (topic words, headers)
+            # say little about where a sentence came from
+            rarity = sum(1.0 / document_counts[w] for w in content) / len(content)
+            content_ratio = len(content) / len(sentence_words)
+            length = min(len(sentence_words), 30) / 30
+            specific = 1.0 + 0.1 * min(
+                sum(1 for w in WORD.findall(sentence)[1:] if w[0].isupper() or w.isdigit()), 3
+            )
+
+            scores.append((0.5 * rarity + 0.3 * content_ratio + 0.2 * length) * specific)
+
+        return scores
+
+    def group(self, spans, text, indices):
+        """
+        Merge runs of adjacent sentences (among indices) into queries of
+        at most max_query_chars. Returns [(query, [span indices])].
+        """
+
+        groups = []
+        current = []
+
+        for i in indices:
+            _, start, end = spans[i]
+            if current:
+                first_start = spans[current[0]][1]
+                contiguous = current[-1] == i - 1
+                if contiguous and end - first_start <= self.max_query_chars:
+                    current.append(i)
+                    continue
+                groups.append(current)
+            current = [i]
+
+        if current:
+            groups.append(current)
+
+        return [
+            (" ".join(text[spans[g[0]][1]:spans[g[-1]][2]].split())[:self.max_query_chars], g)
+            for g in groups
+        ]
+
+    def plan(self, spans, text, searches, indices=None):
+        """
+        Pick up to `searches` queries, the most distinctive group in each
+        of `searches` equal slices of the document so coverage is spread
+        out, then fill any unused budget with the best remaining groups.
+        indices limits the sentences that may be searched.
+        """
+
+        if not spans or searches <= 0:
+            return []
+
+        # Scored 0: too short, boilerplate or repeated; never searched
+        scores = self.score(spans)
+        allowed = range(len(spans)) if indices is None else indices
+        candidates = [i for i in allowed if scores[i] > 0]
+        groups = [
+            (query, indices, max(scores[i] for i in indices))
+            for query, indices in self.group(spans, text, candidates)
+        ]
+
+        if len(groups) <= searches:
+            return [(query, indices) for query, indices, _ in groups]
+
+        chosen = set()
+        slice_size = len(groups) / searches
+        for s in range(searches):
+            in_slice = range(int(s * slice_size), int((s + 1) * slice_size))
+            best = max(in_slice, key=lambda g: groups[g][2], default=None)
+            if best is not None:
+                chosen.add(best)
+
+        remaining = sorted(
+            (g for g in range(len(groups)) if g not in chosen),
+            key=lambda g: groups[g][2],
+            reverse=True
+        )
+        chosen.update(remaining[:searches - len(chosen)])
+
+        # Most distinctive first, so a deadline cuts the weakest queries
+        ordered = sorted(chosen, key=lambda g: groups[g][2], reverse=True)
+        return [(groups[g][0], groups[g][1]) for g in ordered]
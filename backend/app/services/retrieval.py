@@ -0,0 +1,113 @@
+import contextvars
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.services.metrics import metrics
+
+# ==========================================================
+# CONCURRENT RETRIEVAL
+# ==========================================================
+
+
+class ConcurrentRetriever:
+    """
+    Runs blocking I/O calls (search queries, page fetches) on a bounded
+    thread pool with a per-host concurrency limit and a shared deadline.
+    """
+
+    def __init__(self, max_workers=8, per_host_limit=2, deadline=30):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.deadline = deadline
+        self._host_locks = {}
+        self._host_locks_guard = threading.Lock()
+
+    def start_deadline(self):
+        """Return the absolute monotonic deadline for one analysis"""
+        return time.monotonic() + self.deadline
+
+    def map(self, fn, items, deadline=None, host_of=None, on_done=None, name="call"):
+        """
+        Call fn(item) for every unique item concurrently.
+
+        host_of(item) names the host an item talks to (defaults to the
+        item's URL netloc). Returns {item: result}; items that fail or do
+        not finish before the deadline are left out (counted per name in
+        plagiarism_retrieval_dropped_total). on_done(done, total) is
+        called as calls finish.
+        """
+
+        items = list(dict.fromkeys(items))
+        results = {}
+
+        if not items:
+            return results
+
+        if deadline is None:
+            deadline = self.start_deadline()
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(items)),
+            thread_name_prefix="retrieval"
+        )
+
+        try:
+            # Each call runs in a copy of our context, so timings reach
+            # the analysis' metrics breakdown
+            pending = {
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._call_limited, fn, item, deadline, host_of
+                ): item
+                for item in items
+            }
+
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        result = None
+                    if result is not None:
+                        results[item] = result
+
+                if on_done:
+                    on_done(len(items) - len(pending), len(items))
+
+            if pending:
+                metrics.inc("plagiarism_retrieval_dropped_total", len(pending), kind=name)
+
+        finally:
+            # Running calls are bounded by their own request timeout;
+            # anything still queued is dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def _call_limited(self, fn, item, deadline, host_of):
+
+        if time.monotonic() >= deadline:
+            return None
+
+        host = host_of(item) if host_of else urllib.parse.urlsplit(item).netloc
+
+        with self._host_lock(host):
+            if time.monotonic() >= deadline:
+                return None
+            return fn(item)
+
+    def _host_lock(self, host):
+        with self._host_locks_guard:
+            lock = self._host_locks.get(host)
+            if lock is None:
+                lock = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_locks[host] = lock
+            return lock
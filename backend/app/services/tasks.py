@@ -0,0 +1,741 @@
+from app import db
+from app.models import User, Document, Analysis, AnalysisBatch, AnalysisJob, BatchPair, PlagiarismMatch, AnalysisLog
+from app.services import engine
+from app.utils.extraction import extract_isolated, ExtractionError
+from app.services.job_queue import queue
+from app.services.metrics import metrics
+from app.services.persistence import save_result, insert_rows
+from app.services.progress import progress_bus
+from app.utils.uploads import write_upload, clear_upload
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import update
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+
+# Tasks executed by the worker pool (worker.py) for queued jobs
+
+
+# ==========================================================
+# BACKGROUND ANALYSIS TASK
+# ==========================================================
+
+def run_analysis(app, analysis_id, document_id, user_id, final_attempt=True):
+    """
+    Background task for running plagiarism + AI analysis.
+
+    When final_attempt is False a failure puts the analysis back to
+    "pending" and re-raises so the job queue can retry it.
+    """
+
+    # Database session for this job; stage timings collected into the
+    # breakdown that save_result stores with the analysis log
+    with app.app_context(), metrics.breakdown():
+        try:
+            analysis = Analysis.query.get(analysis_id)
+            document = Document.query.get(document_id)
+
+            if not analysis or not document:
+                return
+
+            # Duplicate delivery of an already finished job
+            if analysis.status == "completed":
+                return
+
+            analysis.status = "processing"
+            db.session.commit()
+            progress_bus.publish(analysis_id, "status", {"status": "processing"})
+
+            start_time = time.time()
+
+            # ===============================
+            # Run Detection Engine
+            # ===============================
+            user = db.session.get(User, user_id)
+            plan = (user.subscription_plan if user else None) or "free"
+
+            # Same text, engine version and config analyzed recently:
+            # reuse its web matches instead of searching again
+            result_key = engine.result_key(document.extracted_text, plan)
+            config_key = engine.config_key(plan)
+            cached = _cached_analysis(result_key, analysis_id)
+            reuse = _reusable_result(cached) if cached else None
+
+            # Otherwise an earlier version of this document (a resubmission
+            # with edits) analysed the same way: only new or changed
+            # sentences are searched
+            if cached is None:
+                cached = _previous_version(app, document, analysis_id, config_key)
+                if cached:
+                    reuse = _incremental_result(cached, document.extracted_text)
+
+            result = engine.analyze_text(
+                document.extracted_text,
+                plan=plan,
+                document_id=document.id,
+                reuse=reuse,
+                on_progress=progress_bus.reporter(analysis_id)
+            )
+
+            plagiarism_score = result["plagiarism_score"]
+            ai_probability = result["ai_probability"]
+            matches = result["plagiarism_matches"]
+
+            # ===============================
+            # Save Matches, Analysis and Log (one transaction)
+            # ===============================
+            save_result(
+                analysis,
+                matches,
+                {
+                    "similarity": plagiarism_score,
+                    "ai_probability": ai_probability,
+                    "stage_times": result.get("stage_times", {}),
+                    "timed_out_stages": result.get("timed_out_stages", []),
+                    "retrieval": result.get("retrieval", {}),
+                    "reused_from": cached.id if cached else None
+                },
+                overall_similarity=plagiarism_score,
+                ai_generated_probability=ai_probability,
+                ai_details=result.get("ai_details"),
+                result_key=result_key,
+                config_key=config_key,
+                sentences_reused=result.get("sentences_reused"),
+                sentences_recomputed=result.get("sentences_recomputed"),
+                processing_time=round(time.time() - start_time, 2)
+            )
+
+            progress_bus.publish(analysis_id, "completed", {"analysis": analysis.to_dict()})
+
+        except Exception as e:
+            print(f"Analysis error: {str(e)}")
+
+            db.session.rollback()
+            analysis = Analysis.query.get(analysis_id)
+
+            if not final_attempt:
+                if analysis:
+                    analysis.status = "pending"
+                    db.session.commit()
+                progress_bus.publish(analysis_id, "status", {"status": "pending", "error": str(e)})
+                raise
+
+            _fail_analysis(analysis, user_id, e)
+
+
+def _fail_analysis(analysis, user_id, error):
+    if analysis:
+        analysis.status = "failed"
+        analysis.error_message = str(error)
+        analysis.completed_at = datetime.utcnow()
+
+        log = AnalysisLog(
+            user_id=user_id,
+            analysis_id=analysis.id,
+            action="analysis_failed",
+            details={"error": str(error)}
+        )
+
+        db.session.add(log)
+        db.session.commit()
+
+        progress_bus.publish(analysis.id, "failed", {"error": str(error)})
+
+
+def _cached_analysis(result_key, analysis_id):
+    """
+    Newest completed analysis with the same result key. Results older
+    than the web cache TTL are ignored: the web may have changed since.
+    """
+
+    cutoff = datetime.utcnow() - timedelta(seconds=engine.web_cache_ttl)
+
+    return (
+        Analysis.query
+        .filter(Analysis.result_key == result_key)
+        .filter(Analysis.status == "completed")
+        # Batch members are scored against their batch too: never reused for single analyses
+        .filter(Analysis.batch_id.is_(None))
+        .filter(Analysis.id != analysis_id)
+        .filter(Analysis.completed_at >= cutoff)
+        .order_by(Analysis.completed_at.desc())
+        .first()
+    )
+
+
+def _reusable_result(analysis):
+    """Web matches and AI score of a stored analysis, as engine match dicts"""
+
+    matches = [
+        {
+            "source_url": match.source_url,
+            "source_title": match.source_title,
+            "matched_text": match.matched_text,
+            "original_text": match.original_text,
+            "similarity_score": match.similarity_score,
+            "match_type": match.match_type,
+            "start_index": match.start_index,
+            "end_index": match.end_index,
+            "source_start_index": match.source_start_index,
+            "source_end_index": match.source_end_index
+        }
+        # Archive matches (no URL) are recomputed against today's archive
+        for match in analysis.plagiarism_matches.filter(PlagiarismMatch.source_url.isnot(None))
+    ]
+
+    return {
+        "matches": matches,
+        "ai_probability": analysis.ai_generated_probability or 0.0,
+        "ai_details": analysis.ai_details
+    }
+
+
+def _previous_version(app, document, analysis_id, config_key):
+    """
+    The user's recent completed analysis whose document shares the most
+    sentences with this one, if at least INCREMENTAL_MIN_OVERLAP of them.
+    Only single analyses run with the same engine version, plan and
+    settings (config_key) qualify, as for _cached_analysis.
+    """
+
+    cutoff = datetime.utcnow() - timedelta(seconds=engine.web_cache_ttl)
+    min_overlap = app.config.get("INCREMENTAL_MIN_OVERLAP", 0.5)
+
+    candidates = (
+        Analysis.query
+        .filter(Analysis.user_id == document.user_id)
+        .filter(Analysis.document_id != document.id)
+        .filter(Analysis.id != analysis_id)
+        .filter(Analysis.config_key == config_key)
+        .filter(Analysis.batch_id.is_(None))
+        .filter(Analysis.status == "completed")
+        .filter(Analysis.completed_at >= cutoff)
+        .order_by(Analysis.completed_at.desc())
+        .limit(app.config.get("INCREMENTAL_CANDIDATES", 10))
+        .all()
+    )
+
+    best, best_overlap = None, min_overlap
+    for candidate in candidates:
+        overlap = engine.sentence_overlap(candidate.document.extracted_text, document.extracted_text)
+        if overlap >= best_overlap:
+            best, best_overlap = candidate, overlap
+
+    return best
+
+
+def _incremental_result(previous, text):
+    stored = _reusable_result(previous)
+    matches, unchanged = engine.carry_over(
+        previous.document.extracted_text, text, stored["matches"]
+    )
+
+    # The AI score is for the whole text, so it is recomputed. The earlier
+    # version is the student's own work, not an archive source.
+    return {
+        "matches": matches,
+        "ai_probability": None,
+        "sentences": unchanged,
+        "previous_document_id": previous.document_id
+    }
+
+
+# ==========================================================
+# TEXT EXTRACTION TASK
+# ==========================================================
+
+def extract_document(app, document_id, final_attempt=True):
+    """
+    Background task extracting an uploaded file's text in a sandboxed
+    process, then marking the document ready (or failed).
+
+    Unexpected errors (database, a concurrent identical upload taking
+    the content_hash) are re-raised for a retry while attempts remain;
+    on the final attempt the document is failed instead, so it never
+    stays "extracting".
+    """
+
+    with app.app_context():
+        document = db.session.get(Document, document_id)
+
+        # Deleted meanwhile, or a duplicate delivery
+        if not document or document.status != "extracting":
+            return
+
+        try:
+            _extract_document(app, document)
+        except Exception as e:
+            print(f"Extraction error: {str(e)}")
+            db.session.rollback()
+
+            if not final_attempt:
+                raise
+
+            document = db.session.get(Document, document_id)
+            if document and document.status == "extracting":
+                _fail_extraction(document, str(e))
+
+
+def _extract_document(app, document):
+    try:
+        with _upload_file(app, document) as file_path, \
+                metrics.timer("plagiarism_operation_seconds", operation="extract"):
+            extraction = extract_isolated(
+                file_path,
+                document.file_type,
+                max_chars=app.config.get("MAX_EXTRACTED_CHARS", 200000),
+                timeout=app.config.get("EXTRACTION_TIMEOUT", 60),
+                cpu_seconds=app.config.get("EXTRACTION_CPU_SECONDS", 30),
+                memory_mb=app.config.get("EXTRACTION_MEMORY_MB", 1024)
+            )
+    except ExtractionError as e:
+        _fail_extraction(document, str(e))
+        return
+
+    text = extraction.text
+    if not text or not text.strip():
+        _fail_extraction(document, "No readable text found")
+        return
+
+    content_hash = hashlib.sha256(text.encode()).hexdigest()
+    existing = Document.query.filter(
+        Document.content_hash == content_hash,
+        Document.id != document.id
+    ).first()
+
+    # Identical submissions within a batch are what it is looking for
+    if existing and existing.user_id == document.user_id and not document.batch_id:
+        _fail_extraction(document, f"Document already uploaded ({existing.id})")
+        return
+
+    # content_hash is unique across users: another user's identical
+    # upload keeps the hash
+    document.content_hash = None if existing else content_hash
+    document.extracted_text = text
+    document.page_count = extraction.page_count
+    document.status = "ready"
+    clear_upload(document.id)
+
+    db.session.add(AnalysisLog(
+        user_id=document.user_id,
+        action="document_extracted",
+        details={
+            "document_id": document.id,
+            "page_count": extraction.page_count,
+            "truncated": extraction.truncated
+        }
+    ))
+
+    # Add to the archive indexes
+    queue.enqueue("index_document", document.user_id, document_id=document.id)
+    db.session.commit()
+
+    if document.batch_id:
+        queue_batch_if_extracted(document.batch_id)
+
+
+@contextmanager
+def _upload_file(app, document):
+    """
+    Path of the uploaded file for the sandboxed extractor: the bytes from
+    document_uploads written to local scratch space (UPLOAD_FOLDER) for
+    the duration
+    """
+
+    folder = app.config["UPLOAD_FOLDER"]
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=f".{document.file_type}", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            stored = write_upload(document.id, f)
+        if not stored:
+            raise ExtractionError("Uploaded file is no longer available")
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _fail_extraction(document, error):
+    document.status = "failed"
+    document.extraction_error = error
+    clear_upload(document.id)
+
+    db.session.add(AnalysisLog(
+        user_id=document.user_id,
+        action="document_extraction_failed",
+        details={"document_id": document.id, "error": error}
+    ))
+    db.session.commit()
+
+    if document.batch_id:
+        queue_batch_if_extracted(document.batch_id)
+
+
+# ==========================================================
+# BATCH ANALYSIS TASK
+# ==========================================================
+
+def queue_batch_if_extracted(batch_id):
+    """
+    Enqueue the batch analysis once none of its documents is still
+    extracting. The conditional update lets exactly one caller do it.
+    """
+
+    extracting = Document.query.filter_by(batch_id=batch_id, status="extracting").count()
+    if extracting:
+        return False
+
+    claimed = db.session.execute(
+        update(AnalysisBatch)
+        .where(AnalysisBatch.id == batch_id)
+        .where(AnalysisBatch.status == "extracting")
+        .values(status="queued")
+    ).rowcount
+
+    if claimed:
+        batch = db.session.get(AnalysisBatch, batch_id)
+        queue.enqueue("analysis_batch", batch.user_id, payload={"batch_id": batch_id})
+    db.session.commit()
+    return bool(claimed)
+
+
+def run_batch(app, batch_id, final_attempt=True):
+    """
+    Background task analysing every document of a batch as one unit of
+    work (engine.analyze_batch), then comparing the members pairwise.
+    Documents already completed by an earlier attempt are skipped.
+    """
+
+    with app.app_context():
+        batch = db.session.get(AnalysisBatch, batch_id)
+        if not batch or batch.status == "completed":
+            return
+
+        try:
+            batch.status = "processing"
+            db.session.commit()
+            progress_bus.publish(batch_id, "status", {"status": "processing"})
+
+            start_time = time.time()
+            user = db.session.get(User, batch.user_id)
+            plan = (user.subscription_plan if user else None) or "free"
+
+            members = (
+                db.session.query(Analysis, Document)
+                .join(Document, Analysis.document_id == Document.id)
+                .filter(Analysis.batch_id == batch_id)
+                .all()
+            )
+
+            pending = []
+            for analysis, document in members:
+                if document.status != "ready":
+                    analysis.status = "failed"
+                    analysis.error_message = document.extraction_error or "Text extraction failed"
+                    analysis.completed_at = datetime.utcnow()
+                elif analysis.status != "completed":
+                    analysis.status = "processing"
+                    pending.append((analysis, document))
+            db.session.commit()
+
+            analyses = {document.id: analysis for analysis, document in pending}
+
+            # No result_key: these results come from the batch's shared
+            # retrieval and budget, weaker than a single analysis' own, so
+            # later single analyses of the same text must not reuse them
+            def save(document_id, result):
+                analysis = analyses[document_id]
+                save_result(
+                    analysis,
+                    result["plagiarism_matches"],
+                    {
+                        "similarity": result["plagiarism_score"],
+                        "ai_probability": result["ai_probability"],
+                        "stage_times": result.get("stage_times", {}),
+                        "timed_out_stages": result.get("timed_out_stages", []),
+                        "batch_id": batch_id
+                    },
+                    overall_similarity=result["plagiarism_score"],
+                    ai_generated_probability=result["ai_probability"],
+                    ai_details=result.get("ai_details"),
+                    sentences_reused=result.get("sentences_reused"),
+                    sentences_recomputed=result.get("sentences_recomputed"),
+                    processing_time=round(sum(result.get("stage_times", {}).values()), 2)
+                )
+                db.session.execute(
+                    update(AnalysisBatch)
+                    .where(AnalysisBatch.id == batch_id)
+                    .values(analyzed_count=AnalysisBatch.analyzed_count + 1)
+                )
+                db.session.commit()
+                progress_bus.publish(analysis.id, "completed", {"analysis": analysis.to_dict()})
+
+            reporter = progress_bus.reporter(batch_id)
+            with metrics.breakdown() as breakdown:
+                shared = engine.analyze_batch(
+                    [(document.id, document.extracted_text) for _, document in pending],
+                    plan=plan,
+                    on_result=save,
+                    on_progress=reporter
+                )
+
+                # ===============================
+                # Pairwise similarity
+                # ===============================
+                ready = [(document.id, document.extracted_text)
+                         for _, document in members if document.status == "ready"]
+                with metrics.timer("plagiarism_operation_seconds", operation="batch_pairs"):
+                    pairs = engine.batch_pairs(ready, shared=shared)
+                reporter("pairs", count=len(pairs))
+
+            _store_pairs(batch_id, pairs)
+
+            batch = db.session.get(AnalysisBatch, batch_id)
+            batch.status = "completed"
+            batch.pair_count = len(pairs)
+            batch.failed_count = len(members) - len(ready)
+            batch.completed_at = datetime.utcnow()
+            batch.details = {
+                "processing_time": round(time.time() - start_time, 2),
+                "analyzed_now": len(pending),
+                "distinct_embeddings": len(shared.vectors),
+                "breakdown": breakdown.to_dict()
+            }
+            db.session.add(AnalysisLog(
+                user_id=batch.user_id,
+                action="batch_completed",
+                details={"batch_id": batch_id, "documents": len(members), "pairs": len(pairs)}
+            ))
+            db.session.commit()
+
+            progress_bus.publish(batch_id, "completed", {"batch": batch.to_dict()})
+
+        except Exception as e:
+            print(f"Batch analysis error: {str(e)}")
+            db.session.rollback()
+
+            _fail_batch(batch_id, e, final_attempt)
+
+
+def _store_pairs(batch_id, pairs):
+    """Replace the batch's pair rows (not committed)"""
+
+    BatchPair.query.filter_by(batch_id=batch_id).delete()
+    insert_rows(BatchPair, [
+        {
+            "id": str(uuid.uuid4()),
+            "batch_id": batch_id,
+            "document_a_id": pair["document_a_id"],
+            "document_b_id": pair["document_b_id"],
+            "similarity": pair["similarity"],
+            "matched_sentences": pair["matched_sentences"],
+            "details": {"aligned": pair["aligned"]}
+        }
+        for pair in pairs
+    ])
+
+
+def _fail_batch(batch_id, error, final_attempt):
+    """Back to "queued" for a retry (re-raising), or failed for good"""
+
+    batch = db.session.get(AnalysisBatch, batch_id)
+    if not final_attempt:
+        batch.status = "queued"
+        db.session.commit()
+        progress_bus.publish(batch_id, "status", {"status": "queued", "error": str(error)})
+        raise error
+
+    batch.status = "failed"
+    batch.error_message = str(error)
+    batch.completed_at = datetime.utcnow()
+    Analysis.query.filter(
+        Analysis.batch_id == batch_id,
+        Analysis.status.in_(["pending", "processing"])
+    ).update({"status": "failed", "error_message": str(error)}, synchronize_session=False)
+    db.session.add(AnalysisLog(
+        user_id=batch.user_id,
+        action="batch_failed",
+        details={"batch_id": batch_id, "error": str(error)}
+    ))
+    db.session.commit()
+
+    progress_bus.publish(batch_id, "failed", {"error": str(error)})
+
+
+# ==========================================================
+# COLLUSION CHECK TASK
+# ==========================================================
+
+def run_collusion(app, batch_id, final_attempt=True):
+    """
+    Background task comparing already uploaded documents with each other
+    (POST /api/batch/collusion): all-pairs similarity only, no web search.
+    """
+
+    with app.app_context():
+        batch = db.session.get(AnalysisBatch, batch_id)
+        if not batch or batch.status == "completed":
+            return
+
+        try:
+            batch.status = "processing"
+            db.session.commit()
+            progress_bus.publish(batch_id, "status", {"status": "processing"})
+
+            start_time = time.time()
+            document_ids = batch.details["document_ids"]
+            top_k = batch.details.get("top_k") or app.config.get("COLLUSION_TOP_K", 500)
+
+            documents = (
+                db.session.query(Document.id, Document.extracted_text)
+                .filter(Document.id.in_(document_ids), Document.status == "ready")
+                .all()
+            )
+
+            reporter = progress_bus.reporter(batch_id)
+            with metrics.timer("plagiarism_operation_seconds", operation="batch_pairs"):
+                pairs = engine.batch_pairs(
+                    [(document_id, text) for document_id, text in documents],
+                    top_k=top_k,
+                    on_progress=lambda done, total: reporter("progress", counter="blocks", done=done, total=total)
+                )
+            reporter("pairs", count=len(pairs))
+
+            _store_pairs(batch_id, pairs)
+
+            batch = db.session.get(AnalysisBatch, batch_id)
+            batch.status = "completed"
+            batch.analyzed_count = len(documents)
+            batch.failed_count = len(document_ids) - len(documents)
+            batch.pair_count = len(pairs)
+            batch.completed_at = datetime.utcnow()
+            batch.details = dict(batch.details, processing_time=round(time.time() - start_time, 2))
+            db.session.add(AnalysisLog(
+                user_id=batch.user_id,
+                action="collusion_completed",
+                details={"batch_id": batch_id, "documents": len(documents), "pairs": len(pairs)}
+            ))
+            db.session.commit()
+
+            progress_bus.publish(batch_id, "completed", {"batch": batch.to_dict()})
+
+        except Exception as e:
+            print(f"Collusion check error: {str(e)}")
+            db.session.rollback()
+            _fail_batch(batch_id, e, final_attempt)
+
+
+# ==========================================================
+# ARCHIVE INDEXING TASK
+# ==========================================================
+
+def index_document(app, document_id):
+    """
+    Background task adding a committed document to the archive indexes
+    """
+
+    with app.app_context():
+        document = db.session.get(Document, document_id)
+        if document:
+            engine.index_document(document.id, document.extracted_text)
+
+
+def remove_document(app, document_id):
+    """Background task dropping a deleted document from the archive indexes"""
+
+    with app.app_context():
+        engine.remove_document(document_id)
+
+
+def queue_archive_backfill():
+    """
+    Enqueue index_document for every extracted document missing from
+    this host's archive indexes (a new, wiped or partly written
+    ARCHIVE_INDEX_DIR), so the archive is rebuilt from the database.
+    Returns the number of jobs added.
+    """
+
+    if engine.archive_index is None and engine.fingerprint_index is None:
+        return 0
+
+    pending = {
+        document_id for (document_id,) in
+        db.session.query(AnalysisJob.document_id)
+        .filter(AnalysisJob.kind == "index_document")
+        .filter(AnalysisJob.status.in_(["queued", "running"]))
+    }
+
+    documents = (
+        db.session.query(Document.id, Document.user_id)
+        .filter(Document.status == "ready")
+        .order_by(Document.created_at)
+        .yield_per(1000)
+    )
+
+    missing = [
+        (document_id, user_id) for document_id, user_id in documents
+        if document_id not in pending and not engine.is_archived(document_id)
+    ]
+    for document_id, user_id in missing:
+        queue.enqueue("index_document", user_id, document_id=document_id)
+
+    db.session.commit()
+    return len(missing)
+
+
+# ==========================================================
+# JOB DISPATCH
+# ==========================================================
+
+def run_job(app, job, final_attempt=True):
+    """Run one claimed job, timing it; errors propagate to the queue"""
+
+    start = time.perf_counter()
+    outcome = "error"
+
+    try:
+        _dispatch(app, job, final_attempt)
+        outcome = "ok"
+    finally:
+        metrics.observe("plagiarism_job_seconds", time.perf_counter() - start, kind=job.kind, outcome=outcome)
+        metrics.flush()
+
+
+def abandon_job(job, error):
+    """
+    Fail what a job was working on once the queue gives up on it because
+    its worker kept dying (JobQueue.expire_leases)
+    """
+
+    if job.kind == "analysis":
+        analysis = db.session.get(Analysis, job.analysis_id)
+        if analysis and analysis.status != "completed":
+            _fail_analysis(analysis, job.user_id, error)
+    elif job.kind == "extract_document":
+        document = db.session.get(Document, job.document_id)
+        if document and document.status == "extracting":
+            _fail_extraction(document, error)
+    elif job.kind in ("analysis_batch", "collusion"):
+        batch = db.session.get(AnalysisBatch, job.payload["batch_id"])
+        if batch and batch.status != "completed":
+            _fail_batch(batch.id, RuntimeError(error), final_attempt=True)
+
+
+def _dispatch(app, job, final_attempt):
+    if job.kind == "analysis":
+        run_analysis(app, job.analysis_id, job.document_id, job.user_id, final_attempt)
+    elif job.kind == "extract_document":
+        extract_document(app, job.document_id, final_attempt)
+    elif job.kind == "index_document":
+        index_document(app, job.document_id)
+    elif job.kind == "remove_document":
+        remove_document(app, job.document_id)
+    elif job.kind == "analysis_batch":
+        run_batch(app, job.payload["batch_id"], final_attempt)
+    elif job.kind == "collusion":
+        run_collusion(app, job.payload["batch_id"], final_attempt)
+    else:
+        raise ValueError(f"Unknown job kind: {job.kind}")
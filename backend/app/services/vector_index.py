@@ -0,0 +1,339 @@
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+from app.utils.file_lock import FileLock
+
+try:
+    import hnswlib
+except ImportError:  # optional dependency
+    hnswlib = None
+
+# ==========================================================
+# ARCHIVE VECTOR INDEX
+# ==========================================================
+
+
+class VectorIndex:
+    """
+    Sentence-level vector index over archived documents.
+
+    Storage is append-only so every worker can share one directory:
+      vectors.f32    raw float32 rows (L2-normalised)
+      entries.jsonl  one metadata line per row
+      removed.jsonl  ids of deleted documents
+
+    vectors.f32 is memory-mapped, not read into each process: the page
+    cache holds one copy for every worker on the host, and appended rows
+    only extend the mapping. Row numbers in entries.jsonl are positions
+    in vectors.f32; a row with no metadata line (a writer that died
+    between the two appends) is never returned.
+
+    Search is an exact blocked matrix product over all rows. When
+    hnswlib is installed and the index holds at least ann_min_rows rows,
+    an HNSW graph is used instead and persisted as hnsw.bin.
+    """
+
+    def __init__(self, directory, dim, ann_min_rows=20000, block_rows=65536):
+        self.directory = directory
+        self.dim = dim
+        self.ann_min_rows = ann_min_rows
+        self.block_rows = block_rows
+
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._entries = []      # by row; None for rows without metadata
+        self._doc_codes = np.zeros(0, dtype=np.int32)   # by row; -1 without metadata
+        self._count = 0
+        self._doc_ids = []
+        self._doc_lookup = {}
+        self._removed = set()
+        self._entries_offset = 0
+        self._removed_offset = 0
+        self._ann = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._entries_path = os.path.join(directory, "entries.jsonl")
+        self._removed_path = os.path.join(directory, "removed.jsonl")
+        self._ann_path = os.path.join(directory, "hnsw.bin")
+        self._lock_path = os.path.join(directory, ".lock")
+
+    # ------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------
+
+    def add(self, document_id, vectors, entries):
+        """
+        Append sentence vectors for one document.
+        entries[i] is a dict with text/start/end for vectors[i].
+        """
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return
+
+        with self._file_lock(fcntl.LOCK_EX):
+            # Vectors first: readers only trust rows that also have a
+            # metadata line pointing at them, so a writer dying between
+            # the two appends leaves an unreferenced row, not a bad one
+            row_bytes = self.dim * 4
+            with open(self._vectors_path, "ab") as f:
+                size = f.tell()
+                if size % row_bytes:
+                    f.truncate(size - size % row_bytes)
+                first_row = size // row_bytes
+                f.write(vectors.tobytes())
+
+            lines = "".join(
+                json.dumps({"document_id": document_id, "row": first_row + i, **entry}) + "\n"
+                for i, entry in enumerate(entries)
+            )
+            with open(self._entries_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def remove(self, document_id):
+        with self._file_lock(fcntl.LOCK_EX):
+            with open(self._removed_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(document_id) + "\n")
+
+    # ------------------------------------------------------
+    # Search
+    # ------------------------------------------------------
+
+    def search(self, query_vectors, k=5, exclude_document_id=None):
+        """
+        Top-k rows for every query vector.
+        Returns one list of (score, entry) per query, best first.
+        """
+
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        self.refresh()
+
+        with self._lock:
+            if self._count == 0 or len(query_vectors) == 0:
+                return [[] for _ in range(len(query_vectors))]
+
+            excluded = set(self._removed)
+            if exclude_document_id is not None:
+                excluded.add(exclude_document_id)
+            excluded_codes = np.array(
+                [-1] + [self._doc_lookup[d] for d in excluded if d in self._doc_lookup],
+                dtype=np.int32
+            )
+
+            if self._ann is not None:
+                candidates = self._search_ann(query_vectors, k, len(excluded_codes))
+            else:
+                candidates = None
+
+            return self._rank(query_vectors, k, excluded_codes, candidates)
+
+    def document_vectors(self, document_ids):
+        """
+        Stored sentence vectors of the given documents:
+        {document_id: (entries, vectors)}. Removed or unindexed documents
+        are left out.
+        """
+
+        self.refresh()
+
+        with self._lock:
+            codes = {
+                self._doc_lookup[d]: d for d in document_ids
+                if d in self._doc_lookup and d not in self._removed
+            }
+            if not codes:
+                return {}
+
+            rows = np.flatnonzero(np.isin(self._doc_codes, list(codes)))
+            by_document = {}
+            for row in rows:
+                entry = self._entries[row]
+                # A document indexed twice (a retried job) keeps one copy
+                # of each sentence
+                by_document.setdefault(codes[int(self._doc_codes[row])], {}).setdefault(entry["start"], row)
+
+            return {
+                document_id: (
+                    [self._entries[row] for row in sentence_rows.values()],
+                    self._vectors[list(sentence_rows.values())]
+                )
+                for document_id, sentence_rows in by_document.items()
+            }
+
+    def _rank(self, query_vectors, k, excluded_codes, candidates):
+        results = []
+
+        if candidates is None:
+            scores, rows = self._search_exact(query_vectors, k, excluded_codes)
+        else:
+            # Re-score ANN candidates exactly and apply exclusions. A graph
+            # loaded from hnsw.bin can hold rows this process hasn't read
+            known = candidates < len(self._doc_codes)
+            rows = np.where(known, candidates, 0)
+            scores = np.einsum("qd,qkd->qk", query_vectors, self._vectors[rows])
+            scores[~known | np.isin(self._doc_codes[rows], excluded_codes)] = -np.inf
+
+        for q in range(len(query_vectors)):
+            order = np.argsort(-scores[q])[:k]
+            results.append([
+                (float(scores[q, i]), self._entries[rows[q, i]])
+                for i in order
+                if np.isfinite(scores[q, i])
+            ])
+
+        return results
+
+    def _search_exact(self, query_vectors, k, excluded_codes):
+        """Blocked brute-force top-k so memory stays bounded"""
+
+        n_queries = len(query_vectors)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+
+        for start in range(0, len(self._vectors), self.block_rows):
+            block = self._vectors[start:start + self.block_rows]
+            scores = query_vectors @ block.T
+
+            mask = np.isin(self._doc_codes[start:start + len(block)], excluded_codes)
+            scores[:, mask] = -np.inf
+
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+
+            best_scores = np.concatenate(
+                [best_scores, np.take_along_axis(scores, top, axis=1)], axis=1
+            )
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        return best_scores, best_rows
+
+    def _search_ann(self, query_vectors, k, n_excluded_docs):
+        # Over-fetch so exclusions and re-scoring still leave k results
+        fetch = min(self._ann.get_current_count(), k * 4 + n_excluded_docs * 8)
+        self._ann.set_ef(max(fetch, 64))
+        labels, _ = self._ann.knn_query(query_vectors, k=fetch)
+        return labels.astype(np.int64)
+
+    # ------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------
+
+    def refresh(self):
+        """Pick up rows appended by other processes since the last call"""
+
+        if not os.path.exists(self._entries_path):
+            return
+
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_SH):
+                new_entries = self._read_new_entries()
+                self._read_removed()
+
+                if not new_entries:
+                    return
+
+                # Vectors are written before their metadata lines, so every
+                # row read here is already in the file
+                rows = max(entry["row"] for entry in new_entries) + 1
+                if rows > len(self._vectors):
+                    self._vectors = np.memmap(
+                        self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)
+                    )
+
+            start = len(self._entries)
+            grow = len(self._vectors) - start
+            self._entries.extend([None] * grow)
+            self._doc_codes = np.concatenate([self._doc_codes, np.full(grow, -1, dtype=np.int32)])
+
+            for entry in new_entries:
+                doc_id = entry["document_id"]
+                if doc_id not in self._doc_lookup:
+                    self._doc_lookup[doc_id] = len(self._doc_ids)
+                    self._doc_ids.append(doc_id)
+                self._entries[entry["row"]] = entry
+                self._doc_codes[entry["row"]] = self._doc_lookup[doc_id]
+
+            self._count += len(new_entries)
+            self._update_ann(start)
+
+    def _read_new_entries(self):
+        entries = []
+
+        with open(self._entries_path, "rb") as f:
+            f.seek(self._entries_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line
+                entries.append(json.loads(line))
+                self._entries_offset += len(line)
+
+        return entries
+
+    def _read_removed(self):
+        if not os.path.exists(self._removed_path):
+            return
+
+        with open(self._removed_path, "rb") as f:
+            f.seek(self._removed_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._removed.add(json.loads(line))
+                self._removed_offset += len(line)
+
+    def _update_ann(self, start):
+        if hnswlib is None or self._count < self.ann_min_rows:
+            return
+
+        if self._ann is None:
+            self._ann = hnswlib.Index(space="ip", dim=self.dim)
+            if os.path.exists(self._ann_path):
+                try:
+                    self._ann.load_index(self._ann_path, max_elements=len(self._entries) * 2)
+                except RuntimeError:
+                    self._ann.init_index(max_elements=len(self._entries) * 2)
+            else:
+                self._ann.init_index(max_elements=len(self._entries) * 2)
+
+        # Rows the graph already holds (a persisted one can be ahead of us)
+        start = max(start, self._ann.get_current_count())
+
+        if self._ann.get_max_elements() < len(self._entries):
+            self._ann.resize_index(len(self._entries) * 2)
+
+        if start < len(self._entries):
+            self._ann.add_items(
+                self._vectors[start:], np.arange(start, len(self._entries))
+            )
+
+        # Persist occasionally so new workers don't rebuild from scratch
+        if len(self._entries) - start >= 1000 or not os.path.exists(self._ann_path):
+            try:
+                self._ann.save_index(self._ann_path)
+            except RuntimeError:
+                pass
+
+    # ------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------
+
+    def _file_lock(self, mode):
+        return FileLock(self._lock_path, mode)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, document_id):
+        """Whether the document is indexed and not removed"""
+        self.refresh()
+        with self._lock:
+            return document_id in self._doc_lookup and document_id not in self._removed
+
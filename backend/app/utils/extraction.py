@@ -0,0 +1,315 @@
+import multiprocessing
+import re
+import resource
+import signal
+import zipfile
+
+# ==========================================================
+# INCREMENTAL TEXT EXTRACTION
+# ==========================================================
+#
+# Files are read a page (PDF), paragraph (DOCX) or block (TXT) at a time
+# and extraction stops as soon as the character budget is reached, so a
+# 50MB PDF costs only the pages that fit in the stored text.
+
+TEXT_BLOCK_CHARS = 64 * 1024
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class Extraction:
+    """Result of extract_text: text, page_count, truncated"""
+
+    def __init__(self, text="", page_count=None, truncated=False):
+        self.text = text
+        self.page_count = page_count
+        self.truncated = truncated
+
+
+def extract_text(file_path, file_type, max_chars=200000):
+    """Extract at most max_chars of text; never raises"""
+
+    reader = READERS.get(file_type)
+    if reader is None:
+        return Extraction()
+
+    # Text blocks are contiguous; pages and paragraphs are separate lines
+    separator = "" if file_type == "txt" else "\n"
+
+    info = {"page_count": None}
+    parts = []
+    length = 0
+    truncated = False
+
+    try:
+        pages = reader(file_path, info)
+        try:
+            for text in pages:
+                if not text:
+                    continue
+                if parts:
+                    text = separator + text
+                if length + len(text) > max_chars:
+                    parts.append(text[:max_chars - length])
+                    truncated = True
+                    break
+                parts.append(text)
+                length += len(text)
+        finally:
+            # Closes the underlying file right away when we stop early
+            pages.close()
+    except MemoryError:
+        raise
+    except Exception:
+        pass
+
+    return Extraction("".join(parts), info["page_count"], truncated)
+
+
+# ------------------------------------------------------
+# Sandboxed extraction
+# ------------------------------------------------------
+
+def _context():
+    # Children fork from a small clean server process that has only this
+    # module (outside app.services, so not the detection engine and its
+    # thread pools) and the parsers loaded: fast to start, nothing
+    # inherited from the worker
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([
+            "app.utils.extraction", "PyPDF2", "pdfplumber", "docx", "pptx"
+        ])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _extract_child(conn, file_path, file_type, max_chars, cpu_seconds, memory_mb):
+    # The kernel kills us (SIGXCPU) past the CPU limit; allocations past
+    # the memory limit raise MemoryError
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+    try:
+        result = extract_text(file_path, file_type, max_chars=max_chars)
+        conn.send(("ok", (result.text, result.page_count, result.truncated)))
+    except MemoryError:
+        conn.send(("error", f"Extraction exceeded the {memory_mb}MB memory limit"))
+    conn.close()
+
+
+def extract_isolated(file_path, file_type, max_chars=200000, timeout=60,
+                     cpu_seconds=30, memory_mb=1024):
+    """
+    extract_text in a separate process with CPU, memory and wall-clock
+    limits, so a hostile file can't take the caller down with it.
+    Raises ExtractionError when a limit is hit.
+    """
+
+    ctx = _context()
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(
+        target=_extract_child,
+        args=(sender, file_path, file_type, max_chars, cpu_seconds, memory_mb),
+        daemon=True
+    )
+    process.start()
+    sender.close()
+
+    try:
+        if not receiver.poll(timeout):
+            raise ExtractionError(f"Extraction timed out after {timeout}s")
+        status, payload = receiver.recv()
+    except EOFError:
+        process.join(5)
+        if process.exitcode == -signal.SIGXCPU:
+            raise ExtractionError(f"Extraction exceeded the {cpu_seconds}s CPU limit")
+        raise ExtractionError(f"Extraction process died (exit code {process.exitcode})")
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join(5)
+        receiver.close()
+
+    if status != "ok":
+        raise ExtractionError(payload)
+    return Extraction(*payload)
+
+
+# ------------------------------------------------------
+# Readers: generators of text pieces; fill info["page_count"]
+# ------------------------------------------------------
+
+READERS = {}
+
+
+def register(*file_types):
+    """Register the default reader for file extensions"""
+
+    def decorator(reader):
+        for file_type in file_types:
+            READERS[file_type] = reader
+        return reader
+
+    return decorator
+
+
+@register("txt")
+def iter_txt(file_path, info):
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            block = f.read(TEXT_BLOCK_CHARS)
+            if not block:
+                break
+            yield block
+
+
+# PDF: PyPDF2 is several times faster than pdfplumber but its output is
+# sometimes unusable (CID codes, no spaces, binary noise). Such pages are
+# re-read with pdfplumber's layout analysis.
+
+def looks_garbled(text):
+    if not text:
+        return False
+
+    if "(cid:" in text or text.count("\ufffd") > 0.01 * len(text):
+        return True
+
+    readable = sum(c.isalnum() or c.isspace() or c in ".,;:!?'\"()-" for c in text)
+    if readable < 0.8 * len(text):
+        return True
+
+    # Words run together when the extractor misses spacing
+    words = text.split()
+    return len(text) > 200 and len(text) / max(len(words), 1) > 20
+
+
+def iter_pdf_pypdf2(file_path, info):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    info["page_count"] = len(reader.pages)
+
+    for page in reader.pages:
+        yield page.extract_text()
+
+
+def iter_pdf_pdfplumber(file_path, info):
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        info["page_count"] = len(pdf.pages)
+
+        for page in pdf.pages:
+            text = page.extract_text()
+            # Drop the parsed layout objects; only the text is kept
+            page.flush_cache()
+            yield text
+
+
+@register("pdf")
+def iter_pdf(file_path, info):
+    """PyPDF2 per page, pdfplumber only for pages PyPDF2 garbles"""
+
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    info["page_count"] = len(reader.pages)
+    info["fallback_pages"] = 0
+    layout = None
+
+    try:
+        for number, page in enumerate(reader.pages):
+            try:
+                text = page.extract_text()
+            except Exception:
+                text = None
+
+            if text is None or looks_garbled(text):
+                if layout is None:
+                    import pdfplumber
+                    layout = pdfplumber.open(file_path)
+                layout_page = layout.pages[number]
+                text = layout_page.extract_text()
+                layout_page.flush_cache()
+                info["fallback_pages"] += 1
+
+            yield text
+    finally:
+        if layout is not None:
+            layout.close()
+
+
+@register("docx")
+def iter_docx(file_path, info):
+    from docx import Document
+
+    info["page_count"] = _docx_page_count(file_path)
+
+    doc = Document(file_path)
+    for para in doc.paragraphs:
+        if para.text.strip():
+            yield para.text
+
+
+def _docx_page_count(file_path):
+    """Page count Word saved in docProps/app.xml, if any"""
+
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            app_xml = archive.read("docProps/app.xml").decode("utf-8", errors="ignore")
+        match = re.search(r"<Pages>(\d+)</Pages>", app_xml)
+        return int(match.group(1)) if match else None
+    except Exception:
+        return None
+
+
+@register("pptx")
+def iter_pptx(file_path, info):
+    """One piece per slide: text frames, tables and speaker notes"""
+
+    from pptx import Presentation
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+    presentation = Presentation(file_path)
+    info["page_count"] = len(presentation.slides)
+
+    for slide in presentation.slides:
+        lines = []
+
+        for shape in _iter_shapes(slide.shapes, MSO_SHAPE_TYPE.GROUP):
+            if shape.has_text_frame:
+                lines.extend(p.text for p in shape.text_frame.paragraphs)
+            if getattr(shape, "has_table", False):
+                for row in shape.table.rows:
+                    lines.append(" | ".join(cell.text for cell in row.cells))
+
+        if slide.has_notes_slide:
+            lines.append(slide.notes_slide.notes_text_frame.text)
+
+        yield "\n".join(line for line in lines if line.strip())
+
+
+def _iter_shapes(shapes, group_type):
+    # Grouped shapes nest their children
+    for shape in shapes:
+        if shape.shape_type == group_type:
+            yield from _iter_shapes(shape.shapes, group_type)
+        else:
+            yield shape
+
+
+# Alternatives per format, for benchmark_extraction.py
+BACKENDS = {
+    "pdf": {
+        "auto": iter_pdf,
+        "pypdf2": iter_pdf_pypdf2,
+        "pdfplumber": iter_pdf_pdfplumber,
+    },
+    "docx": {"python-docx": iter_docx},
+    "pptx": {"python-pptx": iter_pptx},
+    "txt": {"text": iter_txt},
+}
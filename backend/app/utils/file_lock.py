@@ -0,0 +1,20 @@
+import fcntl
+import os
+
+
+class FileLock:
+    """flock()-based lock shared between worker processes"""
+
+    def __init__(self, path, mode=fcntl.LOCK_EX):
+        self.path = path
+        self.mode = mode
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, self.mode)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
@@ -0,0 +1,72 @@
+from sqlalchemy import inspect, text
+
+# ==========================================================
+# ADDITIVE SCHEMA UPGRADES
+# ==========================================================
+
+
+def add_missing_columns(db):
+    """
+    db.create_all() creates missing tables but never alters existing
+    ones. Add any model column missing from an existing table (as a
+    nullable column, with its server default) so older databases keep
+    working after a model gains a field.
+    """
+
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+
+            for column in table.columns:
+                if column.name in present:
+                    continue
+
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} " \
+                      f"{column.type.compile(dialect=db.engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def add_missing_indexes(db):
+    """
+    Create the indexes models declare (index=True, __table_args__) that an
+    existing table lacks: add_missing_columns adds columns, not their
+    indexes, and the hash / result_key / status lookups rely on them.
+    Each index is created in its own transaction, so one that can't be
+    built (a unique index over duplicate rows) doesn't stop the others.
+    """
+
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        present = {index["name"] for index in inspector.get_indexes(table.name)}
+
+        for index in table.indexes:
+            if index.name in present:
+                continue
+
+            try:
+                with db.engine.begin() as conn:
+                    index.create(bind=conn, checkfirst=True)
+                added.append(index.name)
+            except Exception as e:
+                print(f"⚠ Could not create index {index.name}: {e}")
+
+    return added
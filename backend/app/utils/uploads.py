@@ -0,0 +1,88 @@
+import hashlib
+import itertools
+import os
+import tempfile
+from app import db
+from app.models import DocumentUpload
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def read_stream(stream, max_size, chunk_size=1024 * 1024, directory=None):
+    """
+    Read an upload stream in fixed-size chunks, hashing as it goes, into
+    a temporary file (kept in memory up to one chunk, then spilled to
+    directory). Returns (file positioned at 0, sha256, size); raises
+    FileTooLarge past max_size without reading the rest.
+    """
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=chunk_size, dir=directory)
+    size = 0
+
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLarge()
+
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+
+# ==========================================================
+# BYTES WAITING FOR EXTRACTION (document_uploads)
+# ==========================================================
+#
+# One row per chunk, written and read a chunk at a time, so neither the
+# web process nor the worker ever holds a whole upload in memory.
+
+
+def store_upload(document_id, file, chunk_size=1024 * 1024):
+    """Copy a file into document_uploads rows (not committed)"""
+
+    table = DocumentUpload.__table__
+
+    for seq in itertools.count():
+        chunk = file.read(chunk_size)
+        # An empty file still gets its (empty) row
+        if not chunk and seq:
+            break
+        db.session.execute(table.insert().values(document_id=document_id, seq=seq, data=chunk))
+
+
+def write_upload(document_id, file):
+    """Write a document's stored chunks to file; False if there are none"""
+
+    rows = (
+        db.session.query(DocumentUpload.data)
+        .filter(DocumentUpload.document_id == document_id)
+        .order_by(DocumentUpload.seq)
+        .yield_per(1)
+    )
+
+    found = False
+    for (chunk,) in rows:
+        file.write(chunk)
+        found = True
+    return found
+
+
+def clear_upload(document_id):
+    """Drop a document's stored chunks (not committed)"""
+    DocumentUpload.query.filter_by(document_id=document_id).delete(synchronize_session=False)
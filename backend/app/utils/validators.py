@@ -2,7 +2,7 @@ import re
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    allowed_extensions = {'txt', 'pdf', 'docx', 'pptx', 'doc', 'ppt'}
+    allowed_extensions = {'txt', 'pdf', 'docx', 'pptx'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 def validate_email(email):
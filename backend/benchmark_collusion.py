@@ -0,0 +1,81 @@
+"""
+Collusion Detection Benchmark
+All-pairs document similarity on synthetic sentence vectors: the old
+per-pair loop (engine.batch_pairs before collusion.py) against the
+blocked CollusionDetector, checked to give the same pairs, then the
+blocked version alone up to a large course. No model or database needed.
+
+    python benchmark_collusion.py [document counts ...]
+"""
+
+import itertools
+import sys
+import time
+import numpy as np
+from app.services.collusion import CollusionDetector
+
+DEFAULT_COUNTS = [100, 500, 1000, 2000]
+SENTENCES_PER_DOCUMENT = 40
+DIM = 384
+NAIVE_MAX_DOCUMENTS = 500
+
+
+def synthetic_course(n_documents, rng):
+    """Random documents, with every tenth one copying half of its neighbour"""
+
+    documents = []
+    for index in range(n_documents):
+        vectors = rng.standard_normal((SENTENCES_PER_DOCUMENT, DIM)).astype(np.float32)
+        if index % 10 == 1:
+            copied = documents[index - 1][2][:SENTENCES_PER_DOCUMENT // 2]
+            noise = 0.02 * rng.standard_normal(copied.shape).astype(np.float32)
+            vectors[:len(copied)] = copied + noise
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        sentences = [f"doc {index} sentence {i}" for i in range(SENTENCES_PER_DOCUMENT)]
+        documents.append((f"doc-{index}", sentences, vectors))
+    return documents
+
+
+def naive_pairs(documents, detector):
+    pairs = {}
+    for (id_a, _, a), (id_b, _, b) in itertools.combinations(documents, 2):
+        scores = a @ b.T
+        similarity = ((scores.max(axis=1) >= detector.threshold).mean()
+                      + (scores.max(axis=0) >= detector.threshold).mean()) / 2
+        if similarity >= detector.min_similarity:
+            pairs[(id_a, id_b)] = round(float(similarity), 4)
+    return pairs
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS
+    rng = np.random.default_rng(0)
+    detector = CollusionDetector()
+
+    print("=" * 60)
+    print(f"COLLUSION DETECTION ({SENTENCES_PER_DOCUMENT} sentences/document, "
+          f"block of {detector.block_rows} rows)")
+    print("=" * 60)
+
+    for count in counts:
+        documents = synthetic_course(count, rng)
+        print(f"\n{count} documents ({count * (count - 1) // 2} pairs)")
+
+        start = time.perf_counter()
+        pairs = detector.top_pairs(documents, top_k=None)
+        blocked = time.perf_counter() - start
+        print(f"  blocked  {blocked:8.2f}s  {len(pairs)} pairs")
+
+        if count <= NAIVE_MAX_DOCUMENTS:
+            start = time.perf_counter()
+            expected = naive_pairs(documents, detector)
+            naive = time.perf_counter() - start
+
+            found = {(p["document_a_id"], p["document_b_id"]): p["similarity"] for p in pairs}
+            agree = "✓ same pairs" if found == expected else "⚠ pairs differ"
+            print(f"  per-pair {naive:8.2f}s  {len(expected)} pairs  {agree}, "
+                  f"{naive / blocked:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Embedding Backend Benchmark
+Checks each embedding backend against fp32 torch on a fixed fixture set
+and reports throughput. Run before changing EMBEDDING_BACKEND:
+
+    python benchmark_embeddings.py [int8 onnx ...]
+"""
+
+import sys
+import time
+import numpy as np
+from app.services.detection_engine import MODEL_NAME
+from app.services.embedding_backends import load_backend, BACKENDS
+
+SIMILARITY_THRESHOLD = 0.75   # DetectionEngine.similarity_threshold
+MAX_SCORE_DRIFT = 0.02
+MIN_VECTOR_COSINE = 0.99
+THROUGHPUT_SENTENCES = 512
+BATCH_SIZE = 32
+
+# (submitted sentence, source sentence): copies, paraphrases and
+# unrelated pairs, so scores land on both sides of the threshold
+FIXTURE_PAIRS = [
+    ("The mitochondria is the powerhouse of the cell and produces most of its energy.",
+     "Mitochondria are known as the powerhouse of the cell because they generate most of its energy."),
+    ("Climate change is driven largely by the burning of fossil fuels.",
+     "The combustion of fossil fuels is the main driver of climate change."),
+    ("Photosynthesis converts light energy into chemical energy stored in glucose.",
+     "Plants use photosynthesis to turn sunlight into chemical energy in the form of glucose."),
+    ("The French Revolution began in 1789 and transformed European politics.",
+     "Beginning in 1789, the French Revolution reshaped the political landscape of Europe."),
+    ("Supply and demand determine the market price of a good.",
+     "The price of a product in a market is set by the interaction of supply and demand."),
+    ("Shakespeare wrote Hamlet around the year 1600.",
+     "Hamlet was written by William Shakespeare at about the turn of the seventeenth century."),
+    ("Neural networks learn by adjusting weights to minimise a loss function.",
+     "Training a neural network means tuning its weights so that the loss is as small as possible."),
+    ("Water boils at one hundred degrees Celsius at sea level.",
+     "At sea level, the boiling point of water is 100 degrees Celsius."),
+    ("The Roman Empire reached its greatest extent under Trajan.",
+     "Under Emperor Trajan the Roman Empire covered the largest territory in its history."),
+    ("DNA carries the genetic instructions used in the growth of all living organisms.",
+     "All known organisms rely on DNA to hold the genetic instructions for their development."),
+    ("The stock market fell sharply after the announcement.",
+     "Bananas are an excellent source of potassium and dietary fibre."),
+    ("Quantum computers use qubits that can exist in superposition.",
+     "The recipe calls for two cups of flour and a pinch of salt."),
+    ("The committee postponed the vote until next Tuesday.",
+     "Glaciers carve deep valleys as they move slowly downhill."),
+    ("Regular exercise improves cardiovascular health.",
+     "The novel is set in a small fishing village in Norway."),
+    ("The treaty ended decades of conflict between the two nations.",
+     "Compilers translate source code into machine instructions."),
+    ("Students must submit their essays before the deadline.",
+     "Essays have to be handed in by students ahead of the due date."),
+    ("The algorithm runs in linear time with respect to the input size.",
+     "The running time of the algorithm grows linearly with the size of the input."),
+    ("Volcanic eruptions can cool the global climate for several years.",
+     "Large eruptions of volcanoes may lower global temperatures for a few years."),
+    ("The library closes at eight o'clock on weekdays.",
+     "Interest rates were raised by the central bank to curb inflation."),
+    ("Vaccines train the immune system to recognise pathogens.",
+     "By exposing the body to harmless antigens, vaccines teach the immune system to identify pathogens."),
+]
+
+
+def encode(model, texts):
+    return np.asarray(model.encode(
+        texts,
+        batch_size=BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    ), dtype=np.float32)
+
+
+def pair_scores(model):
+    left = encode(model, [a for a, _ in FIXTURE_PAIRS])
+    right = encode(model, [b for _, b in FIXTURE_PAIRS])
+    return left, right, np.einsum("ij,ij->i", left, right)
+
+
+def throughput(model):
+    texts = [text for pair in FIXTURE_PAIRS for text in pair]
+    texts = (texts * (THROUGHPUT_SENTENCES // len(texts) + 1))[:THROUGHPUT_SENTENCES]
+
+    encode(model, texts[:BATCH_SIZE])   # warm-up
+    start = time.perf_counter()
+    encode(model, texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    backends = sys.argv[1:] or [b for b in BACKENDS if b != "torch"]
+
+    print("=" * 60)
+    print(f"EMBEDDING BACKENDS ({MODEL_NAME}, {len(FIXTURE_PAIRS)} fixture pairs)")
+    print("=" * 60)
+
+    reference = load_backend(MODEL_NAME, "torch")
+    ref_left, ref_right, ref_scores = pair_scores(reference)
+    ref_rate = throughput(reference)
+    print(f"\ntorch: {ref_rate:.1f} sentences/sec (reference)")
+
+    failed = False
+
+    for backend in backends:
+        model = load_backend(MODEL_NAME, backend)
+        left, right, scores = pair_scores(model)
+        rate = throughput(model)
+
+        vector_cosine = np.concatenate([
+            np.einsum("ij,ij->i", left, ref_left),
+            np.einsum("ij,ij->i", right, ref_right)
+        ])
+        drift = np.abs(scores - ref_scores)
+        flips = int(np.sum((scores >= SIMILARITY_THRESHOLD) != (ref_scores >= SIMILARITY_THRESHOLD)))
+
+        ok = (
+            flips == 0
+            and drift.max() <= MAX_SCORE_DRIFT
+            and vector_cosine.min() >= MIN_VECTOR_COSINE
+        )
+        failed = failed or not ok
+
+        print(f"\n{'✓ PASS' if ok else '✗ FAIL'} - {backend}")
+        print(f"  Throughput: {rate:.1f} sentences/sec ({rate / ref_rate:.2f}x torch)")
+        print(f"  Vector cosine vs torch: min {vector_cosine.min():.4f}, mean {vector_cosine.mean():.4f}")
+        print(f"  Pair score drift: max {drift.max():.4f}, mean {drift.mean():.4f}")
+        print(f"  Threshold flips at {SIMILARITY_THRESHOLD}: {flips}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Extraction Backend Benchmark
+Compares pages/sec of every extraction backend over a corpus of files:
+
+    python benchmark_extraction.py path/to/corpus [more files or dirs ...]
+"""
+
+import os
+import sys
+import time
+from app.utils.extraction import BACKENDS, looks_garbled
+
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+
+    return [f for f in files if f.rsplit(".", 1)[-1].lower() in BACKENDS]
+
+
+def run(reader, file_path):
+    info = {"page_count": None}
+    pages = 0
+    chars = 0
+    garbled = 0
+
+    start = time.perf_counter()
+    for text in reader(file_path, info):
+        pages += 1
+        chars += len(text or "")
+        garbled += looks_garbled(text)
+    elapsed = time.perf_counter() - start
+
+    return pages, chars, garbled, elapsed, info.get("fallback_pages", 0)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    files = collect(sys.argv[1:])
+    totals = {}
+
+    print("=" * 60)
+    print(f"EXTRACTION BACKENDS ({len(files)} files)")
+    print("=" * 60)
+
+    for file_path in files:
+        file_type = file_path.rsplit(".", 1)[-1].lower()
+
+        for name, reader in BACKENDS[file_type].items():
+            key = (file_type, name)
+            total = totals.setdefault(key, {"pages": 0, "chars": 0, "garbled": 0,
+                                            "seconds": 0.0, "fallback": 0, "errors": 0})
+            try:
+                pages, chars, garbled, elapsed, fallback = run(reader, file_path)
+            except Exception as e:
+                total["errors"] += 1
+                print(f"✗ {name} failed on {file_path}: {e}")
+                continue
+
+            total["pages"] += pages
+            total["chars"] += chars
+            total["garbled"] += garbled
+            total["seconds"] += elapsed
+            total["fallback"] += fallback
+
+    for (file_type, name), total in sorted(totals.items()):
+        rate = total["pages"] / total["seconds"] if total["seconds"] else 0.0
+        print(f"\n{file_type} / {name}")
+        print(f"  Pages/sec: {rate:.1f} ({total['pages']} pages in {total['seconds']:.2f}s)")
+        print(f"  Characters: {total['chars']}")
+        print(f"  Garbled pages: {total['garbled']}")
+        if total["fallback"]:
+            print(f"  Layout fallback pages: {total['fallback']}")
+        if total["errors"]:
+            print(f"  Errors: {total['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Result Persistence Benchmark
+Rows/sec for storing analyses with many matches: one ORM object per match
+with separate commits (the old run_analysis path) against
+persistence.save_result. Uses DATABASE_URL (a throwaway SQLite file if
+unset); the rows it creates are deleted afterwards.
+
+    python benchmark_persistence.py [match counts ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+from app import create_app, db
+from app.models import User, Document, Analysis, PlagiarismMatch, AnalysisLog
+from app.services.persistence import save_result
+
+DEFAULT_COUNTS = [100, 1000, 5000, 20000]
+
+
+def fake_matches(count):
+    return [
+        {
+            "source_url": f"https://example.com/source/{i % 50}",
+            "matched_text": f"Matched sentence number {i} copied from a web source. " * 2,
+            "original_text": f"Original passage {i} on the source page, a few sentences long. " * 4,
+            "similarity_score": 0.75 + (i % 25) / 100,
+            "match_type": "web_semantic",
+            "start_index": i * 120,
+            "end_index": i * 120 + 110,
+            "source_start_index": i * 10,
+            "source_end_index": i * 10 + 400
+        }
+        for i in range(count)
+    ]
+
+
+def new_analysis(user_id, document_id):
+    analysis = Analysis(
+        document_id=document_id,
+        user_id=user_id,
+        overall_similarity=0.0,
+        ai_generated_probability=0.0,
+        status="processing"
+    )
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+
+def save_per_row(analysis, matches):
+    """run_analysis before persistence.py: add() per match, three commits"""
+
+    for match in matches:
+        db.session.add(PlagiarismMatch(
+            analysis_id=analysis.id,
+            source_url=match["source_url"],
+            source_title=match["source_url"],
+            matched_text=match["matched_text"],
+            original_text=match["original_text"],
+            similarity_score=match["similarity_score"],
+            match_type=match["match_type"],
+            start_index=match["start_index"],
+            end_index=match["end_index"],
+            source_start_index=match["source_start_index"],
+            source_end_index=match["source_end_index"]
+        ))
+
+    analysis.status = "completed"
+    analysis.completed_at = datetime.utcnow()
+    db.session.commit()
+
+    db.session.add(AnalysisLog(
+        user_id=analysis.user_id,
+        analysis_id=analysis.id,
+        action="analysis_completed",
+        details={"match_count": len(matches)}
+    ))
+    db.session.commit()
+
+
+def save_bulk(analysis, matches):
+    save_result(analysis, matches, {})
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS
+    app = create_app(os.getenv("CONFIG_NAME", "development"))
+
+    with app.app_context():
+        suffix = uuid.uuid4().hex[:8]
+        user = User(email=f"bench-{suffix}@example.com", username=f"bench-{suffix}")
+        user.set_password(suffix)
+        db.session.add(user)
+        db.session.commit()
+
+        document = Document(
+            user_id=user.id,
+            filename="bench.txt",
+            original_filename="bench.txt",
+            file_path="",
+            file_type="txt",
+            file_size=0,
+            extracted_text="",
+            status="ready"
+        )
+        db.session.add(document)
+        db.session.commit()
+        user_id, document_id = user.id, document.id
+
+        print("=" * 60)
+        print(f"RESULT PERSISTENCE ({db.engine.dialect.name})")
+        print("=" * 60)
+
+        try:
+            for count in counts:
+                matches = fake_matches(count)
+                print(f"\n{count} matches")
+
+                for name, save in (("per-row ORM", save_per_row), ("bulk", save_bulk)):
+                    analysis = new_analysis(user_id, document_id)
+
+                    start = time.perf_counter()
+                    save(analysis, matches)
+                    elapsed = time.perf_counter() - start
+
+                    stored = PlagiarismMatch.query.filter_by(analysis_id=analysis.id).count()
+                    print(f"  {name:12} {count / elapsed:10.0f} rows/sec ({elapsed:.3f}s, {stored} stored)")
+                    db.session.expunge_all()
+        finally:
+            db.session.rollback()
+            AnalysisLog.query.filter_by(user_id=user_id).delete()
+            db.session.delete(db.session.get(User, user_id))
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
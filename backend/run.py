@@ -16,10 +16,13 @@ if __name__ == "__main__":
     print(f"Starting Flask server on port {port}")
     print(f"Environment: {os.getenv('CONFIG_NAME', 'production')}")
     print(f"Debug mode: {debug}")
+    print(f"Preload model: {app.config.get('PRELOAD_MODEL')}")
     print("===================================")
 
     app.run(
         host="0.0.0.0",
         port=port,
-        debug=debug
+        debug=debug,
+        # The reloader would start a second process and load the model twice
+        use_reloader=debug and not app.config.get("PRELOAD_MODEL")
     )
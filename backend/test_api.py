@@ -195,9 +195,24 @@ def test_check_analysis_status():
     headers = HEADERS.copy()
     headers['Authorization'] = f'Bearer {auth_token}'
     
-    # Give it time to process
-    print("  Waiting 5 seconds for analysis to process...")
-    time.sleep(5)
+    # Long-poll progress events until the analysis finishes
+    print("  Waiting for analysis to finish...")
+    last_event_id = 0
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        response = requests.get(
+            f"{BASE_URL}/analysis/progress/{analysis_id}",
+            params={"after": last_event_id},
+            headers=headers
+        )
+        if response.status_code != 200:
+            break
+        data = response.json()
+        for event in data.get("events", []):
+            print(f"  [{event['event']}] {event['data']}")
+        last_event_id = data.get("last_event_id", last_event_id)
+        if data.get("done"):
+            break
     
     response = requests.get(
         f"{BASE_URL}/analysis/status/{analysis_id}",
@@ -0,0 +1,106 @@
+import http.server
+import threading
+import time
+import pytest
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models import User, Document, Analysis
+
+
+@pytest.fixture
+def app():
+    app = create_app("testing")
+
+    with app.app_context():
+        # create_app disposes its connections, which drops an in-memory
+        # database: build the schema on the fresh one
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(email="student@example.com", username="student")
+    user.set_password("Password123")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def headers(user):
+    return {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+
+
+@pytest.fixture
+def analysis(user):
+    document = Document(
+        user_id=user.id,
+        filename="essay.txt",
+        original_filename="essay.txt",
+        file_path="",
+        file_type="txt",
+        file_size=100,
+        extracted_text="An essay long enough to analyse for the tests in this suite."
+    )
+    db.session.add(document)
+    db.session.flush()
+
+    analysis = Analysis(user_id=user.id, document_id=document.id, status="pending")
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+
+# ==========================================================
+# LOCAL STUB HTTP SERVER
+# ==========================================================
+
+
+class StubServer:
+    """
+    Serves routes[path] = (status, html) on 127.0.0.1, after delays[path]
+    seconds if set, and counts requests per path; unknown paths are 404s
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.delays = {}
+        self.requests = {}
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                stub.requests[path] = stub.requests.get(path, 0) + 1
+                time.sleep(stub.delays.get(path, 0))
+                status, body = stub.routes.get(path, (404, "<html>Not found</html>"))
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,87 @@
+import re
+import numpy as np
+from app.services.ai_detection import AIDetector, PRIOR
+
+HUMAN = (
+    "I honestly didn't expect the trip to go that badly. We missed the bus! "
+    "Then my phone died, which was just great. Maybe I should've checked the times first? "
+    "Anyway, we got there eventually (three hours late). It's funny now, I guess. "
+    "My brother still won't let me forget it."
+)
+
+GENERATED = (
+    "Furthermore, renewable energy offers significant benefits for modern societies. "
+    "Moreover, solar power provides a sustainable alternative to traditional fossil fuels. "
+    "Additionally, wind energy contributes substantially to reducing carbon emissions globally. "
+    "Consequently, governments are investing heavily in various clean energy initiatives. "
+    "Therefore, the transition to renewable sources remains essential for future generations. "
+    "Ultimately, these developments demonstrate the importance of environmental sustainability overall."
+)
+
+
+def _spans(text):
+    return [
+        (match.group(1), match.start(1), match.end(1))
+        for match in re.finditer(r"\s*([^.!?]+)[.!?]", text)
+    ]
+
+
+class StubScorer:
+    model_name = "stub-lm"
+
+    def __init__(self, value=-2.0, error=None):
+        self.value = value
+        self.error = error
+
+    def score(self, sentences, deadline=None):
+        if self.error:
+            raise self.error
+        return np.full(len(sentences), self.value)
+
+
+def test_stylometry_scores_generated_prose_above_personal_prose():
+    detector = AIDetector()
+
+    human = detector.detect(HUMAN, _spans(HUMAN))
+    generated = detector.detect(GENERATED, _spans(GENERATED))
+
+    assert generated["probability"] > human["probability"]
+    assert generated["features"]["generated_words"] > human["features"]["generated_words"]
+    assert human["features"]["personal_words"] > generated["features"]["personal_words"]
+    assert len(generated["sentences"]) == len(_spans(GENERATED))
+    assert generated["lm_sentences"] == 0
+
+
+def test_too_few_sentences_get_the_prior():
+    text = "Just one sentence here. And a second."
+
+    result = AIDetector().detect(text, _spans(text))
+
+    assert result["probability"] == PRIOR
+    assert all(sentence["probability"] == PRIOR for sentence in result["sentences"])
+
+
+def test_lm_scores_are_combined_with_stylometry():
+    predictable = AIDetector(scorer=StubScorer(-2.0)).detect(GENERATED, _spans(GENERATED))
+    surprising = AIDetector(scorer=StubScorer(-6.0)).detect(GENERATED, _spans(GENERATED))
+
+    assert predictable["lm_sentences"] == len(_spans(GENERATED))
+    assert predictable["features"]["log_likelihood"] == -2.0
+    assert predictable["probability"] > surprising["probability"]
+
+
+def test_failing_lm_falls_back_to_stylometry():
+    stylometry = AIDetector().detect(GENERATED, _spans(GENERATED))
+
+    result = AIDetector(scorer=StubScorer(error=ImportError("No module named 'torch'"))).detect(
+        GENERATED, _spans(GENERATED)
+    )
+
+    assert result["lm_sentences"] == 0
+    assert "log_likelihood" not in result["features"]
+    assert result["probability"] == stylometry["probability"]
+
+
+def test_config_key_names_the_lm():
+    assert AIDetector().config_key()["lm"] is None
+    assert AIDetector(scorer=StubScorer()).config_key()["lm"] == "stub-lm"
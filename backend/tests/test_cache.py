@@ -0,0 +1,80 @@
+import time
+from app.services.cache import LRUCache, DiskCache, TwoLevelCache
+from app.services.detection_engine import DetectionEngine
+
+RESULTS_PAGE = (
+    '<html><a class="result__a" href="http://source.example/a">A</a>'
+    '<a class="result__a" href="http://source.example/b">B</a></html>'
+)
+EMPTY_RESULTS_PAGE = "<html><p>No results.</p></html>"
+
+
+def _engine(stub_server):
+    engine = DetectionEngine()
+    engine.search_url = stub_server.url + "/html/?q={query}"
+    engine.request_timeout = 2
+    return engine
+
+
+def test_lru_cache_expires_and_evicts():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("c") == 3
+
+    cache.set("old", 4, expires_at=time.time() - 1)
+    assert cache.get("old") is None
+
+
+def test_disk_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "web.sqlite3")
+    first = TwoLevelCache("page", LRUCache(), DiskCache(path))
+    second = TwoLevelCache("page", LRUCache(), DiskCache(path))
+
+    first.set("http://source.example/a", "page text")
+    assert second.get("http://source.example/a") == "page text"
+
+
+def test_search_results_are_cached(stub_server):
+    stub_server.routes["/html/"] = (200, RESULTS_PAGE)
+    engine = _engine(stub_server)
+
+    assert engine._search_text("some sentence") == ["http://source.example/a", "http://source.example/b"]
+    assert engine._search_text("some sentence") == ["http://source.example/a", "http://source.example/b"]
+    assert stub_server.requests["/html/"] == 1
+
+
+def test_rate_limited_search_is_not_cached(stub_server):
+    stub_server.routes["/html/"] = (429, RESULTS_PAGE)
+    engine = _engine(stub_server)
+
+    assert engine._search_text("some sentence") == []
+
+    stub_server.routes["/html/"] = (200, RESULTS_PAGE)
+    assert engine._search_text("some sentence") == ["http://source.example/a", "http://source.example/b"]
+    assert stub_server.requests["/html/"] == 2
+
+
+def test_empty_search_is_not_cached(stub_server):
+    stub_server.routes["/html/"] = (200, EMPTY_RESULTS_PAGE)
+    engine = _engine(stub_server)
+
+    assert engine._search_text("some sentence") == []
+    assert engine.search_cache.get("some sentence") is None
+
+
+def test_error_pages_are_not_cached(stub_server):
+    stub_server.routes["/broken"] = (500, "<html>Internal Server Error</html>")
+    engine = _engine(stub_server)
+    url = stub_server.url + "/broken"
+
+    assert engine._fetch_content(url) is None
+    assert engine._fetch_content(stub_server.url + "/missing") is None
+    assert engine.page_cache.get(url) is None
+
+    stub_server.routes["/broken"] = (200, "<html><script>x()</script><p>The source text.</p></html>")
+    assert engine._fetch_content(url) == "The source text."
+    assert engine._fetch_content(url) == "The source text."
+    assert stub_server.requests["/broken"] == 2
@@ -0,0 +1,90 @@
+import itertools
+import numpy as np
+from app.services.collusion import CollusionDetector
+
+DIM = 32
+
+
+def _document(rng, index, sentences=10, copy_from=None, copied=0):
+    vectors = rng.standard_normal((sentences, DIM)).astype(np.float32)
+    texts = [f"document {index} sentence {i}" for i in range(sentences)]
+    if copy_from is not None:
+        vectors[:copied] = copy_from[2][:copied]
+        texts[:copied] = copy_from[1][:copied]
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (f"doc-{index}", texts, vectors)
+
+
+def _course(rng):
+    """doc-1 copies 6 of doc-0's sentences, doc-3 copies 3 of doc-2's"""
+    documents = [_document(rng, 0)]
+    documents.append(_document(rng, 1, copy_from=documents[0], copied=6))
+    documents.append(_document(rng, 2, sentences=12))
+    documents.append(_document(rng, 3, sentences=8, copy_from=documents[2], copied=3))
+    documents.extend(_document(rng, i) for i in range(4, 9))
+    return documents
+
+
+def _naive_shared(documents, threshold):
+    n = len(documents)
+    shared = np.zeros((n, n), dtype=np.int32)
+    for a, b in itertools.permutations(range(n), 2):
+        scores = documents[a][2] @ documents[b][2].T
+        shared[a, b] = int((scores.max(axis=1) >= threshold).sum())
+    return shared
+
+
+def test_pair_counts_match_per_pair_loop_across_blocks():
+    rng = np.random.default_rng(0)
+    documents = _course(rng)
+    sizes = np.array([len(texts) for _, texts, _ in documents])
+    embeddings = np.concatenate([vectors for _, _, vectors in documents])
+
+    # Blocks of a few documents each, so pairs span block boundaries
+    for block_rows in (15, 25, 4096):
+        detector = CollusionDetector(threshold=0.85, block_rows=block_rows)
+        shared = detector.shared_counts(embeddings, sizes)
+        np.fill_diagonal(shared, 0)  # a document against itself
+        np.testing.assert_array_equal(shared, _naive_shared(documents, 0.85))
+
+    assert shared[1, 0] == 6 and shared[0, 1] == 6
+    assert shared[3, 2] == 3 and shared[2, 3] == 3
+
+
+def test_top_pairs_ranks_copied_pairs():
+    rng = np.random.default_rng(1)
+    detector = CollusionDetector(threshold=0.85, min_similarity=0.1, block_rows=20)
+
+    pairs = detector.top_pairs(_course(rng), top_k=10)
+
+    assert [(p["document_a_id"], p["document_b_id"]) for p in pairs] == [("doc-0", "doc-1"), ("doc-2", "doc-3")]
+    assert pairs[0]["matched_sentences"] == 6
+    assert pairs[0]["similarity"] == 0.6
+    assert pairs[1]["similarity"] == round((3 / 12 + 3 / 8) / 2, 4)
+    assert len(pairs[0]["aligned"]) == 5
+    assert pairs[0]["aligned"][0]["sentence_a"] == pairs[0]["aligned"][0]["sentence_b"]
+
+
+def test_top_k_keeps_the_best_pairs():
+    rng = np.random.default_rng(2)
+    detector = CollusionDetector(threshold=0.85)
+
+    pairs = detector.top_pairs(_course(rng), top_k=1)
+
+    assert [(p["document_a_id"], p["document_b_id"]) for p in pairs] == [("doc-0", "doc-1")]
+
+
+def test_template_sentences_are_ignored():
+    rng = np.random.default_rng(3)
+    prompt = _document(rng, 99, sentences=2)
+    documents = []
+    for index in range(4):
+        _, texts, vectors = _document(rng, index)
+        documents.append((f"doc-{index}", prompt[1] + texts, np.concatenate([prompt[2], vectors])))
+
+    detector = CollusionDetector(threshold=0.85, template_share=0.5)
+
+    # Every submission repeats the assignment prompt, nothing else
+    assert detector.top_pairs(documents) == []
+    assert len(CollusionDetector(threshold=0.85, template_share=1.1, template_min_documents=10)
+               .top_pairs(documents)) == 6
@@ -0,0 +1,64 @@
+from app import db
+from app.models import Analysis, AnalysisJob, Document
+from app.services import engine
+from app.services.job_queue import queue
+from app.services.pipeline import AnalysisContext
+
+
+def test_start_analysis_stores_the_analysis_with_its_job(app, analysis, headers):
+    document = Document(
+        user_id=analysis.user_id, filename="b.txt", original_filename="b.txt", file_path="",
+        file_type="txt", file_size=10, extracted_text="Another essay to analyse."
+    )
+    db.session.add(document)
+    db.session.commit()
+
+    response = app.test_client().post("/api/analysis/start", json={"document_id": document.id}, headers=headers)
+
+    assert response.status_code == 201
+    job = AnalysisJob.query.filter_by(kind="analysis").one()
+    assert job.analysis_id == response.get_json()["analysis"]["id"]
+
+
+def test_start_analysis_stores_nothing_without_its_job(app, analysis, headers, monkeypatch):
+    document_id = analysis.document_id
+    db.session.delete(analysis)
+    db.session.commit()
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("queue unavailable")
+    monkeypatch.setattr(queue, "enqueue", broken)
+
+    response = app.test_client().post("/api/analysis/start", json={"document_id": document_id}, headers=headers)
+
+    assert response.status_code == 500
+    assert Analysis.query.count() == 0
+
+
+def test_delete_queues_archive_removal_for_the_worker(app, analysis, headers):
+    document_id = analysis.document_id
+    db.session.delete(analysis)
+    db.session.commit()
+
+    response = app.test_client().delete(f"/api/upload/document/{document_id}", headers=headers)
+
+    assert response.status_code == 200
+    assert db.session.get(Document, document_id) is None
+    job = AnalysisJob.query.one()
+    assert (job.kind, job.document_id) == ("remove_document", document_id)
+
+
+def test_archive_matches_of_deleted_documents_are_dropped(analysis):
+    text = "This sentence was copied from a classmate's earlier essay."
+    ctx = AnalysisContext(text)
+    ctx.spans = [(text, 0, len(text))]
+    ctx.matches = [
+        {"source_url": None, "source_document_id": source, "matched_text": text,
+         "similarity_score": score, "start_index": 0, "end_index": len(text)}
+        for source, score in [("deleted-document", 0.95), (analysis.document_id, 0.8)]
+    ]
+
+    result = engine._aggregate(ctx)
+
+    assert [m["source_document_id"] for m in result["plagiarism_matches"]] == [analysis.document_id]
+    assert result["plagiarism_score"] == 0.8
@@ -0,0 +1,53 @@
+from app.services.fingerprint import Fingerprinter, FingerprintIndex
+
+SOURCE = (
+    "The industrial revolution began in Britain in the eighteenth century and spread "
+    "across Europe and North America over the following decades, transforming "
+    "agriculture, manufacturing, mining and transport along the way. "
+)
+UNRELATED = (
+    "Photosynthesis converts light energy into chemical energy stored in glucose, "
+    "releasing oxygen as a by-product of splitting water molecules inside chloroplasts. "
+)
+
+
+def test_copied_passage_is_found(tmp_path):
+    index = FingerprintIndex(str(tmp_path), Fingerprinter())
+    index.add("doc-1", SOURCE * 2)
+
+    passages = index.search("Intro sentence of my essay. " + SOURCE + UNRELATED)
+
+    assert [p["document_id"] for p in passages] == ["doc-1"]
+    assert index.search(UNRELATED * 2) == []
+
+
+def test_excluded_document_is_skipped(tmp_path):
+    index = FingerprintIndex(str(tmp_path), Fingerprinter())
+    index.add("doc-1", SOURCE * 2)
+
+    assert index.search(SOURCE * 2, exclude_document_id="doc-1") == []
+
+
+def test_removed_document_stops_matching_everywhere(tmp_path):
+    writer = FingerprintIndex(str(tmp_path), Fingerprinter())
+    reader = FingerprintIndex(str(tmp_path), Fingerprinter())  # another process
+    writer.add("doc-1", SOURCE * 2)
+    writer.add("doc-2", UNRELATED * 2)
+
+    # Both load (and cache) the document before it is deleted
+    assert writer.search(SOURCE * 2)
+    assert reader.search(SOURCE * 2)
+
+    writer.remove("doc-1")
+
+    assert writer.search(SOURCE * 2) == []
+    assert reader.search(SOURCE * 2) == []
+    assert [p["document_id"] for p in reader.search(UNRELATED * 2)] == ["doc-2"]
+
+
+def test_removal_survives_a_new_index(tmp_path):
+    index = FingerprintIndex(str(tmp_path), Fingerprinter())
+    index.add("doc-1", SOURCE * 2)
+    index.remove("doc-1")
+
+    assert FingerprintIndex(str(tmp_path), Fingerprinter()).search(SOURCE * 2) == []
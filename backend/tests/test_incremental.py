@@ -0,0 +1,69 @@
+from datetime import datetime
+import pytest
+from app import db
+from app.models import Analysis, AnalysisBatch, Document
+from app.services import engine
+from app.services.tasks import _previous_version
+
+ESSAY = (
+    "The first paragraph introduces the topic of renewable energy adoption. "
+    "Solar panels have become much cheaper over the last decade in most markets. "
+    "Wind power now supplies a large share of electricity in several countries. "
+    "Storage remains the main obstacle to relying on intermittent sources alone. "
+)
+
+
+def _document(user, text, **fields):
+    document = Document(
+        user_id=user.id, filename="essay.txt", original_filename="essay.txt", file_path="",
+        file_type="txt", file_size=len(text), extracted_text=text, **fields
+    )
+    db.session.add(document)
+    db.session.flush()
+    return document
+
+
+def _completed(user, document, **fields):
+    analysis = Analysis(
+        user_id=user.id, document_id=document.id, status="completed",
+        completed_at=datetime.utcnow(), **fields
+    )
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis
+
+
+@pytest.fixture
+def resubmission(user):
+    return _document(user, ESSAY + "A new closing sentence was added for the resubmission.")
+
+
+def test_earlier_version_with_the_same_config_is_carried_over(app, user, resubmission):
+    earlier = _completed(user, _document(user, ESSAY), config_key=engine.config_key("free"))
+
+    assert _previous_version(app, resubmission, None, engine.config_key("free")) == earlier
+
+
+def test_results_from_another_config_are_not_carried_over(app, user, resubmission, monkeypatch):
+    _completed(user, _document(user, ESSAY), config_key=engine.config_key("free"))
+
+    assert _previous_version(app, resubmission, None, engine.config_key("pro")) is None
+
+    monkeypatch.setattr(engine, "similarity_threshold", 0.6)
+    assert _previous_version(app, resubmission, None, engine.config_key("free")) is None
+
+
+def test_results_without_a_config_key_are_not_carried_over(app, user, resubmission):
+    _completed(user, _document(user, ESSAY))
+
+    assert _previous_version(app, resubmission, None, engine.config_key("free")) is None
+
+
+def test_batch_members_are_not_carried_over(app, user, resubmission):
+    batch = AnalysisBatch(user_id=user.id, name="Class", status="completed")
+    db.session.add(batch)
+    db.session.flush()
+    _completed(user, _document(user, ESSAY, batch_id=batch.id),
+               batch_id=batch.id, config_key=engine.config_key("free"))
+
+    assert _previous_version(app, resubmission, None, engine.config_key("free")) is None
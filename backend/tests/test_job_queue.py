@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Analysis, AnalysisJob
+from app.services.job_queue import JobQueue
+from app.services.tasks import abandon_job
+
+
+def _queue():
+    return JobQueue(visibility_timeout=60, max_attempts=3, retry_backoff=30)
+
+
+def _enqueue(queue, analysis):
+    job = queue.enqueue("analysis", analysis.user_id, analysis_id=analysis.id, document_id=analysis.document_id)
+    db.session.commit()
+    return job
+
+
+def _expire(job):
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def _make_available(job):
+    job.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_claim_leases_job_to_one_worker(analysis):
+    queue = _queue()
+    _enqueue(queue, analysis)
+
+    job = queue.claim("worker-1")
+
+    assert job.status == "running"
+    assert job.locked_by == "worker-1"
+    assert job.attempts == 1
+    assert job.locked_until > datetime.utcnow()
+    assert queue.claim("worker-2") is None
+
+
+def test_fail_retries_with_backoff_then_gives_up(analysis):
+    queue = _queue()
+    _enqueue(queue, analysis)
+
+    job = queue.claim("worker-1")
+    assert queue.fail(job, RuntimeError("boom")) == "queued"
+    assert job.available_at > datetime.utcnow() + timedelta(seconds=25)
+    assert queue.claim("worker-1") is None
+
+    _make_available(job)
+    job = queue.claim("worker-1")
+    assert job.attempts == 2
+    assert queue.fail(job, RuntimeError("boom")) == "queued"
+    assert job.available_at > datetime.utcnow() + timedelta(seconds=55)
+
+    _make_available(job)
+    job = queue.claim("worker-1")
+    assert queue.is_final_attempt(job)
+    assert queue.fail(job, RuntimeError("boom")) == "failed"
+
+    _make_available(job)
+    assert queue.claim("worker-1") is None
+
+
+def test_expired_lease_is_requeued_with_backoff(analysis):
+    queue = _queue()
+    _enqueue(queue, analysis)
+
+    job = queue.claim("worker-1")
+    _expire(job)
+
+    # Not handed straight to another worker: the backoff applies first
+    assert queue.claim("worker-2") is None
+    db.session.refresh(job)
+    assert job.status == "queued"
+    assert job.locked_by is None
+    assert job.available_at > datetime.utcnow()
+    assert "Lease expired" in job.last_error
+
+    _make_available(job)
+    job = queue.claim("worker-2")
+    assert job.locked_by == "worker-2"
+    assert job.attempts == 2
+
+
+def test_expired_lease_at_max_attempts_fails_job_and_analysis(analysis):
+    queue = _queue()
+    _enqueue(queue, analysis)
+
+    for attempt in range(1, 4):
+        job = queue.claim("worker-1", on_abandoned=abandon_job)
+        assert job.attempts == attempt
+
+        # The worker "died": nothing reported back, the lease just expired
+        _expire(job)
+        queue.expire_leases(on_abandoned=abandon_job)
+        _make_available(job)
+
+    assert queue.claim("worker-1", on_abandoned=abandon_job) is None
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert job.status == "failed"
+    assert job.attempts == 3
+
+    analysis = db.session.get(Analysis, analysis.id)
+    assert analysis.status == "failed"
+    assert "Lease expired" in analysis.error_message
+
+
+def test_heartbeat_extends_lease(analysis):
+    queue = _queue()
+    _enqueue(queue, analysis)
+
+    job = queue.claim("worker-1")
+    job.locked_until = datetime.utcnow() + timedelta(seconds=5)
+    db.session.commit()
+
+    queue.heartbeat(job.id, "worker-1")
+    db.session.refresh(job)
+    assert job.locked_until > datetime.utcnow() + timedelta(seconds=50)
+
+    # Another worker's heartbeat doesn't touch the lease
+    job.locked_until = datetime.utcnow() + timedelta(seconds=5)
+    db.session.commit()
+    queue.heartbeat(job.id, "worker-2")
+    db.session.refresh(job)
+    assert job.locked_until < datetime.utcnow() + timedelta(seconds=10)
@@ -0,0 +1,74 @@
+import threading
+import time
+from sqlalchemy import create_engine
+from app.models import MetricsSnapshot
+from app.services.metrics import Registry
+
+
+def _registry(tmp_path, store):
+    registry = Registry()
+    registry.configure({
+        "METRICS_STORE": store,
+        "METRICS_DIR": str(tmp_path / "metrics"),
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'metrics.db'}",
+        "METRICS_FLUSH_INTERVAL": 0,
+    })
+    return registry
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_recording_flushes_on_the_background_thread(tmp_path, monkeypatch):
+    registry = _registry(tmp_path, "directory")
+    writers = []
+    monkeypatch.setattr(registry, "_write_file", lambda snapshot: writers.append(threading.current_thread().name))
+
+    registry.inc("plagiarism_cache_requests_total", cache="web", result="hit")
+
+    assert _wait_for(lambda: writers)
+    assert set(writers) == {"metrics-flush"}
+
+
+def test_concurrent_flushes_write_one_at_a_time(tmp_path, monkeypatch):
+    registry = _registry(tmp_path, "directory")
+    active, overlaps, writes = [0], [], []
+
+    def slow_write(snapshot):
+        active[0] += 1
+        overlaps.append(active[0])
+        time.sleep(0.01)
+        writes.append(snapshot)
+        active[0] -= 1
+
+    monkeypatch.setattr(registry, "_write_file", slow_write)
+
+    threads = [threading.Thread(target=registry.flush) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(writes) >= 8
+    assert max(overlaps) == 1
+
+
+def test_database_store_keeps_one_row_per_process(tmp_path):
+    registry = _registry(tmp_path, "database")
+    MetricsSnapshot.__table__.create(create_engine(registry.database_uri))
+    registry.observe("plagiarism_stage_seconds", 0.2, stage="encode")
+
+    threads = [threading.Thread(target=registry.flush) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with registry._connection() as conn:
+        rows = conn.execute(MetricsSnapshot.__table__.select()).fetchall()
+    assert len(rows) == 1
+    assert rows[0].snapshot["histograms"]["plagiarism_stage_seconds"]['stage="encode"'][-1] == 1
@@ -0,0 +1,101 @@
+import csv
+import io
+from datetime import datetime
+from app import db
+from app.models import AnalysisLog, PlagiarismMatch
+from app.services import persistence
+from app.services.persistence import MATCH_COLUMNS, _copy_rows, _copy_value, match_rows, save_result
+
+TRICKY_TEXT = 'He said "copy, paste",\nthen left \\N behind'
+
+
+class CopyCursor:
+    """Records what _copy_rows sends to psycopg2's copy_expert"""
+
+    def __init__(self):
+        self.sql = None
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def copy_expert(self, sql, buffer):
+        self.sql = sql
+        self.data = buffer.read()
+
+
+def _copy(monkeypatch, rows, columns):
+    cursor = CopyCursor()
+
+    class Connection:
+        connection = type("DBAPIConnection", (), {"cursor": lambda self: cursor})()
+
+    monkeypatch.setattr(persistence.db.session, "connection", lambda: Connection())
+    _copy_rows("plagiarism_matches", columns, rows)
+    return cursor
+
+
+def test_copy_value_encodes_null_text_numbers_and_datetimes():
+    assert _copy_value(None) == "\\N"
+    assert _copy_value("\\N") == '"\\N"'
+    assert _copy_value('say "hi"') == '"say ""hi"""'
+    assert _copy_value(0.75) == "0.75"
+    assert _copy_value(12) == "12"
+    assert _copy_value(datetime(2024, 5, 1, 9, 30)) == '"2024-05-01T09:30:00"'
+
+
+def test_copy_rows_round_trip_through_csv(monkeypatch):
+    rows = [
+        {"id": "a", "source_url": None, "matched_text": TRICKY_TEXT, "similarity_score": 0.5},
+        {"id": "b", "source_url": "https://example.com/x,y", "matched_text": "", "similarity_score": 1},
+    ]
+    columns = ["id", "source_url", "matched_text", "similarity_score"]
+
+    cursor = _copy(monkeypatch, rows, columns)
+
+    assert cursor.sql == (
+        "COPY plagiarism_matches (id, source_url, matched_text, similarity_score) "
+        "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+    parsed = list(csv.reader(io.StringIO(cursor.data)))
+    assert parsed == [
+        ["a", "\\N", TRICKY_TEXT, "0.5"],
+        ["b", "https://example.com/x,y", "", "1"],
+    ]
+    # Only the unquoted marker is NULL: quoted text that reads \N is not
+    assert cursor.data.startswith('"a",\\N,"')
+
+
+def test_save_result_round_trips_matches_through_the_orm(app, analysis, monkeypatch):
+    # Above the COPY threshold: SQLite still takes the executemany path
+    monkeypatch.setattr(persistence, "COPY_MIN_ROWS", 2)
+    matches = [
+        {"source_url": None, "source_title": "Archive", "matched_text": TRICKY_TEXT,
+         "similarity_score": 0.91, "match_type": "archive", "start_index": 3, "end_index": 40},
+        {"source_url": "https://example.com/a", "matched_text": "plain text", "similarity_score": 0.6},
+    ]
+
+    count = save_result(analysis, matches, {"mode": "full"}, overall_similarity=42.0)
+
+    assert count == 2
+    db.session.expire_all()
+    stored = {m.matched_text: m for m in PlagiarismMatch.query.filter_by(analysis_id=analysis.id)}
+    assert stored[TRICKY_TEXT].source_url is None
+    assert stored[TRICKY_TEXT].source_title == "Archive"
+    assert stored[TRICKY_TEXT].start_index == 3
+    assert stored["plain text"].source_title == "https://example.com/a"
+    assert stored["plain text"].match_type == "web_semantic"
+    assert analysis.status == "completed"
+    assert analysis.overall_similarity == 42.0
+
+    log = AnalysisLog.query.filter_by(analysis_id=analysis.id, action="analysis_completed").one()
+    assert log.details["match_count"] == 2
+
+
+def test_match_rows_cover_every_copy_column(app, analysis):
+    rows = match_rows(analysis.id, [{"source_url": "u", "matched_text": "t", "similarity_score": 1}])
+
+    assert sorted(rows[0]) == sorted(MATCH_COLUMNS)
@@ -0,0 +1,56 @@
+import json
+import threading
+from app.services.progress import ProgressBus, NOTIFY_MAX_BYTES, _fit_payload
+
+
+def test_poll_returns_events_after_id_and_terminal_event():
+    bus = ProgressBus()
+    first = bus.publish("analysis-1", "stage", {"stage": "retrieval"})
+    bus.publish("analysis-1", "completed", {"analysis": {"id": "analysis-1"}})
+
+    events, last_id, final = bus.poll("analysis-1", after=first["id"], timeout=0)
+
+    assert [e["event"] for e in events] == ["completed"]
+    assert last_id == events[-1]["id"]
+    assert final["data"]["analysis"]["id"] == "analysis-1"
+
+
+def test_wait_wakes_on_publish():
+    bus = ProgressBus()
+    threading.Timer(0.1, bus.publish, args=("analysis-1", "stage", {"stage": "lexical"})).start()
+
+    events = bus.wait("analysis-1", timeout=5)
+
+    assert [e["data"]["stage"] for e in events] == ["lexical"]
+
+
+def test_waiter_slots_are_capped():
+    bus = ProgressBus(max_waiters=1)
+
+    with bus.waiter_slot() as first:
+        with bus.waiter_slot() as second:
+            assert first and not second
+    with bus.waiter_slot() as again:
+        assert again
+
+
+def test_oversized_payload_is_cut_to_fit():
+    message = {
+        "id": 1, "analysis_id": "batch-1", "event": "completed", "time": 0.0,
+        "data": {"status": "completed", "count": 3, "batch": {"details": {"breakdown": "x" * 20000}}}
+    }
+
+    payload = _fit_payload(message)
+
+    assert len(payload.encode()) <= NOTIFY_MAX_BYTES
+    assert json.loads(payload)["data"] == {"status": "completed", "count": 3, "truncated": True}
+
+
+def test_partial_matches_are_trimmed_first():
+    matches = [{"matched_text": "y" * 200}] * 100
+    message = {"id": 1, "analysis_id": "a", "event": "matches", "time": 0.0, "data": {"matches": matches}}
+
+    data = json.loads(_fit_payload(message))["data"]
+
+    assert 0 < len(data["matches"]) < 100
+    assert "truncated" not in data
@@ -0,0 +1,101 @@
+import random
+import string
+from app.services.detection_engine import DetectionEngine, DEFAULT_PLANS
+from app.services.pipeline import AnalysisContext, SegmentationStage, RetrievalStage
+from app.services.query_planner import QueryPlanner
+
+
+def _document(sentences, seed=0):
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(2000)]
+    return " ".join(
+        " ".join(rng.choice(words) for _ in range(12)).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def _spans(text):
+    return DetectionEngine()._sentence_spans(text)
+
+
+def test_budgets_grow_with_length_up_to_the_plan_cap():
+    planner = QueryPlanner()
+    free, pro = DEFAULT_PLANS["free"], DEFAULT_PLANS["pro"]
+
+    assert planner.budgets(free, 1000) == (5, 8)
+    assert planner.budgets(free, 5000) == (5, 8)
+    assert planner.budgets(free, 20000) == (10, 16)
+    assert planner.budgets(free, 10 ** 7) == (15, 25)
+    assert planner.budgets(pro, 20000) == (20, 32)
+    assert planner.budgets(pro, 10 ** 7) == (60, 100)
+
+
+def test_plan_stays_within_the_search_budget_and_spreads_queries():
+    text = _document(60)
+    spans = _spans(text)
+
+    queries = QueryPlanner().plan(spans, text, 6)
+
+    assert len(queries) == 6
+    assert all(len(query) <= 150 for query, _ in queries)
+    planned = sorted(i for _, indices in queries for i in indices)
+    # One query from each sixth of the document
+    assert {i * 6 // len(spans) for i in planned} == set(range(6))
+
+
+def test_repeated_and_boilerplate_sentences_are_never_queried():
+    repeated = "The mitochondria is the powerhouse of every living cell today."
+    text = " ".join([repeated, _document(3), repeated, "Copyright 2024 Example Press, all rights reserved today."])
+    spans = _spans(text)
+
+    queries = QueryPlanner().plan(spans, text, 10)
+    planned = [spans[i][0] for _, indices in queries for i in indices]
+
+    assert len(queries) == len({query for query, _ in queries})
+    assert repeated.rstrip(".") not in planned
+    assert not any("Copyright" in sentence for sentence in planned)
+    assert len(planned) == 3
+
+
+def test_only_allowed_sentences_are_queried():
+    text = _document(20)
+    spans = _spans(text)
+
+    queries = QueryPlanner().plan(spans, text, 20, indices=[3, 4, 11])
+
+    assert sorted(i for _, indices in queries for i in indices) == [3, 4, 11]
+
+
+def _retrieve(plan, text):
+    engine = DetectionEngine()
+    searches, fetches = [], []
+
+    def search(query):
+        searches.append(query)
+        return [f"http://source.example/{len(searches)}/{i}" for i in range(4)]
+
+    def fetch(url):
+        fetches.append(url)
+        return "Page text."
+
+    engine._search_text = search
+    engine._fetch_content = fetch
+
+    ctx = AnalysisContext(text, plan=plan, settings=DEFAULT_PLANS[plan])
+    SegmentationStage(engine).run(ctx)
+    RetrievalStage(engine).run(ctx)
+    return ctx, searches, fetches
+
+
+def test_retrieval_enforces_each_plans_budgets():
+    text = _document(1000)
+
+    free, free_searches, free_fetches = _retrieve("free", text)
+    pro, pro_searches, pro_fetches = _retrieve("pro", text)
+
+    assert (free.search_budget, free.fetch_budget) == (15, 25)
+    assert len(free_searches) == free.search_budget
+    assert len(free_fetches) == free.fetch_budget
+    assert len(pro_searches) == pro.search_budget > free.search_budget
+    assert len(pro_fetches) == pro.fetch_budget > free.fetch_budget
+    assert len(set(free_searches)) == len(free_searches)
@@ -0,0 +1,53 @@
+import time
+from app.services.detection_engine import DetectionEngine
+from app.services.retrieval import ConcurrentRetriever
+
+
+def _pages(stub_server, count, delay):
+    urls = []
+    for i in range(count):
+        path = f"/page-{i}"
+        stub_server.routes[path] = (200, f"<html><p>Source page {i}.</p></html>")
+        stub_server.delays[path] = delay
+        urls.append(stub_server.url + path)
+    return urls
+
+
+def test_fetches_run_concurrently(stub_server):
+    engine = DetectionEngine()
+    engine.retriever = ConcurrentRetriever(max_workers=8, per_host_limit=8)
+    urls = _pages(stub_server, 6, delay=0.3)
+
+    start = time.monotonic()
+    pages = engine.retriever.map(engine._fetch_content, urls)
+    elapsed = time.monotonic() - start
+
+    assert pages == {url: f"Source page {i}." for i, url in enumerate(urls)}
+    assert elapsed < 6 * 0.3 / 2
+
+
+def test_per_host_limit_serialises_one_host(stub_server):
+    engine = DetectionEngine()
+    engine.retriever = ConcurrentRetriever(max_workers=8, per_host_limit=1)
+    urls = _pages(stub_server, 4, delay=0.2)
+
+    start = time.monotonic()
+    pages = engine.retriever.map(engine._fetch_content, urls)
+
+    assert len(pages) == 4
+    assert time.monotonic() - start >= 4 * 0.2
+
+
+def test_deadline_drops_slow_calls(stub_server):
+    engine = DetectionEngine()
+    engine.retriever = ConcurrentRetriever(max_workers=4, per_host_limit=4)
+    fast = _pages(stub_server, 2, delay=0)
+    stub_server.routes["/slow"] = (200, "<html><p>Too late.</p></html>")
+    stub_server.delays["/slow"] = 1.5
+    slow = stub_server.url + "/slow"
+
+    start = time.monotonic()
+    pages = engine.retriever.map(engine._fetch_content, fast + [slow], deadline=time.monotonic() + 0.5)
+
+    assert set(pages) == set(fast)
+    assert time.monotonic() - start < 1.2
@@ -0,0 +1,104 @@
+import numpy as np
+from app.services.detection_engine import DetectionEngine
+
+PAGE = "First sentence here. Second one follows! Third asks why? Fourth ends it."
+
+
+def _engine(sentences=2, stride=1, max_chars=1000):
+    engine = DetectionEngine()
+    engine.window_sentences = sentences
+    engine.window_stride = stride
+    engine.window_max_chars = max_chars
+    return engine
+
+
+def _texts(content, windows):
+    return [content[start:end] for _, start, end in windows]
+
+
+def test_windows_overlap_and_offsets_point_into_the_page():
+    windows = _engine()._source_windows("u", PAGE)
+
+    assert _texts(PAGE, windows) == [
+        "First sentence here. Second one follows!",
+        "Second one follows! Third asks why?",
+        "Third asks why? Fourth ends it.",
+    ]
+
+
+def test_last_window_reaches_the_end_of_the_text():
+    content = PAGE + "  Unterminated tail"
+
+    windows = _engine(sentences=2, stride=2)._source_windows("u", content)
+
+    assert windows[-1][2] == len(content)
+    assert _texts(content, windows)[-1] == "Fourth ends it.  Unterminated tail"
+
+
+def test_blank_and_short_pages_give_no_empty_windows():
+    engine = _engine(sentences=3)
+
+    assert engine._source_windows("u", "") == []
+    assert engine._source_windows("u", "  \n\t ") == []
+    assert _texts("  One line.  ", engine._source_windows("u", "  One line.  ")) == ["One line."]
+
+
+def test_unpunctuated_runs_are_cut_to_max_chars():
+    content = "word " * 100
+
+    windows = _engine(sentences=1, stride=1, max_chars=120)._source_windows("u", content)
+
+    assert all(0 < end - start <= 120 for _, start, end in windows)
+    assert windows[-1][2] == len(content.rstrip())
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_best_window_per_page_with_source_offsets():
+    engine = _engine()
+    pages = {"http://a": PAGE, "http://blank": " ", "http://b": "Only one window on this page."}
+    windows = [window for url, content in pages.items() for window in engine._source_windows(url, content)]
+    assert len(windows) == 4
+
+    sentence_embeddings = _unit([[1, 0, 0], [0, 0, 1]])
+    # Sentence 0 is closest to the second window of a; sentence 1 to b
+    source_embeddings = _unit([[0.2, 1, 0], [1, 0.05, 0], [0.5, 1, 0], [0, 0.1, 1]])
+    spans = [("sentence zero", 0, 13), ("sentence one", 14, 26)]
+
+    # A fetched page without a single window is simply absent
+    matches = engine._score_web_matches(
+        spans, [["http://a", "http://blank"], ["http://a", "http://b"]],
+        sentence_embeddings, windows, source_embeddings, pages
+    )
+
+    found = {(m["matched_text"], m["source_url"]): m for m in matches}
+    assert set(found) == {("sentence zero", "http://a"), ("sentence one", "http://b")}
+
+    a = found[("sentence zero", "http://a")]
+    assert (a["source_start_index"], a["source_end_index"]) == windows[1][1:]
+    assert a["original_text"] == "Second one follows! Third asks why?"
+
+    b = found[("sentence one", "http://b")]
+    assert (b["source_start_index"], b["source_end_index"]) == windows[3][1:]
+    assert b["original_text"] == pages["http://b"]
+    assert (b["start_index"], b["end_index"]) == (14, 26)
+
+
+def test_pages_a_sentence_did_not_retrieve_are_masked():
+    engine = _engine()
+    pages = {"http://a": PAGE, "http://b": "Only one window on this page."}
+    windows = engine._source_windows("http://a", pages["http://a"]) + \
+        engine._source_windows("http://b", pages["http://b"])
+
+    sentence_embeddings = _unit([[0, 0, 1]])
+    source_embeddings = _unit([[1, 0, 0], [1, 0, 0], [1, 0, 0], [0, 0, 1]])
+
+    matches = engine._score_web_matches(
+        [("sentence", 0, 8)], [["http://a"]],
+        sentence_embeddings, windows, source_embeddings, pages
+    )
+
+    assert matches == []
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import pytest
+from app import db
+from app.models import AnalysisJob, Document, DocumentUpload
+from app.services.tasks import extract_document
+from app.utils.uploads import read_stream, FileTooLarge
+
+
+@pytest.mark.parametrize("filename", ["essay.doc", "slides.ppt", "notes.rtf"])
+def test_formats_without_a_reader_are_rejected(app, headers, filename):
+    response = app.test_client().post(
+        "/api/upload/document",
+        data={"file": (io.BytesIO(b"\xd0\xcf\x11\xe0 legacy binary"), filename)},
+        headers=headers
+    )
+
+    assert response.status_code == 400
+    assert Document.query.count() == 0
+
+
+def test_upload_is_stored_and_extracted_a_chunk_at_a_time(app, headers):
+    app.config["UPLOAD_CHUNK_SIZE"] = 64
+    text = "A plain text essay, uploaded in several chunks. " * 10
+
+    response = app.test_client().post(
+        "/api/upload/document",
+        data={"file": (io.BytesIO(text.encode()), "essay.txt")},
+        headers=headers
+    )
+
+    assert response.status_code == 202
+    document_id = response.get_json()["document"]["id"]
+    chunks = DocumentUpload.query.filter_by(document_id=document_id).order_by(DocumentUpload.seq).all()
+    assert len(chunks) == -(-len(text) // 64)
+    assert all(len(chunk.data) <= 64 for chunk in chunks)
+    assert AnalysisJob.query.filter_by(kind="extract_document").count() == 1
+
+    extract_document(app, document_id)
+
+    document = db.session.get(Document, document_id)
+    assert (document.status, document.extracted_text) == ("ready", text)
+    assert DocumentUpload.query.filter_by(document_id=document_id).count() == 0
+
+
+def test_oversized_stream_stops_reading_past_the_limit():
+    stream = io.BytesIO(b"x" * 1000)
+
+    with pytest.raises(FileTooLarge):
+        read_stream(stream, max_size=50, chunk_size=16)
+
+    assert stream.tell() == 64
+
+
+def test_spooled_upload_round_trips(tmp_path):
+    upload, digest, size = read_stream(io.BytesIO(b"abc" * 100), max_size=1000, chunk_size=16,
+                                       directory=str(tmp_path))
+
+    with upload:
+        assert (upload.read(), size) == (b"abc" * 100, 300)
+    assert digest == hashlib.sha256(b"abc" * 100).hexdigest()
+
+
+def test_batch_files_are_stored_in_chunks(app, headers):
+    app.config["UPLOAD_CHUNK_SIZE"] = 32
+    files = [(io.BytesIO(f"Submission number {i} of the class, long enough for chunks.".encode()), f"s{i}.txt")
+             for i in range(3)]
+
+    response = app.test_client().post("/api/batch/", data={"files": files}, headers=headers)
+
+    assert response.status_code == 202
+    for document in Document.query.all():
+        chunks = DocumentUpload.query.filter_by(document_id=document.id).all()
+        assert sum(len(chunk.data) for chunk in chunks) == document.file_size
+        assert len(chunks) == -(-document.file_size // 32)
@@ -0,0 +1,84 @@
+import numpy as np
+from app.services import engine
+from app.services.fingerprint import Fingerprinter, FingerprintIndex
+from app.services.tasks import queue_archive_backfill
+from app.services.vector_index import VectorIndex
+from app.models import AnalysisJob
+
+DIM = 8
+
+
+def _unit(rng, n):
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _entries(prefix, n):
+    return [{"text": f"{prefix}{i}", "start": i, "end": i + 1} for i in range(n)]
+
+
+def test_rows_appended_elsewhere_are_mapped_not_copied(tmp_path):
+    rng = np.random.default_rng(0)
+    writer = VectorIndex(str(tmp_path), DIM, block_rows=2)
+    reader = VectorIndex(str(tmp_path), DIM, block_rows=2)
+    a, b = _unit(rng, 3), _unit(rng, 3)
+
+    writer.add("doc-a", a, _entries("a", 3))
+    assert [entry["text"] for _, entry in reader.search(a[1:2], k=1)[0]] == ["a1"]
+
+    writer.add("doc-b", b, _entries("b", 3))
+    assert [entry["text"] for _, entry in reader.search(b[2:3], k=1)[0]] == ["b2"]
+    assert isinstance(reader._vectors, np.memmap)
+    assert len(reader) == 6
+
+
+def test_rows_without_metadata_are_never_returned(tmp_path):
+    rng = np.random.default_rng(1)
+    index = VectorIndex(str(tmp_path), DIM)
+    index.add("doc-a", _unit(rng, 2), _entries("a", 2))
+
+    # A writer that died between appending vectors and their metadata
+    orphan = _unit(rng, 1)
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(orphan.tobytes())
+    index.add("doc-b", _unit(rng, 2), _entries("b", 2))
+
+    hits = VectorIndex(str(tmp_path), DIM).search(orphan, k=5)[0]
+
+    assert sorted(entry["text"] for _, entry in hits) == ["a0", "a1", "b0", "b1"]
+
+
+def test_ann_labels_past_loaded_rows_are_dropped(tmp_path):
+    rng = np.random.default_rng(2)
+    index = VectorIndex(str(tmp_path), DIM)
+    vectors = _unit(rng, 3)
+    index.add("doc-a", vectors, _entries("a", 3))
+    index.refresh()
+
+    class PersistedGraph:
+        """hnsw.bin written by a process that has read more rows"""
+        def get_current_count(self):
+            return 50
+
+        def set_ef(self, ef):
+            pass
+
+        def knn_query(self, queries, k):
+            return np.array([[40, 2, 7, 0]] * len(queries)), None
+
+    index._ann = PersistedGraph()
+    hits = index.search(vectors[2:3], k=4)[0]
+
+    assert [entry["text"] for _, entry in hits] == ["a2", "a0"]
+
+
+def test_backfill_queues_documents_missing_from_the_archive(analysis, tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "archive_index", VectorIndex(str(tmp_path / "vectors"), DIM))
+    monkeypatch.setattr(engine, "fingerprint_index", FingerprintIndex(str(tmp_path / "fp"), Fingerprinter()))
+
+    assert queue_archive_backfill() == 1
+    job = AnalysisJob.query.one()
+    assert (job.kind, job.document_id) == ("index_document", analysis.document_id)
+
+    # Already queued: not queued again
+    assert queue_archive_backfill() == 0
@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+# ==========================================================
+# WORKER PROCESS
+# ==========================================================
+
+def _limit_torch_threads(workers):
+    """Split the CPU between worker processes instead of oversubscribing it"""
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def work(config_name, workers, index):
+    """Claim and run jobs until told to stop"""
+
+    _limit_torch_threads(workers)
+
+    from app import create_app
+    from app.services import engine
+    from app.services.job_queue import queue
+    from app.services.metrics import metrics
+    from app.services.tasks import run_job, abandon_job
+
+    app = create_app(config_name)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    poll_interval = app.config.get("JOB_POLL_INTERVAL", 2)
+
+    # Load the model (or wait for the model server) before claiming, so
+    # the first job doesn't pay for it
+    if not engine.ready:
+        try:
+            engine.warm_up()
+        except Exception as e:
+            print(f"⚠ Worker {worker_id} warm-up failed: {e}")
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+
+    print(f"✓ Worker {worker_id} started")
+
+    while not stopping.is_set():
+        with app.app_context():
+            try:
+                job = queue.claim(worker_id, on_abandoned=abandon_job)
+            except Exception as e:
+                print(f"⚠ Worker {worker_id} claim error: {e}")
+                job = None
+
+            if job is None:
+                # Keep this worker's metrics snapshot fresh while idle
+                metrics.maybe_flush()
+                stopping.wait(poll_interval)
+                continue
+
+            _run_claimed(app, queue, run_job, job, worker_id)
+
+    print(f"Worker {worker_id} stopped")
+
+
+def _run_claimed(app, queue, run_job, job, worker_id):
+
+    job_id = job.id
+    done = threading.Event()
+
+    # Keep the lease alive while the job runs
+    def heartbeat():
+        while not done.wait(queue.visibility_timeout / 3):
+            with app.app_context():
+                try:
+                    queue.heartbeat(job_id, worker_id)
+                except Exception as e:
+                    print(f"⚠ Heartbeat failed for job {job_id}: {e}")
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+
+    try:
+        run_job(app, job, final_attempt=queue.is_final_attempt(job))
+        queue.complete(job)
+    except Exception as e:
+        from app import db
+        db.session.rollback()
+        status = queue.fail(job, e)
+        print(f"Job {job_id} failed ({status}): {e}")
+    finally:
+        done.set()
+        beat.join()
+
+
+# ==========================================================
+# SUPERVISOR
+# ==========================================================
+
+def main():
+    config_name = os.getenv("CONFIG_NAME", "production")
+    workers = int(os.getenv("ANALYSIS_WORKERS", 2))
+
+    # Re-queue analyses orphaned by a crash or restart before starting
+    from app import create_app
+    from app.services.job_queue import queue
+
+    app = create_app(config_name)
+    with app.app_context():
+        recovered = queue.recover_orphans()
+        if recovered:
+            print(f"✓ Re-queued {recovered} orphaned analyses")
+
+        # Documents missing from this host's archive index (first start,
+        # or a lost ARCHIVE_INDEX_DIR) are indexed again by the workers
+        from app.services.tasks import queue_archive_backfill
+        backfill = queue_archive_backfill()
+        if backfill:
+            print(f"✓ Queued {backfill} documents for archive indexing")
+
+    # Fresh interpreters: no DB connections or model state shared with us
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+    stopping = threading.Event()
+
+    def stop(*_):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print("===================================")
+    print(f"Starting {workers} analysis workers")
+    print(f"Environment: {config_name}")
+    print("===================================")
+
+    model_server = None
+    socket_path = app.config.get("MODEL_SERVER_SOCKET")
+
+    def start_model_server():
+        from app.services.model_server import serve
+        process = ctx.Process(
+            target=serve,
+            args=(socket_path,),
+            kwargs={
+                "batch_size": app.config.get("EMBEDDING_BATCH_SIZE", 32),
+                "max_batch": app.config.get("MODEL_SERVER_MAX_BATCH", 64),
+                "max_wait_ms": app.config.get("MODEL_SERVER_MAX_WAIT_MS", 10),
+                "authkey": app.config.get("MODEL_SERVER_AUTHKEY"),
+                "backend": app.config.get("EMBEDDING_BACKEND", "torch"),
+                "onnx_dir": app.config.get("ONNX_MODEL_DIR")
+            }
+        )
+        process.start()
+        return process
+
+    while not stopping.is_set():
+        # One model process shared by all workers on this host
+        if socket_path and (model_server is None or not model_server.is_alive()):
+            if model_server is not None:
+                print(f"⚠ Model server exited ({model_server.exitcode}), restarting")
+            model_server = start_model_server()
+
+        for index in range(workers):
+            process = processes.get(index)
+            if process is None or not process.is_alive():
+                if process is not None:
+                    print(f"⚠ Worker {index} exited ({process.exitcode}), restarting")
+                process = ctx.Process(target=work, args=(config_name, workers, index))
+                process.start()
+                processes[index] = process
+        stopping.wait(5)
+
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(30)
+    if model_server is not None:
+        model_server.terminate()
+        model_server.join(30)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,27 @@ const analysisApi = {
     return response.data;
   },
 
+  // Long-polls progress events (stages, counters, partial matches);
+  // onEvent sees each one. Resolves with the finished analysis. A busy
+  // server answers at once with retry_after (seconds) instead of waiting.
+  waitForAnalysis: async (analysisId, onEvent = () => {}) => {
+    let after = 0;
+    for (;;) {
+      const response = await apiClient.get(`/analysis/progress/${analysisId}`, {
+        params: { after },
+      });
+      const { events, last_event_id, done, analysis, retry_after } = response.data;
+      events.forEach(onEvent);
+      after = last_event_id;
+      if (done) {
+        return analysis;
+      }
+      if (retry_after) {
+        await new Promise((resolve) => setTimeout(resolve, retry_after * 1000));
+      }
+    }
+  },
+
   getResults: async (analysisId) => {
     const response = await apiClient.get(`/results/analysis/${analysisId}`);
     return response.data;
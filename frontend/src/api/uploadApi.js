@@ -30,6 +30,22 @@ const uploadApi = {
     return response.data;
   },
 
+  // Uploaded files are extracted in the background; poll until done.
+  // The default timeout covers every retry of a slow extraction.
+  waitForDocument: async (id, intervalMs = 1000, timeoutMs = 300000) => {
+    const deadline = Date.now() + timeoutMs;
+    for (;;) {
+      const document = await uploadApi.getDocument(id);
+      if (document.status !== "extracting") {
+        return document;
+      }
+      if (Date.now() >= deadline) {
+        throw new Error("Text extraction is taking too long, check the document later");
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
+
   deleteDocument: async (id) => {
     const response = await apiClient.delete(`/upload/document/${id}`);
     return response.data;
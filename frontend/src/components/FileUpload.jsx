@@ -14,11 +14,17 @@ export default function FileUpload({ onUploadSuccess }) {
 
     try {
       const response = await uploadApi.uploadDocument(file);
+      const document = await uploadApi.waitForDocument(response.document.id);
 
-      onUploadSuccess(response.document);
+      if (document.status === 'failed') {
+        setError(document.error || 'Could not read this file');
+        return;
+      }
+
+      onUploadSuccess(document);
 
     } catch (err) {
-      setError(err.response?.data?.error || 'Upload failed');
+      setError(err.response?.data?.error || err.message || 'Upload failed');
     } finally {
       setIsLoading(false);
     }
@@ -131,7 +137,7 @@ export default function FileUpload({ onUploadSuccess }) {
             id="file-input"
             className="hidden"
             onChange={(e) => e.target.files && handleFileUpload(e.target.files[0])}
-            accept=".txt,.pdf,.docx,.pptx,.doc,.ppt"
+            accept=".txt,.pdf,.docx,.pptx"
           />
           <label
             htmlFor="file-input"
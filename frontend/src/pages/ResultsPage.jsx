@@ -10,6 +10,7 @@ export default function ResultsPage() {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
   const [activeTab, setActiveTab] = useState("analysis");
+  const [stage, setStage] = useState(null);
 
   useEffect(() => {
     loadResults();
@@ -17,6 +18,19 @@ export default function ResultsPage() {
 
   const loadResults = async () => {
     try {
+      // Still queued or running: follow its progress until it finishes
+      const analysis = await analysisApi.waitForAnalysis(analysisId, (event) => {
+        if (event.data?.stage) {
+          setStage(event.data.stage);
+        }
+      });
+
+      if (analysis.status === "failed") {
+        setError("Analysis failed");
+        setIsLoading(false);
+        return;
+      }
+
       const response = await analysisApi.getResults(analysisId);
       setResults(response); // NO .data
       setIsLoading(false);
@@ -34,7 +48,7 @@ export default function ResultsPage() {
         <div className="text-center py-12">
           <div className="inline-block animate-spin rounded-full h-12 w-12 border-b-2 border-primary"></div>
           <p className="mt-4 text-gray-600">
-            Loading analysis results...
+            {stage ? `Analyzing (${stage})...` : "Loading analysis results..."}
           </p>
         </div>
       </div>